@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.translation import gettext_lazy as _
-from .models import User, Assignment, Submission, Mark
+from .models import User, Assignment, Submission, Mark, MarkerProgress, CriterionScore
 
 # ------------------------------
 # Custom User Admin
@@ -81,3 +81,24 @@ class MarkAdmin(admin.ModelAdmin):
     list_filter = ('is_finalized', 'marker')
     search_fields = ('submission__name', 'marker__email')
     ordering = ('-id',)
+
+
+# ------------------------------
+# Marker Progress Admin
+# ------------------------------
+@admin.register(MarkerProgress)
+class MarkerProgressAdmin(admin.ModelAdmin):
+    list_display = ('id', 'assignment', 'marker', 'marks_finalized', 'marks_total')
+    list_filter = ('assignment',)
+    search_fields = ('marker__email',)
+    readonly_fields = ('marks_total', 'marks_finalized')
+
+
+# ------------------------------
+# Criterion Score Admin
+# ------------------------------
+@admin.register(CriterionScore)
+class CriterionScoreAdmin(admin.ModelAdmin):
+    list_display = ('id', 'mark', 'criterion_key', 'value', 'level')
+    list_filter = ('criterion_key',)
+    search_fields = ('mark__marker__email', 'submission__name')
@@ -0,0 +1,281 @@
+import math
+
+import numpy as np
+from django.db.models import Aggregate, Avg, Case, Count, F, FloatField, Max, Min, TextField, Value, When
+from django.db.models.functions import Abs
+
+from .models import CriterionScore, Mark, Submission, User
+from .rubrics import rubric_keys
+from .scoring import admin_entries, rubric_level_scores
+
+
+# ------------------------------
+# Per-criterion statistics
+# ------------------------------
+def _admin_scores(submission):
+    # Admin marks hold level ids, scored from the assignment's rubric
+    rubric_scores = rubric_level_scores(submission.assignment.mark_criteria)
+    return {
+        key: score
+        for key, score in admin_entries(submission.admin_marks, rubric_scores)
+        if score is not None
+    }
+
+
+def criterion_statistics(submission):
+    """
+    Summarize every marker's score for each rubric criterion of `submission`.
+
+    Runs one grouped query over CriterionScore. The admin's score for each
+    criterion is inlined as a CASE expression so the deviation is computed in SQL.
+
+    Returns {criterion_key: {"count", "mean", "stdDev", "min", "max",
+    "adminScore", "meanAbsDeviation"}}.
+    """
+    admin = _admin_scores(submission)
+    if admin:
+        admin_value = Case(
+            *[When(criterion_key=key, then=Value(float(value))) for key, value in admin.items()],
+            default=Value(None),
+            output_field=FloatField(),
+        )
+    else:
+        admin_value = Value(None, output_field=FloatField())
+
+    rows = (
+        CriterionScore.objects
+        .filter(submission=submission, value__isnull=False)
+        .values("criterion_key")
+        .annotate(
+            count=Count("value"),
+            mean=Avg("value"),
+            mean_square=Avg(F("value") * F("value")),
+            low=Min("value"),
+            high=Max("value"),
+            mean_abs_deviation=Avg(Abs(F("value") - admin_value)),
+        )
+        .order_by("criterion_key")
+    )
+
+    stats = {}
+    for row in rows:
+        # Population standard deviation from E[x^2] - E[x]^2 (StdDev is not available on SQLite)
+        variance = max(row["mean_square"] - row["mean"] ** 2, 0.0)
+        stats[row["criterion_key"]] = {
+            "count": row["count"],
+            "mean": row["mean"],
+            "stdDev": math.sqrt(variance),
+            "min": row["low"],
+            "max": row["high"],
+            "adminScore": admin.get(row["criterion_key"]),
+            "meanAbsDeviation": row["mean_abs_deviation"],
+        }
+    return stats
+
+
+# ------------------------------
+# Inter-marker agreement
+# ------------------------------
+def _nanmean(values, axis=None):
+    """np.nanmean without the all-NaN RuntimeWarning; empty slices give NaN."""
+    present = ~np.isnan(values)
+    total = np.where(present, values, 0.0).sum(axis=axis)
+    count = present.sum(axis=axis)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return total / count
+
+
+class _JoinedText(Aggregate):
+    """Comma-separated text of a group's values (GROUP_CONCAT, STRING_AGG on PostgreSQL)."""
+    function = "GROUP_CONCAT"
+    output_field = TextField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, function="STRING_AGG", template="%(function)s(%(expressions)s::text, ',')",
+            **extra_context,
+        )
+
+
+def build_score_tensor(assignment):
+    """
+    Load every marker score of `assignment` into a dense array.
+
+    Returns (scores, admin, submission_ids, marker_ids, criterion_keys) where
+    `scores` has shape (submissions, markers, criteria), `admin` has shape
+    (submissions, criteria) and missing scores are NaN. Costs three queries.
+
+    Scores come back one row per (submission, criterion) with the group's mark
+    ids and values joined into strings (aggregated in the same pass, so in the
+    same order), parsed by NumPy in one go; building a Python tuple per
+    CriterionScore would dominate the report.
+    """
+    submissions = list(
+        Submission.objects.filter(assignment=assignment).order_by("id").values_list("id", "admin_marks")
+    )
+    marks = list(
+        Mark.objects.filter(submission__assignment=assignment).order_by("id").values_list("id", "marker_id")
+    )
+    submission_ids = [sid for sid, _ in submissions]
+    groups = list(
+        CriterionScore.objects
+        .filter(submission_id__in=submission_ids, value__isnull=False)
+        .values("submission_id", "criterion_key")
+        .annotate(mark_list=_JoinedText("mark_id"), value_list=_JoinedText("value"))
+        .values_list("submission_id", "criterion_key", "mark_list", "value_list")
+    )
+
+    criterion_keys = rubric_keys(assignment.mark_criteria)
+    known = set(criterion_keys)
+    for key in sorted({key for _, key, _, _ in groups} - known):
+        criterion_keys.append(key)
+
+    # Admin marks hold level ids, scored from the rubric like the marking pages do
+    rubric_scores = rubric_level_scores(assignment.mark_criteria)
+    admin = np.full((len(submission_ids), len(criterion_keys)), np.nan)
+    criterion_index = {key: i for i, key in enumerate(criterion_keys)}
+    for s, (_, admin_marks) in enumerate(submissions):
+        for key, score in admin_entries(admin_marks, rubric_scores):
+            if score is not None and key in criterion_index:
+                admin[s, criterion_index[key]] = score
+
+    if not groups:
+        scores = np.full((len(submission_ids), 0, len(criterion_keys)), np.nan)
+        return scores, admin, submission_ids, [], criterion_keys
+
+    group_subs, group_keys, mark_lists, value_lists = zip(*groups)
+    sizes = np.fromiter((marks.count(",") + 1 for marks in mark_lists), dtype=np.intp, count=len(groups))
+    mark_col = np.fromstring(",".join(mark_lists), dtype=np.int64, sep=",")
+    value_col = np.fromstring(",".join(value_lists), sep=",")
+    sub_idx = np.repeat(np.searchsorted(np.asarray(submission_ids), group_subs), sizes)
+    key_idx = np.repeat([criterion_index[key] for key in group_keys], sizes)
+
+    mark_ids, mark_markers = (np.asarray(col) for col in zip(*marks))
+    marker_ids, marker_of_mark = np.unique(mark_markers, return_inverse=True)
+    marker_idx = marker_of_mark[np.searchsorted(mark_ids, mark_col)]
+
+    scores = np.full((len(submission_ids), len(marker_ids), len(criterion_keys)), np.nan)
+    scores[sub_idx, marker_idx, key_idx] = value_col
+    return scores, admin, submission_ids, marker_ids.tolist(), criterion_keys
+
+
+def _icc_oneway(units):
+    """
+    ICC(1,1) for a (units, raters) array with NaN gaps (unbalanced one-way ANOVA).
+    """
+    present = ~np.isnan(units)
+    n_i = present.sum(axis=1)
+    units, present, n_i = units[n_i > 0], present[n_i > 0], n_i[n_i > 0]
+    k = len(n_i)
+    n = n_i.sum()
+    if k < 2 or n <= k:
+        return None
+
+    values = np.where(present, units, 0.0)
+    unit_means = values.sum(axis=1) / n_i
+    grand_mean = values.sum() / n
+    ms_between = (n_i * (unit_means - grand_mean) ** 2).sum() / (k - 1)
+    ms_within = (np.where(present, units - unit_means[:, None], 0.0) ** 2).sum() / (n - k)
+    n_0 = (n - (n_i ** 2).sum() / n) / (k - 1)
+    denominator = ms_between + (n_0 - 1) * ms_within
+    if denominator == 0:
+        return None
+    return float((ms_between - ms_within) / denominator)
+
+
+def _krippendorff_alpha_interval(units):
+    """
+    Krippendorff's alpha (interval metric) for a (units, raters) array with NaN gaps.
+
+    Uses sum_{i!=j} (v_i - v_j)^2 = 2 * (m * sum v^2 - (sum v)^2) so no pairwise
+    matrices are built.
+    """
+    present = ~np.isnan(units)
+    m_u = present.sum(axis=1)
+    pairable = m_u >= 2
+    units, present, m_u = units[pairable], present[pairable], m_u[pairable]
+    n = m_u.sum()
+    if n < 2:
+        return None
+
+    values = np.where(present, units, 0.0)
+    s1 = values.sum(axis=1)
+    s2 = (values ** 2).sum(axis=1)
+    observed = (2 * (m_u * s2 - s1 ** 2) / (m_u - 1)).sum() / n
+
+    total1 = s1.sum()
+    total2 = s2.sum()
+    expected = 2 * (n * total2 - total1 ** 2) / (n * (n - 1))
+    if expected == 0:
+        return None
+    return float(1 - observed / expected)
+
+
+def agreement_metrics(scores, admin):
+    """
+    Vectorized consistency metrics for a (submissions, markers, criteria) score array.
+
+    `admin` holds the administrator's (submissions, criteria) reference scores.
+    Missing values are NaN. Returns a dict of NumPy results:
+        - mean_abs_deviation: overall mean |marker - admin|
+        - marker_mad / marker_bias: per marker mean |marker - admin| and mean (marker - admin)
+        - marker_rated: per marker number of scores given
+        - criterion_mad / criterion_bias: the same per criterion
+        - icc: ICC(1,1) treating every (submission, criterion) pair as a unit
+        - alpha: Krippendorff's alpha (interval) over the same units
+    """
+    diff = scores - admin[:, None, :]
+    abs_diff = np.abs(diff)
+
+    # Units are (submission, criterion) pairs, raters are markers
+    units = np.moveaxis(scores, 1, 2).reshape(-1, scores.shape[1])
+
+    return {
+        "mean_abs_deviation": _nanmean(abs_diff),
+        "marker_mad": _nanmean(abs_diff, axis=(0, 2)),
+        "marker_bias": _nanmean(diff, axis=(0, 2)),
+        "marker_rated": (~np.isnan(scores)).sum(axis=(0, 2)),
+        "criterion_mad": _nanmean(abs_diff, axis=(0, 1)),
+        "criterion_bias": _nanmean(diff, axis=(0, 1)),
+        "icc": _icc_oneway(units),
+        "alpha": _krippendorff_alpha_interval(units),
+    }
+
+
+def _number(value):
+    if value is None:
+        return None
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+def assignment_agreement(assignment):
+    """JSON-ready inter-marker agreement report for `assignment`."""
+    scores, admin, submission_ids, marker_ids, criterion_keys = build_score_tensor(assignment)
+    metrics = agreement_metrics(scores, admin)
+    emails = dict(User.objects.filter(id__in=marker_ids).values_list("id", "email"))
+
+    return {
+        "submissions": len(submission_ids),
+        "meanAbsoluteDeviation": _number(metrics["mean_abs_deviation"]),
+        "icc": _number(metrics["icc"]),
+        "krippendorffAlpha": _number(metrics["alpha"]),
+        "markers": [
+            {
+                "id": marker_id,
+                "email": emails.get(marker_id),
+                "ratedCriteria": int(metrics["marker_rated"][i]),
+                "meanAbsoluteDeviation": _number(metrics["marker_mad"][i]),
+                "bias": _number(metrics["marker_bias"][i]),
+            }
+            for i, marker_id in enumerate(marker_ids)
+        ],
+        "criteria": [
+            {
+                "key": key,
+                "meanAbsoluteDeviation": _number(metrics["criterion_mad"][i]),
+                "bias": _number(metrics["criterion_bias"][i]),
+            }
+            for i, key in enumerate(criterion_keys)
+        ],
+    }
@@ -0,0 +1,183 @@
+import os
+from collections import Counter
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save
+
+from .models import Assignment, Blob, Submission, Upload, User
+from .digests import file_sha256
+from .storage import blob_name, cas_sha256
+
+
+# Every FileField whose values hold a blob reference
+FILE_FIELDS = {
+    Assignment: ("rubric", "assignment_file"),
+    Submission: ("submission_file",),
+    User: ("profile_picture",),
+    Upload: ("file",),
+}
+
+_DEFERRED = object()
+
+
+# ------------------------------
+# Reference counts
+# ------------------------------
+def _collect(sha256):
+    collect = getattr(default_storage, "collect", None)
+    if collect is not None:  # ContentAddressedStorage
+        collect(sha256)
+
+
+def _digests(names):
+    return Counter(sha256 for sha256 in map(cas_sha256, names) if sha256)
+
+
+def acquire(names):
+    """Add one reference per content-addressed name in `names`."""
+    for sha256, count in _digests(names).items():
+        Blob.objects.filter(sha256=sha256).update(ref_count=F("ref_count") + count)
+
+
+def release(names):
+    """
+    Drop one reference per content-addressed name in `names`.
+
+    Runs once the surrounding transaction commits, so a rolled back delete or
+    replace never loses a blob; unreferenced blobs are then removed.
+    """
+    digests = _digests(names)
+    if not digests:
+        return
+
+    def apply():
+        for sha256, count in digests.items():
+            Blob.objects.filter(sha256=sha256).update(ref_count=F("ref_count") - count)
+        for sha256 in digests:
+            _collect(sha256)
+
+    transaction.on_commit(apply)
+
+
+def _current_names(instance, fields):
+    names = {}
+    for field in fields:
+        value = instance.__dict__.get(field, _DEFERRED)
+        names[field] = getattr(value, "name", value) or ""
+    return names
+
+
+def acquire_files(instances):
+    """Count the files of rows written with bulk_create, which sends no post_save."""
+    instances = list(instances)
+    if not instances:
+        return
+    fields = FILE_FIELDS[type(instances[0])]
+    names = []
+    for instance in instances:
+        current = _current_names(instance, fields)
+        names.extend(name for name in current.values() if name is not _DEFERRED)
+        instance._stored_files = current
+    acquire(names)
+
+
+# ------------------------------
+# Model signals
+# ------------------------------
+def _remember_files(sender, instance, **kwargs):
+    instance._stored_files = _current_names(instance, FILE_FIELDS[sender])
+
+
+def _track_file_changes(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    stored = getattr(instance, "_stored_files", {})
+    current = _current_names(instance, FILE_FIELDS[sender])
+    acquired, released = [], []
+    for field, name in current.items():
+        if update_fields is not None and field not in update_fields:
+            continue
+        old = "" if created else stored.get(field, _DEFERRED)
+        if name is _DEFERRED or old is _DEFERRED or name == old:
+            continue  # unchanged, or not loaded so nothing can have changed
+        acquired.append(name)
+        released.append(old)
+    acquire(acquired)
+    release(released)
+    instance._stored_files = current
+
+
+def _release_files(sender, instance, **kwargs):
+    stored = getattr(instance, "_stored_files", {})
+    release(name for name in stored.values() if name is not _DEFERRED)
+
+
+def connect_signals():
+    for model in FILE_FIELDS:
+        post_init.connect(_remember_files, sender=model, dispatch_uid=f"blobs-init-{model.__name__}")
+        post_save.connect(_track_file_changes, sender=model, dispatch_uid=f"blobs-save-{model.__name__}")
+        post_delete.connect(_release_files, sender=model, dispatch_uid=f"blobs-delete-{model.__name__}")
+
+
+# ------------------------------
+# Recount
+# ------------------------------
+def count_references():
+    """{sha256: references} counted straight from every FileField column."""
+    counts = Counter()
+    for model, fields in FILE_FIELDS.items():
+        for field in fields:
+            counts.update(_digests(model.objects.exclude(**{field: ""}).values_list(field, flat=True)))
+    return counts
+
+
+def rebuild_references():
+    """
+    Recompute every Blob.ref_count and remove unreferenced blobs.
+
+    Returns the number of blobs removed.
+    """
+    counts = count_references()
+    with transaction.atomic():
+        blobs = list(Blob.objects.select_for_update())
+        for blob in blobs:
+            blob.ref_count = counts.get(blob.sha256, 0)
+        Blob.objects.bulk_update(blobs, ["ref_count"], batch_size=1000)
+    unreferenced = [blob.sha256 for blob in blobs if blob.ref_count <= 0]
+    for sha256 in unreferenced:
+        _collect(sha256)
+    return len(unreferenced)
+
+
+# ------------------------------
+# Legacy media
+# ------------------------------
+def legacy_files():
+    """
+    Media files from before content addressing (migration 0012 leaves them in
+    place) that no file field references and whose content is stored as a blob.
+    Yields (path relative to MEDIA_ROOT, sha256); removing them loses nothing.
+    """
+    root = getattr(default_storage, "location", None)
+    if root is None or not hasattr(default_storage, "collect"):
+        return  # not ContentAddressedStorage
+    referenced = set()
+    for model, fields in FILE_FIELDS.items():
+        for field in fields:
+            referenced.update(model.objects.exclude(**{field: ""}).values_list(field, flat=True))
+
+    for directory, subdirectories, filenames in os.walk(root):
+        if directory == root:
+            subdirectories[:] = [d for d in subdirectories if d != "blobs"]
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, root).replace(os.sep, "/")
+            if name in referenced:
+                continue
+            with open(path, "rb") as fh:
+                sha256 = file_sha256(File(fh))
+            if Blob.objects.filter(sha256=sha256).exists() and default_storage.exists(blob_name(sha256)):
+                yield name, sha256
@@ -0,0 +1,95 @@
+import hashlib
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db.models.fields.files import FieldFile
+
+
+# ------------------------------
+# Hashing upload handlers
+# ------------------------------
+class _HashingMixin:
+    """
+    Compute the SHA-256 of each uploaded file while the request body is parsed,
+    and expose it as `uploaded_file.sha256`, so no second pass over the data is needed.
+    """
+
+    def new_file(self, *args, **kwargs):
+        self._sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        remaining = super().receive_data_chunk(raw_data, start)
+        if remaining is None:  # consumed by this handler
+            self._sha256.update(raw_data)
+        return remaining
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        if uploaded is not None:
+            uploaded.sha256 = self._sha256.hexdigest()
+        return uploaded
+
+
+class HashingMemoryFileUploadHandler(_HashingMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(_HashingMixin, TemporaryFileUploadHandler):
+    pass
+
+
+# ------------------------------
+# Digests of files
+# ------------------------------
+class HashingReader:
+    """File-like wrapper that hashes everything read through it (for streams that are saved once)."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        self._sha256.update(data)
+        self.size += len(data)
+        return data
+
+    def hexdigest(self):
+        return self._sha256.hexdigest()
+
+
+def file_sha256(file):
+    """
+    SHA-256 hex digest of `file` (an uploaded file or a stored FieldFile), computed
+    in one streaming pass unless the upload handler or chunked upload already did.
+    """
+    known = getattr(file, "sha256", None)
+    if known:
+        return known
+
+    digest = hashlib.sha256()
+    if isinstance(file, FieldFile) and file._committed:
+        with file.open("rb"):
+            for chunk in file.chunks():
+                digest.update(chunk)
+    else:
+        for chunk in file.chunks():
+            digest.update(chunk)
+        file.seek(0)
+    file.sha256 = digest.hexdigest()
+    return file.sha256
+
+
+def assigned_file_sha256(field_file):
+    """
+    Digest of a file newly assigned to a FileField, or None when the field
+    still holds the file it was loaded with.
+    """
+    if not field_file:
+        return None
+    if getattr(field_file, "sha256", None):  # e.g. a completed chunked upload
+        return field_file.sha256
+    if not field_file._committed:
+        return file_sha256(field_file.file)
+    return None
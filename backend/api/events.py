@@ -0,0 +1,281 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, connections
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import ModerationEvent
+
+
+MARK_SAVED = "mark.saved"
+MARK_FINALIZED = "mark.finalized"
+MARKS_RESET = "marks.reset"
+ASSIGNMENT_EDITED = "assignment.edited"
+
+NOTIFY_CHANNEL = "moderation_events"
+
+_CLOSED = object()
+
+
+# ------------------------------
+# Emitting (write paths)
+# ------------------------------
+def _notify():
+    # Postgres delivers the NOTIFY when the transaction commits, and not at all on rollback
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, '')", [NOTIFY_CHANNEL])
+
+
+def emit(assignment_id, kind, **data):
+    """Record one event. Call inside the write's transaction, so rolled back writes emit nothing."""
+    event = ModerationEvent.objects.create(assignment_id=assignment_id, kind=kind, data=data)
+    _notify()
+    _count_inserts(1)
+    return event
+
+
+def _mark_event(assignment_id, mark, was_finalized):
+    kind = MARK_FINALIZED if mark.is_finalized and not was_finalized else MARK_SAVED
+    return ModerationEvent(assignment_id=assignment_id, kind=kind, data={
+        "submissionId": mark.submission_id,
+        "markerId": mark.marker_id,
+        "markId": mark.id,
+        "version": mark.version,
+        "isFinalized": mark.is_finalized,
+        "totalScore": mark.total_score,
+    })
+
+
+def emit_marks_saved(assignment_id, marks, was_finalized=()):
+    """
+    One event per written mark, inserted together. `was_finalized` holds the ids
+    of marks that were already finalized; a mark that became finalized sends
+    mark.finalized instead of mark.saved.
+    """
+    was_finalized = set(was_finalized)
+    events = [_mark_event(assignment_id, mark, mark.id in was_finalized) for mark in marks]
+    if events:
+        ModerationEvent.objects.bulk_create(events)
+        _notify()
+        _count_inserts(len(events))
+
+
+# ------------------------------
+# Retention
+# ------------------------------
+# Every mark write (autosaves included) inserts an event, whether or not anyone
+# is streaming, so the write path prunes too: every API_EVENTS_PRUNE_EVERY
+# inserts per process. `manage.py prune_events` does the same from cron.
+_inserts_since_prune = 0
+_prune_lock = threading.Lock()
+
+
+def prune_events(retention=None):
+    """Delete events older than `retention` seconds (API_EVENTS_RETENTION); returns how many."""
+    if retention is None:
+        retention = getattr(settings, "API_EVENTS_RETENTION", 24 * 60 * 60)
+    deleted, _ = ModerationEvent.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=retention)).delete()
+    return deleted
+
+
+def _count_inserts(count):
+    global _inserts_since_prune
+    with _prune_lock:
+        _inserts_since_prune += count
+        if _inserts_since_prune < getattr(settings, "API_EVENTS_PRUNE_EVERY", 1000):
+            return
+        _inserts_since_prune = 0
+    prune_events()
+
+
+def format_event(event):
+    data = json.dumps({"assignmentId": event.assignment_id, **event.data}, cls=DjangoJSONEncoder)
+    return f"id: {event.id}\nevent: {event.kind}\ndata: {data}\n\n"
+
+
+# ------------------------------
+# Per-process fan-out
+# ------------------------------
+class Subscription:
+    def __init__(self, assignment_id, max_size):
+        self.assignment_id = assignment_id
+        self.queue = asyncio.Queue(maxsize=max_size)
+
+    def deliver(self, event):
+        """Queue `event`; returns False (and closes the stream) if the client fell too far behind."""
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            # Drop the backlog; the browser reconnects with Last-Event-ID and replays from the table
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(_CLOSED)
+            return False
+
+
+class EventHub:
+    """
+    Fans moderation events out to the SSE streams of one worker process.
+
+    A single reader task per process queries new ModerationEvent rows, however
+    many clients are subscribed. On PostgreSQL it is woken by LISTEN/NOTIFY;
+    elsewhere it polls every API_EVENTS_POLL_INTERVAL seconds. Ids can commit out
+    of order, so gaps below the last seen id are re-checked until they fill in
+    or time out (a rolled back insert leaves a permanent gap).
+    """
+
+    def __init__(self):
+        self._subscriptions = {}  # assignment id -> set of Subscription
+        self._task = None
+        self._loop = None
+        self._last_id = 0
+        self._gaps = {}  # missing id -> monotonic time first noticed
+
+    @property
+    def subscriber_count(self):
+        return sum(len(subs) for subs in self._subscriptions.values())
+
+    def subscribe(self, assignment_id):
+        subscription = Subscription(assignment_id, getattr(settings, "API_EVENTS_QUEUE_SIZE", 100))
+        self._subscriptions.setdefault(assignment_id, set()).add(subscription)
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._task = loop.create_task(self._run())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subs = self._subscriptions.get(subscription.assignment_id)
+        if subs is not None:
+            subs.discard(subscription)
+            if not subs:
+                del self._subscriptions[subscription.assignment_id]
+
+    def _dispatch(self, events):
+        for event in events:
+            for subscription in list(self._subscriptions.get(event.assignment_id, ())):
+                if not subscription.deliver(event):
+                    self.unsubscribe(subscription)
+
+    def _fetch(self):
+        """New events since the last read, plus any that filled a gap. One query."""
+        now = time.monotonic()
+        timeout = getattr(settings, "API_EVENTS_GAP_TIMEOUT", 10)
+        self._gaps = {i: seen for i, seen in self._gaps.items() if now - seen < timeout}
+
+        condition = Q(id__gt=self._last_id)
+        if self._gaps:
+            condition |= Q(id__in=list(self._gaps))
+        events = list(ModerationEvent.objects.filter(condition).order_by("id")[:1000])
+        for event in events:
+            self._gaps.pop(event.id, None)
+            if event.id > self._last_id:
+                self._gaps.update((i, now) for i in range(self._last_id + 1, event.id))
+                self._last_id = event.id
+        return events
+
+    def _start(self):
+        self._last_id = ModerationEvent.objects.aggregate(last=Max("id"))["last"] or 0
+        self._gaps = {}
+
+    async def _run(self):
+        await sync_to_async(self._start)()
+        wakeup, listener = await self._listen()
+        interval = getattr(settings, "API_EVENTS_POLL_INTERVAL", 1.0)
+        try:
+            while self._subscriptions:
+                if wakeup is None:
+                    await asyncio.sleep(interval)
+                else:
+                    try:  # still re-check now and then, for gaps and missed notifications
+                        await asyncio.wait_for(wakeup.wait(), timeout=max(interval, 5.0))
+                    except asyncio.TimeoutError:
+                        pass
+                    wakeup.clear()
+                self._dispatch(await sync_to_async(self._fetch)())
+        finally:
+            if listener is not None:
+                self._loop.remove_reader(listener.fileno())
+                listener.close()
+
+    async def _listen(self):
+        """(wake-up Event, connection) listening for NOTIFY on PostgreSQL with psycopg2, else (None, None)."""
+        wrapper = connections["default"]
+        if wrapper.vendor != "postgresql" or not getattr(settings, "API_EVENTS_USE_NOTIFY", True):
+            return None, None
+
+        def connect():
+            listener = wrapper.Database.connect(**wrapper.get_connection_params())
+            if not hasattr(listener, "poll"):  # psycopg 3 has another notification API; poll instead
+                listener.close()
+                return None
+            listener.autocommit = True
+            with listener.cursor() as cursor:
+                cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            return listener
+
+        listener = await sync_to_async(connect, thread_sensitive=False)()
+        if listener is None:
+            return None, None
+        wakeup = asyncio.Event()
+
+        def readable():
+            listener.poll()
+            if listener.notifies:
+                listener.notifies.clear()
+                wakeup.set()
+
+        self._loop.add_reader(listener.fileno(), readable)
+        return wakeup, listener
+
+
+hub = EventHub()
+
+
+# ------------------------------
+# SSE stream
+# ------------------------------
+def _replay(assignment_id, after_id):
+    limit = getattr(settings, "API_EVENTS_REPLAY_LIMIT", 500)
+    return list(ModerationEvent.objects.filter(assignment_id=assignment_id, id__gt=after_id).order_by("id")[:limit])
+
+
+async def event_stream(assignment_id, last_event_id=None):
+    """
+    Server-Sent Events for `assignment_id`, as text chunks.
+
+    With `last_event_id` (the browser sends it when it reconnects), missed events
+    are replayed from the table first. A comment line is sent every
+    API_EVENTS_HEARTBEAT seconds, so proxies keep the connection open.
+    """
+    heartbeat = getattr(settings, "API_EVENTS_HEARTBEAT", 15)
+    subscription = hub.subscribe(assignment_id)  # before the replay, so nothing falls in between
+    try:
+        yield "retry: 3000\n\n"
+        replayed = 0
+        if last_event_id is not None:
+            for event in await sync_to_async(_replay)(assignment_id, last_event_id):
+                replayed = event.id
+                yield format_event(event)
+
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event is _CLOSED:
+                return
+            if event.id > replayed:
+                yield format_event(event)
+    finally:
+        hub.unsubscribe(subscription)
@@ -0,0 +1,161 @@
+import csv
+import io
+import json
+import os
+import zipfile
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .models import Mark, Submission
+from .rubrics import rubric_keys
+from .scoring import criterion_score
+
+
+EXPORT_CHUNK_SIZE = 64 * 1024
+ZIP64_THRESHOLD = 2 ** 31 - 1
+MARKS_FORMATS = ("json", "csv")
+
+
+class _StreamBuffer:
+    """Write-only sink for ZipFile; the generator drains it after every write."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+# ------------------------------
+# Archive contents
+# ------------------------------
+def _safe_name(name, fallback):
+    return get_valid_filename(name) if name and name.strip(" .") else fallback
+
+
+def export_files(assignment):
+    """Yield (archive path, FieldFile) for every stored file of `assignment`."""
+    if assignment.assignment_file:
+        yield "assignment/" + os.path.basename(assignment.assignment_file.name), assignment.assignment_file
+    if assignment.rubric:
+        yield "rubric/" + os.path.basename(assignment.rubric.name), assignment.rubric
+
+    submissions = Submission.objects.filter(assignment=assignment).only("id", "name", "submission_file")
+    for submission in submissions.order_by("id").iterator(chunk_size=500):
+        if not submission.submission_file:
+            continue
+        ext = os.path.splitext(submission.submission_file.name)[1]
+        name = _safe_name(submission.name, "submission")
+        yield f"submissions/{submission.id}_{name}{ext}", submission.submission_file
+
+
+def mark_rows(assignment):
+    """(submission id, submission name, marker email, finalized, total score, marks) of every mark."""
+    return (
+        Mark.objects
+        .filter(submission__assignment=assignment)
+        .order_by("submission_id", "marker_id")
+        .values_list("submission_id", "submission__name", "marker__email", "is_finalized", "total_score", "marks")
+        .iterator(chunk_size=500)
+    )
+
+
+def _write_marks_csv(dest, assignment, rows):
+    keys = rubric_keys(assignment.mark_criteria)
+    text = io.TextIOWrapper(dest, encoding="utf-8", newline="")
+    writer = csv.writer(text)
+    writer.writerow(["submission_id", "submission", "marker", "finalized", "total_score", *keys])
+    for submission_id, submission, marker, finalized, total_score, marks in rows:
+        marks = marks if isinstance(marks, dict) else {}
+        writer.writerow([
+            submission_id, submission, marker, finalized, total_score,
+            *[criterion_score(marks.get(key)) for key in keys],
+        ])
+        yield
+    text.flush()
+    text.detach()
+
+
+def _write_marks_json(dest, assignment, rows):
+    dest.write(b"[")
+    for i, (submission_id, submission, marker, finalized, total_score, marks) in enumerate(rows):
+        row = {
+            "submissionId": submission_id,
+            "submission": submission,
+            "marker": marker,
+            "isFinalized": finalized,
+            "totalScore": total_score,
+            "marks": marks,
+        }
+        dest.write((b"," if i else b"") + json.dumps(row, cls=DjangoJSONEncoder).encode("utf-8"))
+        yield
+    dest.write(b"]")
+
+
+# ------------------------------
+# Streaming
+# ------------------------------
+def iter_assignment_zip(assignment, marks_format=None, chunk_size=EXPORT_CHUNK_SIZE, preload=False):
+    """
+    Return an iterator over a ZIP archive of all files of `assignment` (and an
+    optional marks sheet, "json" or "csv"), built as it is consumed.
+
+    ZipFile writes to an unseekable sink, so entries carry data descriptors and
+    nothing is buffered beyond the chunk being copied: memory use does not
+    depend on the number or size of the files.
+
+    With `preload`, the database rows (file names and marks) are read now,
+    on the calling thread, so the archive can be advanced on other threads
+    (iterate_in_pool) without opening database connections there.
+    """
+    files = export_files(assignment)
+    rows = mark_rows(assignment) if marks_format in MARKS_FORMATS else ()
+    if preload:
+        files, rows = list(files), list(rows)
+    return _zip_chunks(assignment, files, marks_format, rows, chunk_size)
+
+
+def _zip_chunks(assignment, files, marks_format, rows, chunk_size):
+    buffer = _StreamBuffer()
+    now = timezone.now().timetuple()[:6]
+
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for arcname, field_file in files:
+            if not field_file.storage.exists(field_file.name):
+                continue
+            info = zipfile.ZipInfo(arcname, date_time=now)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            force_zip64 = field_file.size >= ZIP64_THRESHOLD
+            with field_file.storage.open(field_file.name, "rb") as src, \
+                    archive.open(info, "w", force_zip64=force_zip64) as dest:
+                for chunk in iter(lambda: src.read(chunk_size), b""):
+                    dest.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+
+        if marks_format in MARKS_FORMATS:
+            info = zipfile.ZipInfo(f"marks.{marks_format}", date_time=now)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            write = _write_marks_csv if marks_format == "csv" else _write_marks_json
+            with archive.open(info, "w") as dest:
+                for _ in write(dest, assignment, rows):
+                    data = buffer.drain()
+                    if data:
+                        yield data
+    yield buffer.drain()  # central directory
+
+
+def export_filename(assignment):
+    return _safe_name(assignment.name, f"assignment_{assignment.id}") + ".zip"
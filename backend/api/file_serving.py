@@ -0,0 +1,222 @@
+import mimetypes
+import os
+import re
+
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import FileField
+from django.db.models.fields.files import FieldFile
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+
+from .storage import cas_sha256
+from .streaming import is_async_request, stream_async, stream_chunk_size
+
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeFile:
+    """Read-only view of `length` bytes of `file` starting at `start`, for FileResponse."""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size) if size else b""
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+# ------------------------------
+# Validators
+# ------------------------------
+def file_etag(sha256):
+    """Strong ETag derived from the stored content digest, or None if it is unknown."""
+    return quote_etag(sha256) if sha256 else None
+
+
+def _last_modified(field_file):
+    try:
+        return int(field_file.storage.get_modified_time(field_file.name).timestamp())
+    except (NotImplementedError, OSError):
+        return None
+
+
+# ------------------------------
+# Ranges
+# ------------------------------
+def parse_range(header, size):
+    """
+    Parse a single-range `Range: bytes=...` header against a file of `size` bytes.
+
+    Returns (start, end) inclusive, None to serve the whole file (no header,
+    multiple ranges or an unknown unit) or raises ValueError if unsatisfiable.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:  # suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified):
+    """A Range is only honoured if the If-Range validator (when sent) still matches."""
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if if_range.startswith(('"', "W/")):
+        return etag is not None and if_range == etag  # strong comparison only
+    since = parse_http_date_safe(if_range)
+    return since is not None and last_modified is not None and last_modified <= since
+
+
+# ------------------------------
+# Reverse-proxy offload
+# ------------------------------
+def offload_response(field_file, content_type, as_attachment, filename):
+    """
+    An empty response telling the front proxy to send the file itself, or None
+    when offload is disabled (API_FILE_OFFLOAD) or impossible for this storage.
+
+    - "x-accel-redirect" (nginx): redirects to API_FILE_OFFLOAD_PREFIX + file name,
+      which must be an `internal` location aliased to MEDIA_ROOT.
+    - "x-sendfile" (Apache mod_xsendfile, lighttpd): sends the absolute file path.
+    The proxy then also answers Range requests.
+    """
+    mode = getattr(settings, "API_FILE_OFFLOAD", "")
+    if mode == "x-accel-redirect":
+        prefix = getattr(settings, "API_FILE_OFFLOAD_PREFIX", "/protected-media/")
+        resolve = getattr(field_file.storage, "resolve", None)  # content-addressed blobs
+        name = resolve(field_file.name) if resolve else field_file.name
+        header, target = "X-Accel-Redirect", prefix.rstrip("/") + "/" + quote(name)
+    elif mode == "x-sendfile":
+        try:
+            target = field_file.path
+        except NotImplementedError:  # not a local filesystem storage
+            return None
+        header = "X-Sendfile"
+    else:
+        return None
+
+    response = HttpResponse(content_type=content_type)
+    response[header] = target
+    response["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+    return response
+
+
+# ------------------------------
+# Responses
+# ------------------------------
+def serve_file(request, field_file, sha256="", content_type=None, as_attachment=True):
+    """
+    Serve a stored file with HTTP validators and byte-range support.
+
+    Sends a strong ETag (from `sha256`) and Last-Modified. It answers
+    If-None-Match/If-Modified-Since with 304, and a single `Range` with 206 or
+    416. Clients must revalidate (Cache-Control: no-cache), so a repeat view
+    costs a 304 instead of the whole file. With API_FILE_OFFLOAD set, the bytes
+    are sent by the front proxy instead of this worker. Object storage backends
+    redirect to a short-lived presigned URL instead (API_S3_PRESIGNED_DOWNLOADS).
+    Under ASGI the body is read without blocking the event loop (api/streaming.py).
+    """
+    if not field_file or not field_file.storage.exists(field_file.name):
+        raise Http404("File not found")
+
+    filename = os.path.basename(field_file.name)
+    if content_type is None:
+        content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    etag = file_etag(sha256)
+    last_modified = _last_modified(field_file)
+
+    headers = {"Accept-Ranges": "bytes", "Cache-Control": "private, no-cache"}
+    if etag:
+        headers["ETag"] = etag
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+
+    validators = HttpResponse(headers=headers)
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified, response=validators)
+    if conditional is not validators:
+        return conditional  # 304 Not Modified or 412 Precondition Failed
+
+    presign = getattr(field_file.storage, "presigned_download_url", None)
+    if presign is not None and getattr(settings, "API_S3_PRESIGNED_DOWNLOADS", True):
+        response = HttpResponseRedirect(presign(field_file.name, filename, content_type, as_attachment))
+        response["Cache-Control"] = "private, no-store"  # the URL expires
+        return response
+
+    response = offload_response(field_file, content_type, as_attachment, filename)
+    if response is not None:
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    size = field_file.size
+    byte_range = None
+    if _if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(request.headers.get("Range"), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    file = field_file.storage.open(field_file.name, "rb")
+    if byte_range is None:
+        source = file
+        response = FileResponse(source, content_type=content_type, as_attachment=as_attachment, filename=filename)
+        response["Content-Length"] = size
+    else:
+        start, end = byte_range
+        source = RangeFile(file, start, end - start + 1)
+        response = FileResponse(
+            source, status=206, content_type=content_type, as_attachment=as_attachment, filename=filename,
+        )
+        response["Content-Length"] = end - start + 1
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response.block_size = stream_chunk_size()
+
+    # Under ASGI, read from the media I/O pool as the client consumes the body;
+    # a plain file would be read whole on Django's thread-sensitive executor
+    if is_async_request(request):
+        stream_async(response, source)
+
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+def serve_media(request, name, sha256=""):
+    """
+    Serve the default storage's file `name`, as linked by FieldFile.url (MEDIA_URL).
+
+    Goes through serve_file, so /media links keep working when the front proxy
+    sends the bytes (API_FILE_OFFLOAD) and its location is `internal`.
+    """
+    field_file = FieldFile(None, FileField(), name)
+    try:
+        return serve_file(request, field_file, sha256=sha256 or cas_sha256(name) or "", as_attachment=False)
+    except SuspiciousFileOperation:  # a path outside MEDIA_ROOT
+        raise Http404("File not found")
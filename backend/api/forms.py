@@ -1,5 +1,10 @@
 from django import forms
-from .models import Assignment, Submission, Mark, User
+from django.conf import settings
+from django.db import transaction
+from .blobs import acquire_files
+from .models import Assignment, Submission
+from .scoring import rubric_level_scores
+from .stats_cache import bump_data_version
 import json
 
 
@@ -13,30 +18,52 @@ class AssignmentCreateForm(forms.ModelForm):
         fields = ["name", "creation_date", "due_date", "rubric", "assignment_file", "mark_criteria"]
 
     def save(self, administrator, submissions_data, *args, **kwargs):
-        # 1. Save assignment
+        """
+        Create the assignment and its submissions in one transaction.
+
+        Submissions are inserted with bulk_create in batches of
+        API_BULK_CREATE_BATCH_SIZE. If anything fails, nothing is written to the
+        database and files already stored for this assignment are removed.
+        """
+        batch_size = getattr(settings, "API_BULK_CREATE_BATCH_SIZE", 500)
         assignment = super().save(commit=False)
-        assignment.administrator = administrator
-        assignment.mark_criteria = json.loads(self.cleaned_data["mark_criteria"])
-        assignment.save()
-
-        # 2. Create submissions
-        for sub in submissions_data:
-            submission = Submission.objects.create(
-                name=sub["name"],
-                submission_file=sub["submission_file"],
-                comment=sub.get("comment", ""),
-                admin_marks=json.loads(sub["admin_marks"]),
-                assignment=assignment,
-            )
-
-            # 3. Create Mark objects for all markers
-            markers = User.objects.filter(role="marker")
-            for marker in markers:
-                Mark.objects.create(
-                    marks={},  # markers will fill this later
-                    is_finalized=False,
-                    marker=marker,
-                    submission=submission,
-                )
+        submissions = []
+
+        try:
+            with transaction.atomic():
+                # 1. Save assignment
+                assignment.administrator = administrator
+                assignment.mark_criteria = json.loads(self.cleaned_data["mark_criteria"])
+                assignment.save()
+
+                # 2. Create submissions
+                rubric_scores = rubric_level_scores(assignment.mark_criteria)
+                # Marks are not created here: a marker's Mark row is materialized the first
+                # time they open or save a submission (see submission_mark_view).
+                for sub in submissions_data:
+                    submission = Submission(
+                        name=sub["name"],
+                        submission_file=sub["submission_file"],
+                        comment=sub.get("comment", ""),
+                        admin_marks=json.loads(sub["admin_marks"]),
+                        assignment=assignment,
+                    )
+                    # bulk_create skips Submission.save()
+                    submission.refresh_scores(rubric_scores)
+                    submission.refresh_digests()
+                    submissions.append(submission)
+                Submission.objects.bulk_create(submissions, batch_size=batch_size)
+                acquire_files(submissions)  # bulk_create sends no post_save
+
+                # 3. Start a fresh statistics version for the new assignment
+                bump_data_version(assignment.id)
+        except Exception:
+            # The rows are rolled back, but stored files are not
+            for field_file in [assignment.rubric, assignment.assignment_file] + [
+                s.submission_file for s in submissions
+            ]:
+                if field_file and field_file._committed:
+                    field_file.delete(save=False)
+            raise
 
         return assignment
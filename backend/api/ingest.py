@@ -0,0 +1,114 @@
+import os
+import posixpath
+import zipfile
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+
+from .blobs import acquire_files
+from .digests import HashingReader
+from .models import Submission
+from .stats_cache import bump_data_version
+
+
+class IngestError(Exception):
+    """Raised when a submissions archive cannot be ingested; `status` is the HTTP status to return."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+# ------------------------------
+# Archive entries
+# ------------------------------
+def _is_submission_entry(info):
+    """Skip directories and archiver metadata such as __MACOSX/ and .DS_Store."""
+    if info.is_dir():
+        return False
+    parts = info.filename.replace("\\", "/").split("/")
+    return not any(part.startswith(".") or part == "__MACOSX" for part in parts)
+
+
+def submission_name(entry_name):
+    """Submission name for an archive entry: the file name without its extension."""
+    base = posixpath.basename(entry_name.replace("\\", "/"))
+    stem = os.path.splitext(base)[0] or base
+    return stem[:Submission._meta.get_field("name").max_length]
+
+
+def submission_entries(archive):
+    """
+    The entries of `archive` (a zipfile.ZipFile) that become submissions, in archive order.
+
+    Only the central directory is read here, so the limits are enforced before
+    any entry is decompressed.
+    """
+    max_entries = getattr(settings, "API_INGEST_MAX_ENTRIES", 1000)
+    max_size = getattr(settings, "API_UPLOAD_MAX_SIZE", 1024 * 1024 * 1024)
+
+    entries = [info for info in archive.infolist() if _is_submission_entry(info)]
+    if not entries:
+        raise IngestError("The archive contains no submission files")
+    if len(entries) > max_entries:
+        raise IngestError(f"The archive contains more than {max_entries} files", status=413)
+    for info in entries:
+        if info.file_size > max_size:
+            raise IngestError(f"{info.filename} is too large", status=413)
+    return entries
+
+
+# ------------------------------
+# Ingestion
+# ------------------------------
+def ingest_submission_zip(assignment, archive_file):
+    """
+    Create one Submission of `assignment` per file in the ZIP `archive_file`.
+
+    `archive_file` is any seekable file object, typically the uploaded file,
+    which Django spools to disk above FILE_UPLOAD_MAX_MEMORY_SIZE. Each entry
+    is decompressed straight into storage, so neither the archive nor its
+    contents are extracted to a temp dir or held in memory.
+
+    Rows are inserted with bulk_create in one transaction. If anything fails,
+    nothing is written to the database and files already stored are removed.
+    """
+    batch_size = getattr(settings, "API_BULK_CREATE_BATCH_SIZE", 500)
+    submissions = []
+
+    try:
+        archive = zipfile.ZipFile(archive_file)
+    except (zipfile.BadZipFile, OSError):
+        raise IngestError("Not a valid ZIP archive")
+
+    try:
+        with archive, transaction.atomic():
+            for info in submission_entries(archive):
+                submission = Submission(
+                    name=submission_name(info.filename),
+                    comment="",
+                    admin_marks={},
+                    assignment=assignment,
+                )
+                submission.refresh_scores()  # bulk_create skips Submission.save()
+                submissions.append(submission)
+                with archive.open(info) as entry:
+                    base = posixpath.basename(info.filename.replace("\\", "/"))
+                    reader = HashingReader(entry)
+                    submission.submission_file.save(base, File(reader, name=base), save=False)
+                    submission.submission_sha256 = reader.hexdigest()
+
+            Submission.objects.bulk_create(submissions, batch_size=batch_size)
+            acquire_files(submissions)  # bulk_create sends no post_save
+            bump_data_version(assignment.id)
+    except Exception as e:
+        # The rows are rolled back, but stored files are not
+        for submission in submissions:
+            submission.submission_file.delete(save=False)
+        if isinstance(e, zipfile.BadZipFile):
+            raise IngestError(f"Corrupt archive: {e}")
+        raise
+
+    return submissions
@@ -0,0 +1,145 @@
+import asyncio
+import statistics
+import time
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from django.utils import timezone
+
+from api import views
+from api.models import Assignment, CriterionScore, Mark, Submission, User
+from api.progress import rebuild_progress
+from api.stats_cache import stats_cache
+
+
+VIEWS = (
+    "login_status_view",
+    "show_assignments_view",
+    "assignment_detail_view",
+    "marker_assignment_detail_view",
+    "marks_by_submission_view",
+    "mark_comparison_view",
+)
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare throughput of the sync and async versions of the hot read views "
+        "with many concurrent clients on one event loop. Sync views run through "
+        "sync_to_async(thread_sensitive=True), as Django's ASGI handler runs them. "
+        "Middleware is left out, so both variants pay the same fixed costs. "
+        "All rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=200)
+        parser.add_argument("--requests", type=int, default=5, help="Requests per client")
+        parser.add_argument("--markers", type=int, default=5)
+        parser.add_argument("--submissions", type=int, default=20)
+        parser.add_argument("--views", nargs="+", choices=VIEWS, default=list(VIEWS))
+
+    def _seed(self, markers, submissions):
+        admin = User.objects.create_user(
+            username="bench-admin", email="bench-admin@example.com", password="x", role="admin"
+        )
+        User.objects.bulk_create([
+            User(username=f"bench-marker-{i}", email=f"bench-marker-{i}@example.com", role="marker")
+            for i in range(markers)
+        ])
+        marker_list = list(User.objects.filter(username__startswith="bench-marker-"))
+        assignment = Assignment.objects.create(
+            name="Benchmark",
+            creation_date=timezone.now(),
+            due_date=timezone.now() + timezone.timedelta(days=7),
+            mark_criteria={"levels": [], "criteria": [{"id": "c1"}, {"id": "c2"}]},
+            administrator=admin,
+        )
+        Submission.objects.bulk_create([
+            Submission(name=f"Submission {i}", comment="", admin_marks={"c1": 3, "c2": 2}, assignment=assignment)
+            for i in range(submissions)
+        ])
+        submission_list = list(Submission.objects.filter(assignment=assignment))
+        marks = [
+            Mark(marker=marker, submission=submission, marks={"c1": i % 5, "c2": 2}, is_finalized=True)
+            for submission in submission_list
+            for i, marker in enumerate(marker_list)
+        ]
+        for mark in marks:
+            mark.refresh_scores()  # bulk_create skips Mark.save()
+        Mark.objects.bulk_create(marks)
+        CriterionScore.rebuild_for(Mark.objects.filter(submission__assignment=assignment))
+        rebuild_progress([assignment.id])
+        return admin, marker_list[0], assignment, submission_list[0]
+
+    def _calls(self, admin, marker, assignment, submission):
+        """{view name: (user, view kwargs)}"""
+        return {
+            "login_status_view": (marker, {}),
+            "show_assignments_view": (admin, {"id": admin.id}),
+            "assignment_detail_view": (admin, {"assignment_id": assignment.id}),
+            "marker_assignment_detail_view": (marker, {"assignment_id": assignment.id, "user_id": marker.id}),
+            "marks_by_submission_view": (admin, {"submission_id": submission.id}),
+            "mark_comparison_view": (admin, {"assignment_id": assignment.id, "submission_id": submission.id}),
+        }
+
+    async def _run(self, handler, user, kwargs, clients, requests):
+        factory = RequestFactory()
+        latencies = []
+
+        async def client():
+            for _ in range(requests):
+                request = factory.get("/", HTTP_X_SESSION_ID="benchmark")
+                request.api_user = user  # normally set by ApiSessionMiddleware
+                start = time.perf_counter()
+                response = await handler(request, **kwargs)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{handler} returned {response.status_code}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        return time.perf_counter() - start, latencies
+
+    def _report(self, label, elapsed, latencies):
+        latencies = sorted(latencies)
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        self.stdout.write(
+            f"  {label:<5} {len(latencies) / elapsed:8.0f} req/s   "
+            f"median {statistics.median(latencies) * 1000:7.1f} ms   p95 {p95 * 1000:7.1f} ms"
+        )
+        return len(latencies) / elapsed
+
+    def handle(self, *args, **options):
+        clients, requests = options["clients"], options["requests"]
+        try:
+            with transaction.atomic():
+                calls = self._calls(*self._seed(options["markers"], options["submissions"]))
+                self.stdout.write(
+                    f"{clients} concurrent clients x {requests} requests, "
+                    f"{options['markers']} markers, {options['submissions']} submissions"
+                )
+                for name in options["views"]:
+                    user, kwargs = calls[name]
+                    sync_view = sync_to_async(getattr(views, name))  # what ASGIHandler does for sync views
+                    async_view = getattr(views, "a" + name)
+
+                    self.stdout.write(name)
+                    stats_cache.clear()
+                    # async_to_sync keeps thread-sensitive calls on this thread, inside the transaction
+                    sync_rate = self._report(
+                        "sync", *async_to_sync(self._run)(sync_view, user, kwargs, clients, requests)
+                    )
+                    stats_cache.clear()
+                    async_rate = self._report(
+                        "async", *async_to_sync(self._run)(async_view, user, kwargs, clients, requests)
+                    )
+                    self.stdout.write(f"  async/sync {async_rate / sync_rate:.2f}x")
+                raise _Rollback
+        except _Rollback:
+            pass
@@ -0,0 +1,86 @@
+import statistics
+import tempfile
+import time
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+
+from api.models import User
+from api.views import create_assignment_view
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure end-to-end latency of create_assignment_view with many markers. "
+        "All rows are rolled back and files are written to a temporary MEDIA_ROOT."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--markers", type=int, default=200)
+        parser.add_argument("--submissions", type=int, default=2)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def _request(self, factory, admin, submissions):
+        data = {
+            "name": "Benchmark",
+            "creation_date": "2025-01-01T00:00:00Z",
+            "due_date": "2025-02-01T00:00:00Z",
+            "mark_criteria": '{"levels": [], "criteria": []}',
+            "rubric": SimpleUploadedFile("rubric.docx", b"rubric"),
+            "assignment_file": SimpleUploadedFile("assignment.pdf", b"%PDF-1.4 assignment"),
+        }
+        for i in range(submissions):
+            data[f"submissions[{i}][name]"] = f"Submission {i + 1}"
+            data[f"submissions[{i}][comment]"] = ""
+            data[f"submissions[{i}][admin_marks]"] = "{}"
+            data[f"submissions[{i}][submission_file]"] = SimpleUploadedFile(
+                f"submission_{i + 1}.pdf", b"%PDF-1.4 submission"
+            )
+        request = factory.post("/api/assignment/create", data, HTTP_X_SESSION_ID="benchmark")
+        request.api_user = admin  # normally set by ApiSessionMiddleware
+        return request
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        timings = []
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root, DATA_UPLOAD_MAX_NUMBER_FILES=None
+        ):
+            try:
+                with transaction.atomic():
+                    admin = User.objects.create_user(
+                        username="bench-admin", email="bench-admin@example.com", password="x", role="admin"
+                    )
+                    User.objects.bulk_create([
+                        User(username=f"bench-marker-{i}", email=f"bench-marker-{i}@example.com", role="marker")
+                        for i in range(options["markers"])
+                    ])
+
+                    for _ in range(options["repeat"]):
+                        request = self._request(factory, admin, options["submissions"])
+                        start = time.perf_counter()
+                        response = create_assignment_view(request)
+                        timings.append(time.perf_counter() - start)
+                        if response.status_code != 201:
+                            self.stderr.write(response.content.decode())
+                            break
+                    raise _Rollback
+            except _Rollback:
+                pass
+
+        if not timings:
+            return
+        self.stdout.write(
+            f"create_assignment_view, {options['markers']} markers, "
+            f"{options['submissions']} submissions, {len(timings)} runs"
+        )
+        self.stdout.write(f"  median {statistics.median(timings) * 1000:.1f} ms")
+        self.stdout.write(f"  mean   {statistics.mean(timings) * 1000:.1f} ms")
+        self.stdout.write(f"  max    {max(timings) * 1000:.1f} ms")
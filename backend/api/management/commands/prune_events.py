@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from api.events import prune_events
+
+
+class Command(BaseCommand):
+    help = "Delete moderation events older than API_EVENTS_RETENTION seconds."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention", type=int, default=None,
+            help="Keep events from the last RETENTION seconds (default: API_EVENTS_RETENTION).",
+        )
+
+    def handle(self, *args, **options):
+        deleted = prune_events(options["retention"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} moderation event(s)"))
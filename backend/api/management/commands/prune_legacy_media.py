@@ -0,0 +1,28 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from api.blobs import legacy_files
+
+
+class Command(BaseCommand):
+    help = (
+        "List media files left in place by the move to content-addressed blobs "
+        "(migration 0012): unreferenced files whose content is stored as a blob. "
+        "With --delete, remove them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--delete", action="store_true", help="Remove the files instead of listing them.")
+
+    def handle(self, *args, **options):
+        count = 0
+        for name, sha256 in legacy_files():
+            count += 1
+            if options["delete"]:
+                default_storage.delete(name)
+            self.stdout.write(f"{name} -> blobs/{sha256[:2]}/{sha256}")
+
+        if options["delete"]:
+            self.stdout.write(self.style.SUCCESS(f"Removed {count} legacy media file(s)"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{count} legacy media file(s) can be removed (run with --delete)"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.blobs import rebuild_references
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount references to content-addressed blobs from every file field "
+        "and remove blobs that nothing references."
+    )
+
+    def handle(self, *args, **options):
+        removed = rebuild_references()
+        self.stdout.write(self.style.SUCCESS(f"Blob references rebuilt ({removed} unreferenced blob(s) removed)"))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.progress import rebuild_progress, verify_progress
+
+
+class Command(BaseCommand):
+    help = "Verify and rebuild the per-assignment mark progress counters."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "assignment_ids", nargs="*", type=int,
+            help="Only these assignments (default: all).",
+        )
+        parser.add_argument(
+            "--check", action="store_true",
+            help="Only report mismatches; exit with an error if any are found.",
+        )
+
+    def handle(self, *args, **options):
+        assignment_ids = options["assignment_ids"] or None
+
+        problems = verify_progress(assignment_ids)
+        for problem in problems:
+            self.stdout.write(problem)
+
+        if options["check"]:
+            if problems:
+                raise CommandError(f"{len(problems)} progress counter(s) out of date")
+            self.stdout.write(self.style.SUCCESS("Progress counters are consistent"))
+            return
+
+        rebuild_progress(assignment_ids)
+        remaining = verify_progress(assignment_ids)
+        if remaining:
+            raise CommandError(f"{len(remaining)} progress counter(s) still inconsistent after rebuild")
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt progress counters ({len(problems)} mismatch(es) fixed)"
+        ))
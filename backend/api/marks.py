@@ -0,0 +1,207 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .events import emit_marks_saved
+from .models import CriterionScore, Mark, Submission
+from .progress import rebuild_progress, record_mark_change
+from .scoring import criterion_entries
+from .stats_cache import bump_data_version
+
+
+CRITERION_KEY_MAX_LENGTH = CriterionScore._meta.get_field("criterion_key").max_length
+
+
+class MarkBatchError(Exception):
+    """The batch as a whole is unusable (not a list, too many items)."""
+
+
+class MarkConflict(Exception):
+    """The mark was written since the client loaded it; `mark` is the current row."""
+
+    def __init__(self, mark):
+        super().__init__(f"Mark {mark.id} is at version {mark.version}")
+        self.mark = mark
+
+
+def merge_marks(marks, changes):
+    """`marks` with `changes` applied; a None value removes that criterion."""
+    merged = dict(marks) if isinstance(marks, dict) else {}
+    for key, value in changes.items():
+        if value is None:
+            merged.pop(key, None)
+        else:
+            merged[key] = value
+    return merged
+
+
+def criterion_keys_error(marks):
+    """Return an error message if a criterion id of `marks` is too long to store, or None."""
+    if isinstance(marks, dict) and any(len(str(key)) > CRITERION_KEY_MAX_LENGTH for key in marks):
+        return f"Criterion ids must be at most {CRITERION_KEY_MAX_LENGTH} characters"
+    return None
+
+
+def _rebuild_criteria(mark, keys):
+    """Replace only the criterion rows of `keys`, instead of every row of the mark."""
+    keys = {str(key) for key in keys}
+    CriterionScore.objects.filter(mark_id=mark.id, criterion_key__in=keys).delete()
+    CriterionScore.objects.bulk_create([
+        CriterionScore(mark_id=mark.id, submission_id=mark.submission_id, criterion_key=key, value=value, level=level)
+        for key, value, level in criterion_entries({k: v for k, v in mark.marks.items() if str(k) in keys})
+    ])
+
+
+def apply_mark_delta(marker, submission, version, changes, is_finalized=None):
+    """
+    Apply the changed criteria of an autosave to `marker`'s mark of `submission`.
+
+    The write is a single `UPDATE ... WHERE version = <version>`, so it only lands
+    if nobody saved the mark since the client loaded `version`. Otherwise
+    MarkConflict is raised with the current mark and nothing is written.
+    Returns the updated Mark.
+    """
+    with transaction.atomic():
+        mark, created = Mark.objects.get_or_create(
+            marker=marker, submission=submission, defaults={"marks": {}, "is_finalized": False}
+        )
+        if mark.version != version:
+            raise MarkConflict(mark)
+
+        was_finalized = mark.is_finalized
+        mark.marks = merge_marks(mark.marks, changes)
+        if is_finalized is not None:
+            mark.is_finalized = bool(is_finalized)
+        mark.refresh_scores()
+
+        updated = Mark.objects.filter(id=mark.id, version=version).update(
+            marks=mark.marks,
+            is_finalized=mark.is_finalized,
+            total_score=mark.total_score,
+            scored_criteria=mark.scored_criteria,
+            version=F("version") + 1,
+        )
+        if not updated:  # lost the race since the read above
+            raise MarkConflict(Mark.objects.get(id=mark.id))
+        mark.version = version + 1
+
+        _rebuild_criteria(mark, changes)
+        assignment_id = submission.assignment_id
+        record_mark_change(
+            assignment_id, marker.id,
+            created=created, was_finalized=was_finalized, is_finalized=mark.is_finalized,
+        )
+        bump_data_version(assignment_id)
+        emit_marks_saved(assignment_id, [mark], was_finalized=[mark.id] if was_finalized else ())
+    return mark
+
+
+# ------------------------------
+# Batch saves
+# ------------------------------
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _validate_item(item, seen):
+    """Return an error message for one batch item, or None if it can be written."""
+    if not isinstance(item, dict):
+        return "Each item must be an object"
+    submission_id = item.get("submission_id")
+    if not _is_int(submission_id):
+        return "submission_id must be an integer"
+    if submission_id in seen:
+        return "Duplicate submission_id in batch"
+    if not isinstance(item.get("marks", {}), dict):
+        return "marks must be an object"
+    if not isinstance(item.get("is_finalized", False), bool):
+        return "is_finalized must be a boolean"
+    if "version" in item and not _is_int(item["version"]):
+        return "version must be an integer"
+    return criterion_keys_error(item.get("marks"))
+
+
+def _result(submission_id, status, message=None, mark=None):
+    result = {"submission_id": submission_id, "status": status}
+    if message:
+        result["message"] = message
+    if mark is not None:
+        result["mark"] = {"id": mark.id, "is_finalized": mark.is_finalized, "version": mark.version}
+    return result
+
+
+def save_marks_batch(marker, assignment, items):
+    """
+    Save `marker`'s marks for many submissions of `assignment` at once.
+
+    Each item is {"submission_id", "marks", "is_finalized", "version"?}, and
+    replaces that mark like a POST to the single-mark endpoint. With
+    "version", a mark saved elsewhere since is skipped as a conflict. Invalid
+    items are reported and skipped. The rest are written in one transaction:
+    one bulk_create for new marks and one bulk_update for existing ones.
+    Returns a result per item, in request order.
+    """
+    max_items = getattr(settings, "API_MARK_BATCH_MAX_ITEMS", 500)
+    if not isinstance(items, list) or not items:
+        raise MarkBatchError("marks must be a non-empty list")
+    if len(items) > max_items:
+        raise MarkBatchError(f"At most {max_items} marks per batch")
+
+    results = [None] * len(items)
+    valid = {}
+    for i, item in enumerate(items):
+        error = _validate_item(item, valid)
+        if error:
+            results[i] = _result(item.get("submission_id") if isinstance(item, dict) else None, "error", error)
+        else:
+            valid[item["submission_id"]] = (i, item)
+
+    known = set(
+        Submission.objects.filter(assignment=assignment, id__in=list(valid)).values_list("id", flat=True)
+    )
+    for submission_id in [s for s in valid if s not in known]:
+        i, _ = valid.pop(submission_id)
+        results[i] = _result(submission_id, "error", "Submission not found in this assignment")
+
+    batch_size = getattr(settings, "API_BULK_CREATE_BATCH_SIZE", 500)
+    with transaction.atomic():
+        existing = {
+            mark.submission_id: mark
+            for mark in Mark.objects.select_for_update().filter(marker=marker, submission_id__in=list(valid))
+        }
+        was_finalized = [mark.id for mark in existing.values() if mark.is_finalized]
+        created, updated = [], []
+        for submission_id, (i, item) in valid.items():
+            mark = existing.get(submission_id)
+            version = item.get("version")
+            if mark is not None and version is not None and mark.version != version:
+                results[i] = _result(submission_id, "conflict", "Mark was changed in another session", mark)
+                continue
+            if mark is None:
+                if version not in (None, 1):
+                    results[i] = _result(submission_id, "conflict", "Mark does not exist yet")
+                    continue
+                mark = Mark(marker=marker, submission_id=submission_id)
+                created.append(mark)
+            else:
+                mark.version += 1
+                updated.append(mark)
+            mark.marks = item.get("marks", {})
+            mark.is_finalized = item.get("is_finalized", False)
+            mark.refresh_scores()  # bulk writes skip Mark.save()
+
+        Mark.objects.bulk_create(created, batch_size=batch_size)
+        Mark.objects.bulk_update(
+            updated, ["marks", "is_finalized", "total_score", "scored_criteria", "version"], batch_size=batch_size
+        )
+        written = sorted(created + updated, key=lambda mark: valid[mark.submission_id][0])
+        if written:
+            CriterionScore.rebuild_for(written)
+            rebuild_progress([assignment.id])
+            bump_data_version(assignment.id)
+            emit_marks_saved(assignment.id, written, was_finalized=was_finalized)
+
+    for mark in written:
+        i, _ = valid[mark.submission_id]
+        results[i] = _result(mark.submission_id, "saved", mark=mark)
+    return results
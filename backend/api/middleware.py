@@ -0,0 +1,239 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .tokens import looks_like_token, verify_token
+
+
+User = get_user_model()
+
+SESSION_HEADER = "X-Session-ID"
+
+
+# ------------------------------
+# Session -> user cache
+# ------------------------------
+class SessionUserCache:
+    """
+    Bounded, thread-safe LRU cache mapping a session key to the user it
+    authenticates.
+
+    Entries expire after `ttl` seconds or when the underlying Django session
+    expires, whichever comes first. Each worker process has its own cache, and
+    invalidate() only reaches the worker that calls it: after a logout, other
+    workers keep accepting the session key for up to `ttl` seconds, so keep
+    the TTL short.
+    """
+
+    def __init__(self, max_size=1024, ttl=5):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (user, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        # Hand out a copy so a view mutating its user cannot leak into other requests
+        return copy.copy(user)
+
+    def set(self, key, user, expire_date=None):
+        expires_at = time.monotonic() + self.ttl
+        if expire_date is not None:
+            remaining = (expire_date - timezone.now()).total_seconds()
+            expires_at = min(expires_at, time.monotonic() + remaining)
+        with self._lock:
+            self._entries[key] = (user, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_user(self, user_id):
+        """Drop every cached session that belongs to `user_id`."""
+        with self._lock:
+            stale = [k for k, (u, _) in self._entries.items() if u.pk == user_id]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+session_cache = SessionUserCache(
+    max_size=getattr(settings, "API_SESSION_CACHE_SIZE", 1024),
+    ttl=getattr(settings, "API_SESSION_CACHE_TTL", 5),
+)
+
+
+def resolve_session_user(session_key):
+    """
+    Return the user authenticated by `session_key`, or None.
+
+    Looks in the in-process cache first and falls back to the session table.
+    Expired sessions never resolve.
+    """
+    if not session_key:
+        return None
+
+    user = session_cache.get(session_key)
+    if user is not None:
+        return user
+    return _load_session_user(session_key)
+
+
+def _load_session_user(session_key):
+    """Cache miss path of resolve_session_user: read the session and user rows."""
+    try:
+        session = Session.objects.get(session_key=session_key, expire_date__gt=timezone.now())
+    except Session.DoesNotExist:
+        return None
+
+    uid = session.get_decoded().get("_auth_user_id")
+    user = User.objects.filter(pk=uid).first() if uid else None
+    if user is None:
+        return None
+
+    session_cache.set(session_key, user, expire_date=session.expire_date)
+    return copy.copy(user)
+
+
+def resolve_token_user(token):
+    """
+    Return the user authenticated by a signed token, or None.
+
+    The signature and expiry are checked without a database round trip. The
+    user row is only loaded on a cache miss, which is also when a bumped
+    token generation (see tokens.revoke_tokens) becomes visible to this worker.
+    """
+    claims = verify_token(token)
+    if claims is None:
+        return None
+    user = session_cache.get(f"token-user:{claims.user_id}") or _load_token_user(claims.user_id)
+    return _check_generation(user, claims)
+
+
+def _load_token_user(user_id):
+    """Cache miss path of resolve_token_user."""
+    user = User.objects.filter(pk=user_id).first()
+    if user is None:
+        return None
+    session_cache.set(f"token-user:{user_id}", user)
+    return copy.copy(user)
+
+
+def _check_generation(user, claims):
+    if user is None or user.token_generation != claims.generation:
+        return None
+    return user
+
+
+def resolve_request_user(header_value):
+    """Resolve an X-Session-ID header holding either a signed token or a session key."""
+    if looks_like_token(header_value):
+        return resolve_token_user(header_value)
+    return resolve_session_user(header_value)
+
+
+async def aresolve_request_user(header_value):
+    """
+    Async resolve_request_user. Cache hits never leave the event loop; a miss
+    does its queries in one sync_to_async call rather than one per query.
+    """
+    if looks_like_token(header_value):
+        claims = verify_token(header_value)
+        if claims is None:
+            return None
+        user = session_cache.get(f"token-user:{claims.user_id}")
+        if user is None:
+            user = await sync_to_async(_load_token_user)(claims.user_id)
+        return _check_generation(user, claims)
+
+    if not header_value:
+        return None
+    user = session_cache.get(header_value)
+    if user is None:
+        user = await sync_to_async(_load_session_user)(header_value)
+    return user
+
+
+# ------------------------------
+# Middleware
+# ------------------------------
+class ApiSessionMiddleware:
+    """
+    Resolves the X-Session-ID header once per request and attaches the
+    authenticated user as `request.api_user` (None when missing or invalid).
+    The header may carry a Django session key or a signed token (API_AUTH_MODE).
+
+    Sync and async capable, so under ASGI async views are reached without a
+    thread switch.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.api_user = resolve_request_user(request.headers.get(SESSION_HEADER))
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        request.api_user = await aresolve_request_user(request.headers.get(SESSION_HEADER))
+        return await self.get_response(request)
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoiseMiddleware that can also run in an async middleware chain.
+
+    WhiteNoise is sync only. Left as is, it would make Django adapt every
+    request under ASGI back into a thread, including requests for async views.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings=settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
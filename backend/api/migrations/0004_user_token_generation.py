@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0003_alter_user_role"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="token_generation",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_progress(apps, schema_editor):
+    Assignment = apps.get_model("api", "Assignment")
+    Mark = apps.get_model("api", "Mark")
+    MarkerProgress = apps.get_model("api", "MarkerProgress")
+
+    rows = Mark.objects.values("submission__assignment_id", "marker_id").annotate(
+        total=Count("id"),
+        finalized=Count("id", filter=Q(is_finalized=True)),
+    )
+    totals = {}
+    progress = []
+    for row in rows:
+        assignment_id = row["submission__assignment_id"]
+        progress.append(
+            MarkerProgress(
+                assignment_id=assignment_id,
+                marker_id=row["marker_id"],
+                marks_total=row["total"],
+                marks_finalized=row["finalized"],
+            )
+        )
+        total, finalized = totals.get(assignment_id, (0, 0))
+        totals[assignment_id] = (total + row["total"], finalized + row["finalized"])
+    MarkerProgress.objects.bulk_create(progress)
+
+    for assignment_id, (total, finalized) in totals.items():
+        Assignment.objects.filter(id=assignment_id).update(
+            marks_total=total, marks_finalized=finalized
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0004_user_token_generation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="assignment",
+            name="marks_finalized",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="assignment",
+            name="marks_total",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name="MarkerProgress",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("marks_total", models.PositiveIntegerField(default=0)),
+                ("marks_finalized", models.PositiveIntegerField(default=0)),
+                (
+                    "assignment",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="marker_progress",
+                        to="api.assignment",
+                    ),
+                ),
+                (
+                    "marker",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="marker_progress",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("assignment", "marker"), name="unique_marker_progress"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_progress, migrations.RunPython.noop),
+    ]
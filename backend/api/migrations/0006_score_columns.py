@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:41
+
+from django.db import migrations, models
+
+
+def _summarize(marks):
+    # Frozen copy of api.scoring.summarize_marks
+    total, count = 0.0, 0
+    if isinstance(marks, dict):
+        for value in marks.values():
+            if isinstance(value, dict):
+                value = value.get("score")
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            total += value
+            count += 1
+    return total, count
+
+
+def backfill_scores(apps, schema_editor):
+    Mark = apps.get_model("api", "Mark")
+    Submission = apps.get_model("api", "Submission")
+
+    marks = []
+    for mark in Mark.objects.only("id", "marks").iterator(chunk_size=1000):
+        mark.total_score, mark.scored_criteria = _summarize(mark.marks)
+        marks.append(mark)
+    Mark.objects.bulk_update(marks, ["total_score", "scored_criteria"], batch_size=1000)
+
+    submissions = []
+    for submission in Submission.objects.only("id", "admin_marks").iterator(chunk_size=1000):
+        submission.admin_total_score, submission.admin_scored_criteria = _summarize(
+            submission.admin_marks
+        )
+        submissions.append(submission)
+    Submission.objects.bulk_update(
+        submissions, ["admin_total_score", "admin_scored_criteria"], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0005_progress_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="mark",
+            name="scored_criteria",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="mark",
+            name="total_score",
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name="submission",
+            name="admin_scored_criteria",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="submission",
+            name="admin_total_score",
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(backfill_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _entries(marks):
+    # Frozen copy of api.scoring.criterion_entries
+    if not isinstance(marks, dict):
+        return
+    for key, value in marks.items():
+        score, level = value, None
+        if isinstance(value, dict):
+            score = value.get("score")
+            level = value.get("level_index")
+        if isinstance(score, bool) or not isinstance(score, (int, float)):
+            score = None
+        if isinstance(level, bool) or not isinstance(level, int) or level < 0:
+            level = None
+        yield str(key)[:64], score, level
+
+
+def backfill_criterion_scores(apps, schema_editor):
+    Mark = apps.get_model("api", "Mark")
+    CriterionScore = apps.get_model("api", "CriterionScore")
+
+    rows = []
+    for mark in Mark.objects.only("id", "submission_id", "marks").iterator(chunk_size=1000):
+        for key, value, level in _entries(mark.marks):
+            rows.append(
+                CriterionScore(
+                    mark_id=mark.id,
+                    submission_id=mark.submission_id,
+                    criterion_key=key,
+                    value=value,
+                    level=level,
+                )
+            )
+    CriterionScore.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0006_score_columns"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CriterionScore",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("criterion_key", models.CharField(max_length=64)),
+                ("value", models.FloatField(blank=True, null=True)),
+                ("level", models.PositiveSmallIntegerField(blank=True, null=True)),
+                (
+                    "mark",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="criterion_scores",
+                        to="api.mark",
+                    ),
+                ),
+                (
+                    "submission",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="criterion_scores",
+                        to="api.submission",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["submission", "criterion_key"],
+                        name="criterion_submission_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("mark", "criterion_key"), name="unique_mark_criterion"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_criterion_scores, migrations.RunPython.noop),
+    ]
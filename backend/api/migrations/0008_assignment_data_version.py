@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0007_criterion_scores"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="assignment",
+            name="data_version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,54 @@
+from django.db import migrations
+from django.db.models import Count, Q
+
+
+def prune_empty_marks(apps, schema_editor):
+    """
+    Mark rows are now created lazily, so an empty, unfinalized row means the same
+    as no row. Drop the ones left behind by the old eager fan-out and recount
+    the progress counters.
+    """
+    Assignment = apps.get_model("api", "Assignment")
+    Mark = apps.get_model("api", "Mark")
+    MarkerProgress = apps.get_model("api", "MarkerProgress")
+
+    Mark.objects.filter(marks={}, is_finalized=False).delete()
+
+    MarkerProgress.objects.all().delete()
+    Assignment.objects.update(marks_total=0, marks_finalized=0)
+
+    rows = Mark.objects.values("submission__assignment_id", "marker_id").annotate(
+        total=Count("id"),
+        finalized=Count("id", filter=Q(is_finalized=True)),
+    )
+    totals = {}
+    progress = []
+    for row in rows:
+        assignment_id = row["submission__assignment_id"]
+        progress.append(
+            MarkerProgress(
+                assignment_id=assignment_id,
+                marker_id=row["marker_id"],
+                marks_total=row["total"],
+                marks_finalized=row["finalized"],
+            )
+        )
+        total, finalized = totals.get(assignment_id, (0, 0))
+        totals[assignment_id] = (total + row["total"], finalized + row["finalized"])
+    MarkerProgress.objects.bulk_create(progress)
+
+    for assignment_id, (total, finalized) in totals.items():
+        Assignment.objects.filter(id=assignment_id).update(
+            marks_total=total, marks_finalized=finalized
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0008_assignment_data_version"),
+    ]
+
+    operations = [
+        migrations.RunPython(prune_empty_marks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:56
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def _sha256(field_file):
+    # Frozen copy of api.digests.file_sha256 for stored files; missing files stay blank
+    if not field_file:
+        return ""
+    digest = hashlib.sha256()
+    try:
+        with field_file.open("rb"):
+            for chunk in field_file.chunks():
+                digest.update(chunk)
+    except (FileNotFoundError, OSError):
+        return ""
+    return digest.hexdigest()
+
+
+def backfill_digests(apps, schema_editor):
+    Assignment = apps.get_model("api", "Assignment")
+    Submission = apps.get_model("api", "Submission")
+
+    assignments = []
+    for assignment in Assignment.objects.only("id", "rubric", "assignment_file").iterator(chunk_size=1000):
+        assignment.rubric_sha256 = _sha256(assignment.rubric)
+        assignment.assignment_file_sha256 = _sha256(assignment.assignment_file)
+        assignments.append(assignment)
+    Assignment.objects.bulk_update(
+        assignments, ["rubric_sha256", "assignment_file_sha256"], batch_size=1000
+    )
+
+    submissions = []
+    for submission in Submission.objects.only("id", "submission_file").iterator(chunk_size=1000):
+        submission.submission_sha256 = _sha256(submission.submission_file)
+        submissions.append(submission)
+    Submission.objects.bulk_update(submissions, ["submission_sha256"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0010_upload"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="assignment",
+            name="assignment_file_sha256",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddField(
+            model_name="assignment",
+            name="rubric_sha256",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddField(
+            model_name="submission",
+            name="submission_sha256",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.RunPython(backfill_digests, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,209 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:06
+
+import hashlib
+import os
+import shutil
+from collections import Counter
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Frozen copies of api.storage / api.blobs helpers
+FILE_FIELDS = [
+    ("Assignment", ("rubric", "assignment_file")),
+    ("Submission", ("submission_file",)),
+    ("User", ("profile_picture",)),
+    ("Upload", ("file",)),
+]
+CAS_PREFIX = "sha256/"
+CAS_NAME_MAX_LENGTH = 255
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(64 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cas_name(sha256, name):
+    filename = os.path.basename(name) or sha256
+    budget = CAS_NAME_MAX_LENGTH - len(f"{CAS_PREFIX}{sha256}/")
+    if len(filename) > budget:
+        stem, ext = os.path.splitext(filename)
+        filename = stem[:budget - len(ext)] + ext
+    return f"{CAS_PREFIX}{sha256}/{filename}"
+
+
+def _names(model, field):
+    return (
+        model.objects.exclude(**{f"{field}__isnull": True}).exclude(**{field: ""})
+        .values_list(field, flat=True).distinct()
+    )
+
+
+def deduplicate_media(apps, schema_editor):
+    """
+    Move existing media into content-addressed blobs, one per distinct content,
+    and point every FileField at its blob.
+
+    Blobs are hard links (or copies) of the old files. The old files are left
+    in place, so media tracked in a checkout is never deleted; remove them with
+    `manage.py prune_legacy_media --delete` once the migration is kept.
+    """
+    if settings.STORAGES["default"]["BACKEND"] != "api.storage.ContentAddressedStorage":
+        return
+    root = str(settings.MEDIA_ROOT)
+    Blob = apps.get_model("api", "Blob")
+
+    # 1. Hash every distinct legacy file once
+    renames = {}
+    for model_name, fields in FILE_FIELDS:
+        model = apps.get_model("api", model_name)
+        for field in fields:
+            for name in _names(model, field):
+                path = os.path.join(root, name)
+                if name.startswith(CAS_PREFIX) or name in renames or not os.path.isfile(path):
+                    continue
+                renames[name] = _cas_name(_sha256(path), name)
+
+    # 2. Store each content once
+    for name, new_name in renames.items():
+        sha256 = new_name.split("/")[1]
+        target = os.path.join(root, "blobs", sha256[:2], sha256)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            try:
+                os.link(os.path.join(root, name), target)
+            except OSError:
+                shutil.copyfile(os.path.join(root, name), target)
+
+    # 3. Point the rows at their blobs
+    for model_name, fields in FILE_FIELDS:
+        model = apps.get_model("api", model_name)
+        for field in fields:
+            for name, new_name in renames.items():
+                model.objects.filter(**{field: name}).update(**{field: new_name})
+
+    # 4. Count references
+    counts = Counter()
+    for model_name, fields in FILE_FIELDS:
+        model = apps.get_model("api", model_name)
+        for field in fields:
+            for name in model.objects.filter(**{f"{field}__startswith": CAS_PREFIX}).values_list(field, flat=True):
+                counts[name.split("/")[1]] += 1
+    for sha256, count in counts.items():
+        path = os.path.join(root, "blobs", sha256[:2], sha256)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        Blob.objects.update_or_create(sha256=sha256, defaults={"size": size, "ref_count": count})
+
+
+def restore_media(apps, schema_editor):
+    """
+    Reverse of deduplicate_media: point every FileField back at a plain file.
+
+    Files the forward migration left in place are found by content. Content
+    uploaded since exists only as a blob, so it is linked (or copied) out to its
+    original filename. Blobs are kept; nothing is deleted.
+    """
+    if settings.STORAGES["default"]["BACKEND"] != "api.storage.ContentAddressedStorage":
+        return
+    root = str(settings.MEDIA_ROOT)
+
+    legacy = {}  # sha256 -> names of plain files with that content
+    for directory, subdirectories, filenames in os.walk(root):
+        if directory == root:
+            subdirectories[:] = [d for d in subdirectories if d != "blobs"]
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            legacy.setdefault(_sha256(path), []).append(os.path.relpath(path, root).replace(os.sep, "/"))
+
+    restored = {}
+    for model_name, fields in FILE_FIELDS:
+        model = apps.get_model("api", model_name)
+        for field in fields:
+            for name in list(_names(model, field).filter(**{f"{field}__startswith": CAS_PREFIX})):
+                if name not in restored:
+                    restored[name] = _restore(root, name, legacy)
+                model.objects.filter(**{field: name}).update(**{field: restored[name]})
+
+
+def _restore(root, name, legacy):
+    _, sha256, filename = name.split("/", 2)
+    candidates = legacy.get(sha256, [])
+    for candidate in candidates:
+        if os.path.basename(candidate) == filename:
+            return candidate
+    if candidates:
+        return candidates[0]
+
+    stem, ext = os.path.splitext(filename)
+    target, n = filename, 0
+    while os.path.exists(os.path.join(root, target)):
+        n += 1
+        target = f"{stem}_{n}{ext}"
+    blob = os.path.join(root, "blobs", sha256[:2], sha256)
+    try:
+        os.link(blob, os.path.join(root, target))
+    except OSError:
+        shutil.copyfile(blob, os.path.join(root, target))
+    legacy.setdefault(sha256, []).append(target)
+    return target
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0011_file_digests"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Blob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("sha256", models.CharField(max_length=64, unique=True)),
+                ("size", models.PositiveBigIntegerField()),
+                ("ref_count", models.IntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="assignment",
+            name="assignment_file",
+            field=models.FileField(max_length=255, upload_to=""),
+        ),
+        migrations.AlterField(
+            model_name="assignment",
+            name="rubric",
+            field=models.FileField(max_length=255, upload_to=""),
+        ),
+        migrations.AlterField(
+            model_name="submission",
+            name="submission_file",
+            field=models.FileField(max_length=255, upload_to=""),
+        ),
+        migrations.AlterField(
+            model_name="upload",
+            name="file",
+            field=models.FileField(blank=True, max_length=255, null=True, upload_to=""),
+        ),
+        migrations.AlterField(
+            model_name="user",
+            name="profile_picture",
+            field=models.ImageField(
+                blank=True, default=None, max_length=255, null=True, upload_to=""
+            ),
+        ),
+        migrations.RunPython(deduplicate_media, restore_media),
+    ]
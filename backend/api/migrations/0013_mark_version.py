@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0012_content_addressed_storage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="mark",
+            name="version",
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,71 @@
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def deduplicate_marks(apps, schema_editor):
+    """
+    Keep one mark per (marker, submission) before the unique constraint is added:
+    the finalized one if any, else the most recently written. Duplicates could be
+    left by concurrent first reads, which both created the row. Progress
+    counters are recounted afterwards.
+    """
+    Assignment = apps.get_model("api", "Assignment")
+    Mark = apps.get_model("api", "Mark")
+    MarkerProgress = apps.get_model("api", "MarkerProgress")
+
+    duplicated = (
+        Mark.objects.values("marker_id", "submission_id")
+        .annotate(rows=Count("id"))
+        .filter(rows__gt=1)
+    )
+    affected = set()
+    for pair in duplicated:
+        marks = Mark.objects.filter(marker_id=pair["marker_id"], submission_id=pair["submission_id"])
+        keep = marks.order_by("-is_finalized", "-version", "-id").values_list("id", flat=True).first()
+        marks.exclude(id=keep).delete()
+        affected.add(Mark.objects.get(id=keep).submission.assignment_id)
+    if not affected:
+        return
+
+    MarkerProgress.objects.filter(assignment_id__in=affected).delete()
+    rows = Mark.objects.filter(submission__assignment_id__in=affected).values(
+        "submission__assignment_id", "marker_id"
+    ).annotate(
+        total=Count("id"),
+        finalized=Count("id", filter=Q(is_finalized=True)),
+    )
+    totals = {assignment_id: (0, 0) for assignment_id in affected}
+    progress = []
+    for row in rows:
+        assignment_id = row["submission__assignment_id"]
+        progress.append(
+            MarkerProgress(
+                assignment_id=assignment_id,
+                marker_id=row["marker_id"],
+                marks_total=row["total"],
+                marks_finalized=row["finalized"],
+            )
+        )
+        total, finalized = totals[assignment_id]
+        totals[assignment_id] = (total + row["total"], finalized + row["finalized"])
+    MarkerProgress.objects.bulk_create(progress)
+
+    for assignment_id, (total, finalized) in totals.items():
+        Assignment.objects.filter(id=assignment_id).update(
+            marks_total=total, marks_finalized=finalized, data_version=models.F("data_version") + 1
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0014_moderation_events"),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate_marks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="mark",
+            constraint=models.UniqueConstraint(fields=("marker", "submission"), name="unique_marker_submission"),
+        ),
+    ]
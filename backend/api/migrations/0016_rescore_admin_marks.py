@@ -0,0 +1,77 @@
+from django.db import migrations
+
+
+def _level_scores(mark_criteria):
+    # Frozen copy of api.scoring.rubric_level_scores
+    if not isinstance(mark_criteria, dict):
+        return {}
+    levels, criteria = mark_criteria.get("levels"), mark_criteria.get("criteria")
+    if not isinstance(levels, list) or not isinstance(criteria, list):
+        return {}
+    level_ids = [level.get("id") if isinstance(level, dict) else None for level in levels]
+    scores = {}
+    for criterion in criteria:
+        if not isinstance(criterion, dict) or criterion.get("id") is None:
+            continue
+        cells = criterion.get("cells")
+        by_level = {}
+        for level_id, cell in zip(level_ids, cells if isinstance(cells, list) else []):
+            score = _number(cell.get("max")) if isinstance(cell, dict) else None
+            if level_id is not None and score is not None:
+                by_level[level_id] = score
+        scores[str(criterion["id"])] = by_level
+    return scores
+
+
+def _number(value):
+    if isinstance(value, dict):
+        value = value.get("score")
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return value
+
+
+def _summarize(admin_marks, rubric_scores):
+    # Frozen copy of api.scoring.summarize_admin_marks
+    total, count = 0.0, 0
+    if isinstance(admin_marks, dict):
+        for key, value in admin_marks.items():
+            if isinstance(value, str):
+                score = rubric_scores.get(str(key), {}).get(value)
+            else:
+                score = _number(value)
+            if score is not None:
+                total += score
+                count += 1
+    return total, count
+
+
+def rescore_admin_marks(apps, schema_editor):
+    """
+    0006 scored admin marks as plain numbers, but the app stores level ids
+    ({"C1": "L2"}), so those submissions were backfilled with zeros.
+    """
+    Assignment = apps.get_model("api", "Assignment")
+    Submission = apps.get_model("api", "Submission")
+
+    for assignment in Assignment.objects.only("id", "mark_criteria").iterator(chunk_size=100):
+        rubric_scores = _level_scores(assignment.mark_criteria)
+        submissions = list(Submission.objects.filter(assignment_id=assignment.id).only("id", "admin_marks"))
+        for submission in submissions:
+            submission.admin_total_score, submission.admin_scored_criteria = _summarize(
+                submission.admin_marks, rubric_scores
+            )
+        Submission.objects.bulk_update(
+            submissions, ["admin_total_score", "admin_scored_criteria"], batch_size=1000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0015_unique_marker_submission"),
+    ]
+
+    operations = [
+        migrations.RunPython(rescore_admin_marks, migrations.RunPython.noop),
+    ]
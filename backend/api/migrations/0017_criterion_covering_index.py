@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0016_rescore_admin_marks"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="criterionscore",
+            name="criterion_submission_idx",
+        ),
+        migrations.AddIndex(
+            model_name="criterionscore",
+            index=models.Index(
+                fields=["submission", "criterion_key", "mark", "value"],
+                name="criterion_submission_idx",
+            ),
+        ),
+    ]
@@ -1,13 +1,18 @@
-from django.db import models
+import uuid
+
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 
+from .digests import assigned_file_sha256
+from .scoring import criterion_entries, rubric_level_scores, summarize_admin_marks, summarize_marks
+
 # ------------------------------
 # Custom User Model
 # ------------------------------
 class User(AbstractUser):
     # username, email, password_hash
     # Remove default username, use email as login
-    profile_picture = models.ImageField(default=None, null=True, blank=True)
+    profile_picture = models.ImageField(default=None, null=True, blank=True, max_length=255)
 
     # Role field to distinguish admin and marker
     ROLE_CHOICES = [
@@ -16,6 +21,9 @@ class User(AbstractUser):
     ]
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='marker')
 
+    # Bumped to revoke every signed API token issued to this user (see api/tokens.py)
+    token_generation = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return f"{self.email} ({self.role})"
 
@@ -26,11 +34,22 @@ class User(AbstractUser):
 class Assignment(models.Model):
     name = models.CharField(max_length=64)
     creation_date = models.DateTimeField()
-    rubric = models.FileField()
-    assignment_file = models.FileField()
+    rubric = models.FileField(max_length=255)
+    assignment_file = models.FileField(max_length=255)
     mark_criteria = models.JSONField()
     due_date = models.DateTimeField()
 
+    # Rollup of MarkerProgress, maintained by api/progress.py
+    marks_total = models.PositiveIntegerField(default=0)
+    marks_finalized = models.PositiveIntegerField(default=0)
+
+    # Bumped on every change to the assignment's marks; keys cached statistics (api/stats_cache.py)
+    data_version = models.PositiveIntegerField(default=0)
+
+    # SHA-256 of the stored files, set when a new file is assigned (see api/digests.py)
+    rubric_sha256 = models.CharField(max_length=64, blank=True, default="")
+    assignment_file_sha256 = models.CharField(max_length=64, blank=True, default="")
+
     # Only administrators can be assigned
     administrator = models.ForeignKey(
         User,
@@ -40,6 +59,22 @@ class Assignment(models.Model):
         limit_choices_to={'role': 'admin'}
     )
 
+    def refresh_digests(self):
+        """Record the digests of newly assigned files; needed before bulk writes, which skip save()."""
+        for field in ("rubric", "assignment_file"):
+            digest = assigned_file_sha256(getattr(self, field))
+            if digest is not None:
+                setattr(self, f"{field}_sha256", digest)
+
+    def save(self, *args, **kwargs):
+        self.refresh_digests()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {
+                *update_fields, *(f"{f}_sha256" for f in ("rubric", "assignment_file") if f in update_fields)
+            }
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Assignment {self.name} by {self.administrator}"
 
@@ -49,11 +84,55 @@ class Assignment(models.Model):
 # ------------------------------
 class Submission(models.Model):
     name = models.CharField(max_length=64)
-    submission_file = models.FileField()
+    submission_file = models.FileField(max_length=255)
     comment = models.TextField()
     admin_marks = models.JSONField(null=True, blank=True)
     assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE)
 
+    # Derived from admin_marks on save, so scores can be aggregated in SQL
+    admin_total_score = models.FloatField(default=0)
+    admin_scored_criteria = models.PositiveIntegerField(default=0)
+
+    # SHA-256 of the stored submission file, used to detect real content changes
+    submission_sha256 = models.CharField(max_length=64, blank=True, default="")
+
+    def refresh_scores(self, rubric_scores=None):
+        """
+        Recompute the derived score columns; needed before bulk writes, which skip save().
+        Pass the assignment's rubric_level_scores() when scoring many submissions.
+        """
+        if rubric_scores is None:
+            rubric_scores = rubric_level_scores(self.assignment.mark_criteria) if self.admin_marks else {}
+        self.admin_total_score, self.admin_scored_criteria = summarize_admin_marks(self.admin_marks, rubric_scores)
+
+    @classmethod
+    def rescore(cls, assignment):
+        """Recompute the admin scores of every submission of `assignment`, e.g. after its rubric changed."""
+        rubric_scores = rubric_level_scores(assignment.mark_criteria)
+        submissions = list(cls.objects.filter(assignment=assignment).only("id", "admin_marks"))
+        for submission in submissions:
+            submission.refresh_scores(rubric_scores)
+        cls.objects.bulk_update(submissions, ["admin_total_score", "admin_scored_criteria"], batch_size=1000)
+
+    def refresh_digests(self):
+        """Record the digest of a newly assigned file; needed before bulk writes, which skip save()."""
+        digest = assigned_file_sha256(self.submission_file)
+        if digest is not None:
+            self.submission_sha256 = digest
+
+    def save(self, *args, **kwargs):
+        self.refresh_scores()
+        self.refresh_digests()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if "admin_marks" in update_fields:
+                update_fields |= {"admin_total_score", "admin_scored_criteria"}
+            if "submission_file" in update_fields:
+                update_fields.add("submission_sha256")
+            kwargs["update_fields"] = update_fields
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Submission {self.name} for {self.assignment}"
 
@@ -73,5 +152,184 @@ class Mark(models.Model):
     )
     submission = models.ForeignKey(Submission, on_delete=models.CASCADE)
 
+    # Derived from marks on save, so scores can be aggregated in SQL
+    total_score = models.FloatField(default=0)
+    scored_criteria = models.PositiveIntegerField(default=0)
+
+    # Bumped by every write, so an autosave based on a stale copy is detected (see api/marks.py)
+    version = models.PositiveIntegerField(default=1)
+
+    def refresh_scores(self):
+        """Recompute the derived score columns; needed before bulk writes, which skip save()."""
+        self.total_score, self.scored_criteria = summarize_marks(self.marks)
+
+    def save(self, *args, **kwargs):
+        self.refresh_scores()
+        update_fields = kwargs.get("update_fields")
+        if not self._state.adding:
+            self.version += 1
+            if update_fields is not None:
+                update_fields = kwargs["update_fields"] = {*update_fields, "version"}
+        if update_fields is not None and "marks" not in update_fields:
+            super().save(*args, **kwargs)
+            return
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "total_score", "scored_criteria"}
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            CriterionScore.rebuild_for([self])
+
+    class Meta:
+        constraints = [
+            # Rows are created on first access, so concurrent first reads must not both insert
+            models.UniqueConstraint(fields=['marker', 'submission'], name='unique_marker_submission'),
+        ]
+
     def __str__(self):
         return f"Marks for {self.submission} by {self.marker}"
+
+
+# ------------------------------
+# Criterion Score Model
+# ------------------------------
+class CriterionScore(models.Model):
+    """
+    One row per criterion of a Mark, mirroring Mark.marks.
+
+    Lets per-criterion statistics be computed with grouped SQL queries
+    instead of parsing every marks blob. Rewritten whenever the mark is saved.
+    """
+    mark = models.ForeignKey(Mark, on_delete=models.CASCADE, related_name='criterion_scores')
+    # Denormalized from mark.submission so per-submission queries need no join
+    submission = models.ForeignKey(Submission, on_delete=models.CASCADE, related_name='criterion_scores')
+    criterion_key = models.CharField(max_length=64)
+    value = models.FloatField(null=True, blank=True)
+    level = models.PositiveSmallIntegerField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['mark', 'criterion_key'], name='unique_mark_criterion'),
+        ]
+        indexes = [
+            # Covers the agreement report's grouped read, so it never visits the table
+            models.Index(fields=['submission', 'criterion_key', 'mark', 'value'], name='criterion_submission_idx'),
+        ]
+
+    @classmethod
+    def rebuild_for(cls, marks):
+        """Replace the criterion rows of `marks`; also used after bulk mark writes."""
+        marks = list(marks)
+        cls.objects.filter(mark__in=[m.pk for m in marks]).delete()
+        cls.objects.bulk_create([
+            cls(
+                mark_id=m.pk,
+                submission_id=m.submission_id,
+                criterion_key=key,
+                value=value,
+                level=level,
+            )
+            for m in marks
+            for key, value, level in criterion_entries(m.marks)
+        ])
+
+    def __str__(self):
+        return f"{self.criterion_key}={self.value} for {self.mark}"
+
+
+# ------------------------------
+# Marker Progress Model
+# ------------------------------
+class MarkerProgress(models.Model):
+    """
+    Denormalized count of a marker's marks for one assignment.
+
+    Maintained by api/progress.py on every mark write, so dashboards never
+    have to count Mark rows. `manage.py rebuild_progress` recomputes it.
+    """
+    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='marker_progress')
+    marker = models.ForeignKey(User, on_delete=models.CASCADE, related_name='marker_progress')
+    marks_total = models.PositiveIntegerField(default=0)
+    marks_finalized = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['assignment', 'marker'], name='unique_marker_progress'),
+        ]
+
+    def __str__(self):
+        return f"{self.marks_finalized}/{self.marks_total} marks by {self.marker} for {self.assignment}"
+
+
+# ------------------------------
+# Upload Model
+# ------------------------------
+class Upload(models.Model):
+    """
+    A resumable chunked upload (see api/uploads.py).
+
+    Chunks are staged on local disk; once every chunk has arrived the file is
+    assembled into `file`, and the upload id can be used as a file handle when
+    creating or editing assignments.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='uploads')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    # SHA-256 announced by the client (optional) and computed on assembly
+    expected_sha256 = models.CharField(max_length=64, blank=True)
+    sha256 = models.CharField(max_length=64, blank=True)
+    file = models.FileField(null=True, blank=True, max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def total_chunks(self):
+        return max(1, -(-self.size // self.chunk_size))
+
+    @property
+    def is_complete(self):
+        return self.completed_at is not None
+
+    def __str__(self):
+        return f"Upload {self.filename} by {self.owner}"
+
+
+# ------------------------------
+# Blob Model
+# ------------------------------
+class Blob(models.Model):
+    """
+    One stored file content in ContentAddressedStorage (see api/storage.py).
+
+    `ref_count` is the number of FileField values that point at the blob,
+    maintained by api/blobs.py; the blob is deleted when it drops to zero.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Blob {self.sha256[:12]} ({self.ref_count} refs)"
+
+
+# ------------------------------
+# Moderation Event Model
+# ------------------------------
+class ModerationEvent(models.Model):
+    """
+    Append-only log of moderation changes, streamed to browsers as
+    Server-Sent Events (see api/events.py).
+
+    An event is one row whatever the number of subscribers: every worker
+    reads new rows once and fans them out in process. Old rows are pruned
+    by the write path and `manage.py prune_events` (see api/events.py).
+    """
+    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=32)
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} on assignment {self.assignment_id}"
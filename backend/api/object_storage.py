@@ -0,0 +1,256 @@
+import base64
+import io
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.storage import Storage
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import cached_property
+from django.utils.http import content_disposition_header
+
+from .digests import HashingReader
+from .models import Blob
+from .storage import blob_name, cas_name, cas_sha256
+
+
+READ_BUFFER_SIZE = 256 * 1024
+
+
+class DirectUploadError(Exception):
+    """A direct upload could not be confirmed; the object is missing or does not match."""
+
+
+class S3ObjectReader(io.RawIOBase):
+    """
+    Seekable read-only view of an S3 object. Reads stream the object body;
+    seeking reopens it with a `Range` request, so byte-range downloads work.
+    """
+
+    def __init__(self, client, bucket, key, size):
+        self._client = client
+        self._bucket = bucket
+        self._key = key
+        self._size = size
+        self._pos = 0
+        self._body = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: self._size}[whence]
+        position = max(base + offset, 0)
+        if position != self._pos and self._body is not None:
+            self._body.close()
+            self._body = None
+        self._pos = position
+        return position
+
+    def readinto(self, buffer):
+        if self._pos >= self._size:
+            return 0
+        if self._body is None:
+            self._body = self._client.get_object(
+                Bucket=self._bucket, Key=self._key, Range=f"bytes={self._pos}-"
+            )["Body"]
+        data = self._body.read(len(buffer))
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def close(self):
+        if self._body is not None:
+            self._body.close()
+            self._body = None
+        super().close()
+
+
+@deconstructible
+class S3ContentAddressedStorage(Storage):
+    """
+    Content-addressed storage on an S3-compatible object store (AWS S3, MinIO, ...).
+
+    It uses the same naming, blob layout and reference counting as
+    ContentAddressedStorage, so switching backends needs no schema change.
+    Requires boto3. It is configured with the API_S3_* settings.
+
+    Besides the Storage API it offers presigned URLs. Downloads can redirect
+    to the object store (presigned_download_url), and clients can PUT large
+    files straight into the bucket, then confirm them (direct_upload_target,
+    confirm_direct_upload).
+    """
+
+    def __init__(self, bucket=None, endpoint_url=None, region=None, access_key=None, secret_key=None,
+                 presign_expiry=None):
+        self.bucket = bucket or getattr(settings, "API_S3_BUCKET", "")
+        self.endpoint_url = endpoint_url or getattr(settings, "API_S3_ENDPOINT_URL", "") or None
+        self.region = region or getattr(settings, "API_S3_REGION", "") or None
+        self.access_key = access_key or getattr(settings, "API_S3_ACCESS_KEY_ID", "") or None
+        self.secret_key = secret_key or getattr(settings, "API_S3_SECRET_ACCESS_KEY", "") or None
+        self.presign_expiry = presign_expiry or getattr(settings, "API_S3_PRESIGN_EXPIRY", 300)
+        if not self.bucket:
+            raise ImproperlyConfigured("API_S3_BUCKET must be set to use S3ContentAddressedStorage")
+
+    @cached_property
+    def client(self):
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError:
+            raise ImproperlyConfigured("S3ContentAddressedStorage requires boto3 (pip install boto3)")
+        return boto3.client(
+            "s3",
+            endpoint_url=self.endpoint_url,
+            region_name=self.region,
+            aws_access_key_id=self.access_key,
+            aws_secret_access_key=self.secret_key,
+            # Presigned URLs must be SigV4: SigV2 is rejected by newer regions and cannot sign checksums
+            config=Config(signature_version="s3v4"),
+        )
+
+    def resolve(self, name):
+        sha256 = cas_sha256(name)
+        return blob_name(sha256) if sha256 else name
+
+    def _head(self, key, **kwargs):
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key, **kwargs)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    # ------------------------------
+    # Storage API
+    # ------------------------------
+    def _open(self, name, mode="rb"):
+        if "w" in mode or "a" in mode:
+            raise ValueError("S3ContentAddressedStorage files are read-only; save a new file instead")
+        key = self.resolve(name)
+        head = self._head(key)
+        if head is None:
+            raise FileNotFoundError(name)
+        reader = S3ObjectReader(self.client, self.bucket, key, head["ContentLength"])
+        file = File(io.BufferedReader(reader, buffer_size=READ_BUFFER_SIZE), name=name)
+        file.size = head["ContentLength"]
+        return file
+
+    def _store_blob(self, incoming_key, sha256, size):
+        """Move an uploaded object to its blob key (unless that content is already stored)."""
+        key = blob_name(sha256)
+        if self._head(key) is None:
+            self.client.copy({"Bucket": self.bucket, "Key": incoming_key}, self.bucket, key)
+        self.client.delete_object(Bucket=self.bucket, Key=incoming_key)
+        Blob.objects.get_or_create(sha256=sha256, defaults={"size": size})
+
+    def _save(self, name, content):
+        # Stream to a temporary key while hashing, then move it under its digest
+        incoming_key = f"incoming/{uuid.uuid4()}"
+        if hasattr(content, "seek"):
+            content.seek(0)
+        reader = HashingReader(content)
+        self.client.upload_fileobj(reader, self.bucket, incoming_key)
+        sha256 = reader.hexdigest()
+        self._store_blob(incoming_key, sha256, reader.size)
+        return cas_name(sha256, name)
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def exists(self, name):
+        return bool(name) and self._head(self.resolve(name)) is not None
+
+    def size(self, name):
+        head = self._head(self.resolve(name))
+        if head is None:
+            raise FileNotFoundError(name)
+        return head["ContentLength"]
+
+    def get_modified_time(self, name):
+        head = self._head(self.resolve(name))
+        if head is None:
+            raise FileNotFoundError(name)
+        return head["LastModified"]
+
+    def url(self, name):
+        return self.presigned_download_url(name)
+
+    def delete(self, name):
+        sha256 = cas_sha256(name)
+        if sha256 is None:
+            self.client.delete_object(Bucket=self.bucket, Key=name)
+            return
+        self.collect(sha256)
+
+    def collect(self, sha256):
+        """Remove the blob if nothing references it any more."""
+        deleted, _ = Blob.objects.filter(sha256=sha256, ref_count__lte=0).delete()
+        if deleted:
+            self.client.delete_object(Bucket=self.bucket, Key=blob_name(sha256))
+
+    # ------------------------------
+    # Presigned URLs
+    # ------------------------------
+    def presigned_download_url(self, name, filename=None, content_type=None, as_attachment=False):
+        params = {"Bucket": self.bucket, "Key": self.resolve(name)}
+        disposition = content_disposition_header(as_attachment, filename or name.rsplit("/", 1)[-1])
+        if disposition:
+            params["ResponseContentDisposition"] = disposition
+        if content_type:
+            params["ResponseContentType"] = content_type
+        return self.client.generate_presigned_url("get_object", Params=params, ExpiresIn=self.presign_expiry)
+
+    def direct_upload_target(self, upload_id, sha256):
+        """
+        Presigned PUT for a direct upload of content `sha256` (hex).
+
+        The checksum is part of the signature, so the object store itself
+        rejects a body that does not match.
+        """
+        checksum = base64.b64encode(bytes.fromhex(sha256)).decode("ascii")
+        url = self.client.generate_presigned_url(
+            "put_object",
+            Params={"Bucket": self.bucket, "Key": f"incoming/{upload_id}", "ChecksumSHA256": checksum},
+            ExpiresIn=self.presign_expiry,
+        )
+        return {"method": "PUT", "url": url, "headers": {"x-amz-checksum-sha256": checksum}}
+
+    def confirm_direct_upload(self, upload_id, filename, size, sha256):
+        """
+        Verify a directly uploaded object and store it as a blob.
+
+        Returns the FileField name for it. Raises DirectUploadError if the object
+        is missing or its size or checksum does not match.
+        """
+        incoming_key = f"incoming/{upload_id}"
+        head = self._head(incoming_key, ChecksumMode="ENABLED")
+        if head is None:
+            raise DirectUploadError("The file has not been uploaded yet")
+        if head["ContentLength"] != size:
+            raise DirectUploadError(f"Expected {size} bytes, found {head['ContentLength']}")
+
+        stored = head.get("ChecksumSHA256")
+        if stored:
+            actual = base64.b64decode(stored).hex()
+        else:  # store did not keep the checksum: hash it ourselves
+            with self._open(incoming_key) as file:
+                reader = HashingReader(file)
+                while reader.read(READ_BUFFER_SIZE):
+                    pass
+                actual = reader.hexdigest()
+        if actual != sha256:
+            self.client.delete_object(Bucket=self.bucket, Key=incoming_key)
+            raise DirectUploadError("Checksum mismatch, upload the file again")
+
+        self._store_blob(incoming_key, sha256, size)
+        return cas_name(sha256, filename)
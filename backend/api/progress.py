@@ -0,0 +1,210 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import Assignment, CriterionScore, Mark, MarkerProgress
+
+
+# ------------------------------
+# Incremental updates
+# ------------------------------
+def record_mark_change(assignment_id, marker_id, created=False, was_finalized=False, is_finalized=False):
+    """
+    Apply a single mark write to the progress counters.
+
+    Call inside the same transaction as the Mark write. `created` adds one to
+    the totals, and a change of `is_finalized` moves the finalized counters.
+    """
+    total_delta = 1 if created else 0
+    finalized_delta = int(bool(is_finalized)) - int(bool(was_finalized))
+    if not total_delta and not finalized_delta:
+        return
+
+    with transaction.atomic():
+        MarkerProgress.objects.get_or_create(assignment_id=assignment_id, marker_id=marker_id)
+        MarkerProgress.objects.filter(assignment_id=assignment_id, marker_id=marker_id).update(
+            marks_total=F("marks_total") + total_delta,
+            marks_finalized=F("marks_finalized") + finalized_delta,
+        )
+        Assignment.objects.filter(id=assignment_id).update(
+            marks_total=F("marks_total") + total_delta,
+            marks_finalized=F("marks_finalized") + finalized_delta,
+        )
+
+
+# ------------------------------
+# Bulk resets
+# ------------------------------
+def reset_marks(assignment_id, submission_ids=None):
+    """
+    Wipe the marks of `submission_ids` (every submission of the assignment when
+    None) and un-finalize them with a single UPDATE, keeping the rows.
+
+    The criterion rows and progress counters are brought up to date in the same
+    transaction. Returns the number of marks reset.
+    """
+    marks = Mark.objects.filter(submission__assignment_id=assignment_id)
+    scores = CriterionScore.objects.filter(submission__assignment_id=assignment_id)
+    if submission_ids is not None:
+        marks = marks.filter(submission_id__in=submission_ids)
+        scores = scores.filter(submission_id__in=submission_ids)
+
+    with transaction.atomic():
+        reset = marks.update(
+            marks={}, is_finalized=False, total_score=0, scored_criteria=0, version=F("version") + 1
+        )
+        if reset:
+            scores.delete()
+            rebuild_progress([assignment_id])
+    return reset
+
+
+def clear_criteria(assignment_id, rescored=(), removed=(), unfinalize=False):
+    """
+    Drop the entries of `rescored` and `removed` criteria from every mark of the
+    assignment, leaving the other criteria intact. Written with one bulk_update.
+
+    Marks that lose a rescored entry are un-finalized; removing a criterion
+    keeps a finalized mark finalized. With `unfinalize` (e.g. criteria were
+    added) every finalized mark is re-opened. Returns the number of marks touched.
+    """
+    rescored, cleared = set(rescored), set(rescored) | set(removed)
+    batch_size = getattr(settings, "API_BULK_CREATE_BATCH_SIZE", 500)
+    touched = set()
+    reopened = False
+
+    with transaction.atomic():
+        if cleared:
+            marks = list(
+                Mark.objects
+                .filter(submission__assignment_id=assignment_id, marks__has_any_keys=sorted(cleared))
+                .only("id", "marks", "is_finalized")
+            )
+            for mark in marks:
+                if mark.is_finalized and rescored.intersection(mark.marks):
+                    mark.is_finalized = False
+                    reopened = True
+                mark.marks = {k: v for k, v in mark.marks.items() if k not in cleared}
+                mark.refresh_scores()  # bulk_update skips Mark.save()
+                mark.version = F("version") + 1
+                touched.add(mark.id)
+            Mark.objects.bulk_update(
+                marks, ["marks", "is_finalized", "total_score", "scored_criteria", "version"], batch_size=batch_size
+            )
+            CriterionScore.objects.filter(
+                submission__assignment_id=assignment_id, criterion_key__in=cleared
+            ).delete()
+
+        if unfinalize:
+            finalized = Mark.objects.filter(submission__assignment_id=assignment_id, is_finalized=True)
+            ids = set(finalized.values_list("id", flat=True))
+            if ids:
+                Mark.objects.filter(id__in=ids).update(is_finalized=False, version=F("version") + 1)
+                touched |= ids
+                reopened = True
+
+        if reopened:
+            rebuild_progress([assignment_id])
+    return len(touched)
+
+
+# ------------------------------
+# Full recount
+# ------------------------------
+def count_marks(assignment_ids=None):
+    """
+    Count marks straight from the Mark table.
+
+    Returns {(assignment_id, marker_id): (total, finalized)} from one grouped query.
+    """
+    marks = Mark.objects.all()
+    if assignment_ids is not None:
+        marks = marks.filter(submission__assignment_id__in=assignment_ids)
+    rows = marks.values("submission__assignment_id", "marker_id").annotate(
+        total=Count("id"),
+        finalized=Count("id", filter=Q(is_finalized=True)),
+    )
+    return {
+        (row["submission__assignment_id"], row["marker_id"]): (row["total"], row["finalized"])
+        for row in rows
+    }
+
+
+def rebuild_progress(assignment_ids=None):
+    """
+    Recompute the counters for `assignment_ids` (all assignments when None).
+
+    Used after bulk writes (assignment creation, mark resets, marker sign-up)
+    where incremental deltas would cost one UPDATE per mark.
+    """
+    with transaction.atomic():
+        assignments = Assignment.objects.select_for_update()
+        if assignment_ids is not None:
+            assignments = assignments.filter(id__in=assignment_ids)
+        assignments = list(assignments)
+        ids = [a.id for a in assignments]
+
+        counts = count_marks(ids)
+
+        MarkerProgress.objects.filter(assignment_id__in=ids).delete()
+        MarkerProgress.objects.bulk_create([
+            MarkerProgress(
+                assignment_id=assignment_id,
+                marker_id=marker_id,
+                marks_total=total,
+                marks_finalized=finalized,
+            )
+            for (assignment_id, marker_id), (total, finalized) in counts.items()
+        ])
+
+        for a in assignments:
+            a.marks_total = 0
+            a.marks_finalized = 0
+        by_id = {a.id: a for a in assignments}
+        for (assignment_id, _), (total, finalized) in counts.items():
+            by_id[assignment_id].marks_total += total
+            by_id[assignment_id].marks_finalized += finalized
+        Assignment.objects.bulk_update(assignments, ["marks_total", "marks_finalized"])
+
+
+def verify_progress(assignment_ids=None):
+    """
+    Compare the stored counters with a fresh count.
+
+    Returns a list of human readable mismatch descriptions (empty when consistent).
+    """
+    counts = count_marks(assignment_ids)
+    problems = []
+
+    stored = MarkerProgress.objects.all()
+    if assignment_ids is not None:
+        stored = stored.filter(assignment_id__in=assignment_ids)
+    stored = {
+        (p.assignment_id, p.marker_id): (p.marks_total, p.marks_finalized)
+        for p in stored
+    }
+    for key in sorted(set(counts) | set(stored)):
+        expected = counts.get(key, (0, 0))
+        actual = stored.get(key, (0, 0))
+        if expected != actual:
+            problems.append(
+                f"assignment {key[0]} marker {key[1]}: stored {actual[1]}/{actual[0]}, "
+                f"actual {expected[1]}/{expected[0]}"
+            )
+
+    totals = {}
+    for (assignment_id, _), (total, finalized) in counts.items():
+        t, f = totals.get(assignment_id, (0, 0))
+        totals[assignment_id] = (t + total, f + finalized)
+
+    rollups = Assignment.objects.all()
+    if assignment_ids is not None:
+        rollups = rollups.filter(id__in=assignment_ids)
+    for a in rollups:
+        expected = totals.get(a.id, (0, 0))
+        if expected != (a.marks_total, a.marks_finalized):
+            problems.append(
+                f"assignment {a.id}: stored {a.marks_finalized}/{a.marks_total}, "
+                f"actual {expected[1]}/{expected[0]}"
+            )
+    return problems
@@ -0,0 +1,105 @@
+from collections import namedtuple
+
+
+# ------------------------------
+# Structural rubric diff
+# ------------------------------
+# A rubric is {"levels": [{id, name}], "criteria": [{id, title, maxScore,
+# requireComment, cells: [{description, min, max}]}]}, with cells aligned to
+# levels. Marks reference criteria by id and levels by position, so a change is
+# cosmetic only if it touches wording; anything else may change a score.
+
+COSMETIC_CRITERION_FIELDS = {"title", "requireComment"}
+COSMETIC_CELL_FIELDS = {"description"}
+COSMETIC_LEVEL_FIELDS = {"name"}
+
+
+def rubric_keys(rubric):
+    """Criterion ids of a structured rubric, in rubric order."""
+    rubric = rubric if isinstance(rubric, dict) else {}
+    return [str(c["id"]) for c in rubric.get("criteria") or [] if isinstance(c, dict) and "id" in c]
+
+
+class RubricDiff(namedtuple("RubricDiff", ["unchanged", "cosmetic", "rescored", "added", "removed"])):
+    """Criterion ids of a rubric edit, by kind of change, in rubric order."""
+
+    @property
+    def changed(self):
+        return bool(self.cosmetic or self.rescored or self.added or self.removed)
+
+    @property
+    def invalidated(self):
+        """Criteria whose existing scores can no longer be trusted."""
+        return self.rescored + self.removed
+
+    def as_dict(self):
+        return dict(self._asdict())
+
+
+def _without(value, fields):
+    if isinstance(value, dict):
+        return {k: v for k, v in value.items() if k not in fields}
+    return value
+
+
+def _criteria(rubric):
+    """{criterion id: criterion} in rubric order, or None if `rubric` is not criteria-shaped."""
+    if not isinstance(rubric, dict) or not isinstance(rubric.get("criteria"), list):
+        return None
+    criteria = {}
+    for criterion in rubric["criteria"]:
+        if not isinstance(criterion, dict) or "id" not in criterion:
+            return None
+        key = str(criterion["id"])
+        if key in criteria:
+            return None  # ambiguous ids
+        criteria[key] = criterion
+    return criteria
+
+
+def _scoring_levels(rubric):
+    return [_without(level, COSMETIC_LEVEL_FIELDS) for level in rubric.get("levels") or []]
+
+
+def _scoring_view(criterion):
+    """The parts of a criterion that can change what a selected level is worth."""
+    cells = criterion.get("cells")
+    if isinstance(cells, list):
+        cells = [_without(cell, COSMETIC_CELL_FIELDS) for cell in cells]
+    return _without(criterion, COSMETIC_CRITERION_FIELDS | {"cells"}), cells
+
+
+def diff_rubrics(old, new):
+    """
+    Classify every criterion of an edit from rubric `old` to rubric `new`.
+
+    Returns a RubricDiff, or None when either rubric is not in the structured
+    {"levels", "criteria"} shape and cannot be compared criterion by criterion.
+    Reordering criteria is not a change; adding, removing or reordering levels
+    rescores every criterion, since marks store the selected level by position.
+    """
+    old_criteria = _criteria(old)
+    new_criteria = _criteria(new)
+    if old_criteria is None or new_criteria is None:
+        return None
+
+    levels_rescored = _scoring_levels(old) != _scoring_levels(new)
+    unchanged, cosmetic, rescored = [], [], []
+    for key, criterion in new_criteria.items():
+        if key not in old_criteria:
+            continue
+        previous = old_criteria[key]
+        if levels_rescored or _scoring_view(previous) != _scoring_view(criterion):
+            rescored.append(key)
+        elif previous != criterion or old.get("levels") != new.get("levels"):
+            cosmetic.append(key)
+        else:
+            unchanged.append(key)
+
+    return RubricDiff(
+        unchanged=unchanged,
+        cosmetic=cosmetic,
+        rescored=rescored,
+        added=[key for key in new_criteria if key not in old_criteria],
+        removed=[key for key in old_criteria if key not in new_criteria],
+    )
@@ -0,0 +1,100 @@
+# ------------------------------
+# Numeric views of mark JSON
+# ------------------------------
+# Admin marks store the id of the selected rubric level per criterion
+# ({"C1": "L2"}); it scores the `max` of that criterion's cell for the level,
+# as the marking pages show it (see rubric_level_scores). Marker marks store
+# the selected level with its score ({"C1": {"level_index": 2, "score": 4, "comment": "..."}}).
+# Both shapes are understood here so callers never parse the JSON themselves.
+
+
+def criterion_score(value):
+    """Return the numeric score held in one criterion entry, or None if unscored."""
+    if isinstance(value, dict):
+        value = value.get("score")
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return value
+
+
+def summarize_marks(marks):
+    """Return (total score, number of scored criteria) for a marks dict."""
+    total = 0.0
+    count = 0
+    if isinstance(marks, dict):
+        for value in marks.values():
+            score = criterion_score(value)
+            if score is not None:
+                total += score
+                count += 1
+    return total, count
+
+
+def rubric_level_scores(mark_criteria):
+    """
+    Map criterion id -> {level id: score} for a {"levels", "criteria"} rubric.
+
+    A level scores the `max` of the criterion's cell at that level's position.
+    Rubrics in any other shape map to {}.
+    """
+    if not isinstance(mark_criteria, dict):
+        return {}
+    levels, criteria = mark_criteria.get("levels"), mark_criteria.get("criteria")
+    if not isinstance(levels, list) or not isinstance(criteria, list):
+        return {}
+    level_ids = [level.get("id") if isinstance(level, dict) else None for level in levels]
+
+    scores = {}
+    for criterion in criteria:
+        if not isinstance(criterion, dict) or criterion.get("id") is None:
+            continue
+        cells = criterion.get("cells")
+        by_level = {}
+        for level_id, cell in zip(level_ids, cells if isinstance(cells, list) else []):
+            score = criterion_score(cell.get("max")) if isinstance(cell, dict) else None
+            if level_id is not None and score is not None:
+                by_level[level_id] = score
+        scores[str(criterion["id"])] = by_level
+    return scores
+
+
+def admin_score(value, level_scores):
+    """Return the score of one admin_marks entry (a level id in `level_scores`, or a number), or None."""
+    if isinstance(value, str):
+        return level_scores.get(value)
+    return criterion_score(value)
+
+
+def admin_entries(admin_marks, rubric_scores):
+    """Yield (criterion key, score) for every entry of an admin_marks dict; see rubric_level_scores."""
+    if isinstance(admin_marks, dict):
+        for key, value in admin_marks.items():
+            key = str(key)
+            yield key, admin_score(value, rubric_scores.get(key, {}))
+
+
+def summarize_admin_marks(admin_marks, rubric_scores):
+    """Return (total score, number of scored criteria) for an admin_marks dict."""
+    total = 0.0
+    count = 0
+    for _, score in admin_entries(admin_marks, rubric_scores):
+        if score is not None:
+            total += score
+            count += 1
+    return total, count
+
+
+def criterion_level(value):
+    """Return the selected level index held in one criterion entry, or None."""
+    if isinstance(value, dict):
+        level = value.get("level_index")
+        if isinstance(level, int) and not isinstance(level, bool) and level >= 0:
+            return level
+    return None
+
+
+def criterion_entries(marks):
+    """Yield (criterion key, score, level) for every entry of a marks dict."""
+    if isinstance(marks, dict):
+        for key, value in marks.items():
+            yield str(key), criterion_score(value), criterion_level(value)
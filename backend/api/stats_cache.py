@@ -0,0 +1,82 @@
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from .models import Assignment
+
+
+# ------------------------------
+# Data versions
+# ------------------------------
+def bump_data_version(*assignment_ids):
+    """
+    Mark the data of `assignment_ids` as changed (all assignments when none are given).
+
+    Cached payloads are keyed by the version they were computed from, so they
+    are never served again once the version moves on.
+    """
+    assignments = Assignment.objects.all()
+    if assignment_ids:
+        assignments = assignments.filter(id__in=assignment_ids)
+    assignments.update(data_version=F("data_version") + 1)
+
+
+# ------------------------------
+# Versioned payload cache
+# ------------------------------
+class VersionedPayloadCache:
+    """
+    Thread-safe LRU cache of serialized JSON payloads, bounded by total bytes.
+
+    Keys include the assignment's data version, so invalidation is implicit:
+    old versions are simply never asked for again and age out of the LRU.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> UTF-8 JSON bytes
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+            return payload
+
+    def set(self, key, payload):
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = payload
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def get_or_build(self, key, build):
+        """Return the cached JSON bytes for `key`, building and storing them on a miss."""
+        payload = self.get(key)
+        if payload is None:
+            payload = json.dumps(build(), cls=DjangoJSONEncoder).encode("utf-8")
+            self.set(key, payload)
+        return payload
+
+
+stats_cache = VersionedPayloadCache(
+    max_bytes=getattr(settings, "API_STATS_CACHE_MAX_BYTES", 32 * 1024 * 1024),
+)
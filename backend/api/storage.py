@@ -0,0 +1,106 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+from .models import Blob
+
+
+# FileField names handed out by ContentAddressedStorage: "sha256/<hex>/<original filename>".
+# The original filename is kept so downloads and Content-Disposition stay meaningful.
+CAS_NAME_RE = re.compile(r"^sha256/([0-9a-f]{64})/[^/]+$")
+CAS_NAME_MAX_LENGTH = 255
+
+
+def cas_sha256(name):
+    """The content digest encoded in a content-addressed file name, or None for other names."""
+    match = CAS_NAME_RE.match(name or "")
+    return match.group(1) if match else None
+
+
+def blob_name(sha256):
+    """Path of a blob, relative to the storage root."""
+    return f"blobs/{sha256[:2]}/{sha256}"
+
+
+def cas_name(sha256, name):
+    """The FileField name for content `sha256` uploaded as `name`."""
+    filename = os.path.basename(name) or sha256
+    budget = CAS_NAME_MAX_LENGTH - len(f"sha256/{sha256}/")
+    if len(filename) > budget:
+        stem, ext = os.path.splitext(filename)
+        filename = stem[:budget - len(ext)] + ext
+    return f"sha256/{sha256}/{filename}"
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Filesystem storage that keeps one copy of each distinct file content.
+
+    Saving streams the content once, hashing it as it is written, and stores
+    it as blobs/<xx>/<sha256> unless that blob already exists. The name
+    returned to the FileField is sha256/<hex>/<filename>. Names in any other
+    form are served as plain FileSystemStorage paths, so existing media keeps working.
+
+    Blobs are reference counted across every FileField (see api/blobs.py).
+    delete() only removes a blob once nothing references it.
+    """
+
+    def resolve(self, name):
+        """Location of `name` relative to the storage root (its blob, for content-addressed names)."""
+        sha256 = cas_sha256(name)
+        return blob_name(sha256) if sha256 else name
+
+    def path(self, name):
+        return super().path(self.resolve(name))
+
+    def url(self, name):
+        # Keep sha256/<hex>/<filename>: clients show the last segment as the file's name.
+        # The MEDIA_URL view (api/file_serving.py:serve_media) resolves it to the blob.
+        return super().url(name)
+
+    def get_available_name(self, name, max_length=None):
+        # Content addresses never collide, so never add a random suffix
+        return name
+
+    def _save(self, name, content):
+        directory = os.path.join(self.location, "blobs")
+        os.makedirs(directory, exist_ok=True)
+
+        digest = hashlib.sha256()
+        size = 0
+        with tempfile.NamedTemporaryFile(dir=directory, suffix=".tmp", delete=False) as tmp:
+            try:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+            except Exception:
+                os.unlink(tmp.name)
+                raise
+
+        sha256 = digest.hexdigest()
+        target = super().path(blob_name(sha256))
+        if os.path.exists(target):
+            os.unlink(tmp.name)  # already stored
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(tmp.name, target)  # atomic; a concurrent identical write is harmless
+            if self.file_permissions_mode is not None:
+                os.chmod(target, self.file_permissions_mode)
+        Blob.objects.get_or_create(sha256=sha256, defaults={"size": size})
+        return cas_name(sha256, name)
+
+    def delete(self, name):
+        sha256 = cas_sha256(name)
+        if sha256 is None:
+            return super().delete(name)
+        self.collect(sha256)
+
+    def collect(self, sha256):
+        """Remove the blob if nothing references it any more."""
+        deleted, _ = Blob.objects.filter(sha256=sha256, ref_count__lte=0).delete()
+        if deleted:
+            super().delete(blob_name(sha256))
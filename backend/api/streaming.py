@@ -0,0 +1,106 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+
+
+_DONE = object()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# ------------------------------
+# Media I/O pool
+# ------------------------------
+def io_pool():
+    """
+    Thread pool that reads media for async responses, created on first use.
+
+    It is kept apart from Django's thread-sensitive executor, so a long
+    download never queues ahead of a sync view. Its size (API_FILE_IO_THREADS)
+    bounds how many reads run at once; extra streams wait their turn.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, "API_FILE_IO_THREADS", 4), thread_name_prefix="media-io"
+            )
+        return _pool
+
+
+def stream_chunk_size():
+    return getattr(settings, "API_FILE_STREAM_CHUNK_SIZE", 256 * 1024)
+
+
+def is_async_request(request):
+    """True when the response will be sent by Django's ASGI handler."""
+    return isinstance(request, ASGIRequest)
+
+
+def file_chunks(file, chunk_size=None):
+    """Blocking iterator over `file` (anything with read(size)) in `chunk_size` pieces."""
+    chunk_size = chunk_size or stream_chunk_size()
+    return iter(lambda: file.read(chunk_size), b"")
+
+
+# ------------------------------
+# Async streaming
+# ------------------------------
+async def iterate_in_pool(iterator, read_ahead=None):
+    """
+    Async iterator over a blocking `iterator`, advanced in the media I/O pool.
+
+    At most `read_ahead` chunks (API_FILE_STREAM_READ_AHEAD) are read before
+    the client takes them. The ASGI server only accepts the next chunk once
+    the socket can take it, so a slow client slows the reads down (backpressure)
+    instead of buffering the file in memory. Closing the stream early waits
+    for the read in progress, so the file can then be closed safely.
+    """
+    read_ahead = max(1, read_ahead or getattr(settings, "API_FILE_STREAM_READ_AHEAD", 2))
+    loop = asyncio.get_running_loop()
+    pool = io_pool()
+    queue = asyncio.Queue(maxsize=read_ahead)
+    in_flight = None
+
+    async def produce():
+        nonlocal in_flight
+        try:
+            while True:
+                in_flight = pool.submit(next, iterator, _DONE)
+                chunk = await asyncio.wrap_future(in_flight, loop=loop)
+                await queue.put(chunk)
+                if chunk is _DONE:
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await queue.put(e)
+
+    producer = loop.create_task(produce())
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is _DONE:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+        if in_flight is not None and not in_flight.done():
+            await asyncio.gather(asyncio.wrap_future(in_flight, loop=loop), return_exceptions=True)
+
+
+def stream_async(response, source, chunk_size=None):
+    """
+    Make a FileResponse built for `source` stream from the media I/O pool.
+
+    The headers FileResponse derived from the file (length, type,
+    disposition) stay; `source` is still closed with the response.
+    """
+    response.streaming_content = iterate_in_pool(file_chunks(source, chunk_size))
+    return response
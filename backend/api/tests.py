@@ -1,11 +1,42 @@
-from django.test import TestCase, Client, override_settings
+from django.test import TestCase, TransactionTestCase, Client, RequestFactory, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 import json
 from django.core.files.uploadedfile import SimpleUploadedFile
 import json
-from .models import Assignment
+from django.contrib.sessions.models import Session
+from django.db import IntegrityError, connection, transaction
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from io import StringIO
+import asyncio
+import copy
+import time
+import hashlib
+import os
+import tempfile
+import threading
+import zipfile
+from io import BytesIO
+from unittest.mock import patch
+import numpy as np
+import boto3
+import moto
+from .models import Assignment, Blob, CriterionScore, Mark, MarkerProgress, ModerationEvent, Submission, Upload
+from .middleware import session_cache
+from .tokens import issue_stream_token, issue_token, revoke_tokens, verify_token
+from .progress import rebuild_progress, reset_marks, verify_progress
+from .analytics import agreement_metrics, assignment_agreement
+from .stats_cache import VersionedPayloadCache, stats_cache
+from .rubrics import diff_rubrics
+from .blobs import count_references, rebuild_references
+from .file_serving import serve_file
+from .streaming import iterate_in_pool
+from . import events, views
+from asgiref.sync import async_to_sync, sync_to_async
 
 
 User = get_user_model()
@@ -298,3 +329,1710 @@ class EdgeCasesAndErrorPathsTests(TestCase):
         self.assertEqual(resp.status_code, 401)
         self.assertFalse(resp.json()["successful"])
 
+
+
+class SessionMiddlewareTests(TestCase):
+    def setUp(self):
+        session_cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username="cached",
+            email="cached@example.com",
+            password="cachedpass",
+            role="marker",
+        )
+        self.client.force_login(self.user)
+        self.session_key = self.client.session.session_key
+
+    def test_repeat_request_is_served_from_cache(self):
+        url = reverse("login_status")
+        self.client.get(url, HTTP_X_SESSION_ID=self.session_key)
+        with self.assertNumQueries(0):
+            resp = self.client.get(url, HTTP_X_SESSION_ID=self.session_key)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["email"], self.user.email)
+
+    def test_logout_invalidates_cached_session(self):
+        url = reverse("login_status")
+        self.client.get(url, HTTP_X_SESSION_ID=self.session_key)
+        self.client.post(reverse("logout"), HTTP_X_SESSION_ID=self.session_key)
+        resp = self.client.get(url, HTTP_X_SESSION_ID=self.session_key)
+        self.assertEqual(resp.status_code, 401)
+
+    def test_edit_account_invalidates_cached_user(self):
+        url = reverse("account_view", kwargs={"id": self.user.id})
+        self.client.get(url, HTTP_X_SESSION_ID=self.session_key)
+        self.client.post(
+            reverse("edit_account_view", kwargs={"id": self.user.id}),
+            {"username": "renamed"},
+            HTTP_X_SESSION_ID=self.session_key,
+        )
+        resp = self.client.get(url, HTTP_X_SESSION_ID=self.session_key)
+        self.assertEqual(resp.json()["username"], "renamed")
+
+    def test_expired_session_is_rejected(self):
+        Session.objects.filter(session_key=self.session_key).update(
+            expire_date=timezone.now() - timezone.timedelta(seconds=1)
+        )
+        resp = self.client.get(reverse("login_status"), HTTP_X_SESSION_ID=self.session_key)
+        self.assertEqual(resp.status_code, 401)
+
+
+@override_settings(API_AUTH_MODE="token")
+class SignedTokenTests(TestCase):
+    def setUp(self):
+        session_cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username="tok",
+            email="tok@example.com",
+            password="tokpass",
+            role="admin",
+        )
+
+    def _login(self):
+        resp = self.client.post(
+            reverse("login"),
+            data=json.dumps({"email": "tok@example.com", "password": "tokpass"}),
+            content_type="application/json",
+        )
+        return resp.json()["sessionId"]
+
+    def test_login_issues_versioned_token(self):
+        token = self._login()
+        self.assertTrue(token.startswith("v1."))
+        claims = verify_token(token)
+        self.assertEqual(claims.user_id, self.user.id)
+        self.assertEqual(claims.role, "admin")
+
+    def test_token_authenticates_without_session_lookup(self):
+        token = self._login()
+        url = reverse("login_status")
+        self.client.get(url, HTTP_X_SESSION_ID=token)
+        with self.assertNumQueries(0):
+            resp = self.client.get(url, HTTP_X_SESSION_ID=token)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["id"], self.user.id)
+
+    def test_tampered_token_is_rejected(self):
+        token = self._login()
+        version, body, signature = token.split(".")
+        forged = f"{version}.{body}x.{signature}"
+        resp = self.client.get(reverse("login_status"), HTTP_X_SESSION_ID=forged)
+        self.assertEqual(resp.status_code, 401)
+
+    def test_logout_revokes_token(self):
+        token = self._login()
+        self.client.post(reverse("logout"), HTTP_X_SESSION_ID=token)
+        resp = self.client.get(reverse("login_status"), HTTP_X_SESSION_ID=token)
+        self.assertEqual(resp.status_code, 401)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_generation, 1)
+
+
+@override_settings(MEDIA_ROOT="/tmp/test-media")
+class ShowAssignmentsQueryTests(TestCase):
+    def setUp(self):
+        session_cache.clear()
+        self.client = Client()
+        self.admin = User.objects.create_user(
+            username="qadmin", email="qadmin@example.com", password="x", role="admin"
+        )
+        self.markers = [
+            User.objects.create_user(
+                username=f"qm{i}", email=f"qm{i}@example.com", password="x", role="marker"
+            )
+            for i in range(3)
+        ]
+
+    def _make_assignment(self, name, finalized=True):
+        assignment = Assignment.objects.create(
+            name=name,
+            creation_date=timezone.now(),
+            rubric=SimpleUploadedFile("r.txt", b"rubric"),
+            assignment_file=SimpleUploadedFile("a.pdf", b"pdfdata"),
+            mark_criteria={"criteria": []},
+            due_date=timezone.now() + timezone.timedelta(days=7),
+            administrator=self.admin,
+        )
+        for s in range(2):
+            submission = Submission.objects.create(
+                name=f"{name}-S{s}", comment="", admin_marks={}, assignment=assignment
+            )
+            for marker in self.markers:
+                Mark.objects.create(
+                    marks={}, is_finalized=finalized, marker=marker, submission=submission
+                )
+        rebuild_progress([assignment.id])
+        return assignment
+
+    def _get(self, user):
+        self.client.force_login(user)
+        url = reverse("assignments", kwargs={"id": user.id})
+        session_key = self.client.session.session_key
+        self.client.get(url, HTTP_X_SESSION_ID=session_key)  # warm the session cache
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url, HTTP_X_SESSION_ID=session_key)
+        return resp.json(), len(ctx.captured_queries)
+
+    def test_completed_flag_for_both_roles(self):
+        self._make_assignment("Done")
+        pending = self._make_assignment("Pending", finalized=False)
+        Mark.objects.filter(
+            submission__assignment=pending, marker=self.markers[0]
+        ).update(is_finalized=True)
+        rebuild_progress([pending.id])
+
+        data, _ = self._get(self.admin)
+        completed = {a["name"]: a["completed"] for a in data["assignments"]}
+        self.assertEqual(completed, {"Done": True, "Pending": False})
+
+        data, _ = self._get(self.markers[0])
+        completed = {a["name"]: a["completed"] for a in data["assignments"]}
+        self.assertEqual(completed, {"Done": True, "Pending": True})
+
+        data, _ = self._get(self.markers[1])
+        completed = {a["name"]: a["completed"] for a in data["assignments"]}
+        self.assertEqual(completed, {"Done": True, "Pending": False})
+
+    def test_missing_mark_rows_count_as_unfinalized(self):
+        self._make_assignment("Done")
+        latecomer = User.objects.create_user(
+            username="late", email="late@example.com", password="x", role="marker"
+        )
+        self.assertFalse(Mark.objects.filter(marker=latecomer).exists())
+
+        data, _ = self._get(latecomer)
+        self.assertEqual(
+            [(a["name"], a["completed"]) for a in data["assignments"]], [("Done", False)]
+        )
+        data, _ = self._get(self.admin)
+        self.assertFalse(data["assignments"][0]["completed"])
+
+    def test_query_count_is_constant(self):
+        self._make_assignment("A0")
+        _, admin_small = self._get(self.admin)
+        _, marker_small = self._get(self.markers[0])
+
+        for i in range(1, 6):
+            self._make_assignment(f"A{i}", finalized=bool(i % 2))
+        admin_data, admin_large = self._get(self.admin)
+        marker_data, marker_large = self._get(self.markers[0])
+
+        self.assertEqual(len(admin_data["assignments"]), 6)
+        self.assertEqual(len(marker_data["assignments"]), 6)
+        self.assertEqual(admin_small, admin_large)
+        self.assertEqual(marker_small, marker_large)
+
+
+@override_settings(MEDIA_ROOT="/tmp/test-media")
+class ProgressCounterTests(TestCase):
+    def setUp(self):
+        session_cache.clear()
+        self.client = Client()
+        self.admin = User.objects.create_user(
+            username="padmin", email="padmin@example.com", password="x", role="admin"
+        )
+        self.marker = User.objects.create_user(
+            username="pm", email="pm@example.com", password="x", role="marker"
+        )
+        self.assignment = Assignment.objects.create(
+            name="P1",
+            creation_date=timezone.now(),
+            rubric=SimpleUploadedFile("r.txt", b"rubric"),
+            assignment_file=SimpleUploadedFile("a.pdf", b"pdfdata"),
+            mark_criteria={"criteria": []},
+            due_date=timezone.now() + timezone.timedelta(days=7),
+            administrator=self.admin,
+        )
+        self.submission = Submission.objects.create(
+            name="S1", comment="", admin_marks={}, assignment=self.assignment
+        )
+        self.client.force_login(self.marker)
+        self.session_key = self.client.session.session_key
+
+    def _save_mark(self, is_finalized):
+        url = reverse("submission_mark_view", kwargs={
+            "user_id": self.marker.id,
+            "assignment_id": self.assignment.id,
+            "submission_id": self.submission.id,
+        })
+        return self.client.post(
+            url,
+            data=json.dumps({"marks": {}, "is_finalized": is_finalized}),
+            content_type="application/json",
+            HTTP_X_SESSION_ID=self.session_key,
+        )
+
+    def test_mark_saves_update_counters(self):
+        self._save_mark(False)
+        self.assignment.refresh_from_db()
+        self.assertEqual((self.assignment.marks_total, self.assignment.marks_finalized), (1, 0))
+
+        self._save_mark(True)
+        self.assignment.refresh_from_db()
+        self.assertEqual((self.assignment.marks_total, self.assignment.marks_finalized), (1, 1))
+        progress = MarkerProgress.objects.get(assignment=self.assignment, marker=self.marker)
+        self.assertEqual((progress.marks_total, progress.marks_finalized), (1, 1))
+        self.assertEqual(verify_progress(), [])
+
+    def test_detail_totals_count_missing_marks_as_unfinalized(self):
+        User.objects.create_user(username="pm2", email="pm2@example.com", password="x", role="marker")
+        Submission.objects.create(name="S2", comment="", admin_marks={}, assignment=self.assignment)
+        self._save_mark(True)
+        resp = self.client.get(reverse("assignment_detail_view", kwargs={"assignment_id": self.assignment.id}))
+        data = resp.json()
+        self.assertEqual(data["assignment"]["progress"], {"totalMarks": 4, "finalizedMarks": 1})
+        self.assertEqual([s["totalMarkers"] for s in data["submissions"]], [2, 2])
+        self.assertEqual([s["markers"] for s in data["submissions"]], [1, 0])
+
+    def test_one_mark_per_marker_and_submission(self):
+        self._save_mark(False)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Mark.objects.create(marks={}, marker=self.marker, submission=self.submission)
+
+    def test_rebuild_command_repairs_drift(self):
+        Mark.objects.create(marks={}, is_finalized=True, marker=self.marker, submission=self.submission)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_progress", "--check", stdout=StringIO())
+        call_command("rebuild_progress", stdout=StringIO())
+        self.assertEqual(verify_progress(), [])
+
+
+# Rubric in the shape the frontend saves; admin marks select a level id per criterion
+LEVEL_RUBRIC = {
+    "levels": [{"id": "L1", "name": "High"}, {"id": "L2", "name": "Low"}],
+    "criteria": [
+        {"id": "C1", "cells": [{"min": 8, "max": 10}, {"min": 0, "max": 5}]},
+        {"id": "C2", "cells": [{"min": 3, "max": 4}, {"min": 0, "max": 2}]},
+    ],
+}
+
+
+@override_settings(MEDIA_ROOT="/tmp/test-media")
+class ScoreColumnTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username="sadmin", email="sadmin@example.com", password="x", role="admin"
+        )
+        self.markers = [
+            User.objects.create_user(
+                username=f"sm{i}", email=f"sm{i}@example.com", password="x", role="marker"
+            )
+            for i in range(2)
+        ]
+        self.assignment = Assignment.objects.create(
+            name="S",
+            creation_date=timezone.now(),
+            rubric=SimpleUploadedFile("r.txt", b"rubric"),
+            assignment_file=SimpleUploadedFile("a.pdf", b"pdfdata"),
+            mark_criteria={"criteria": []},
+            due_date=timezone.now() + timezone.timedelta(days=7),
+            administrator=self.admin,
+        )
+        self.submission = Submission.objects.create(
+            name="S1", comment="", admin_marks={"C1": 3, "C2": 5}, assignment=self.assignment
+        )
+
+    def test_scores_derived_on_save(self):
+        self.assertEqual(self.submission.admin_total_score, 8)
+        self.assertEqual(self.submission.admin_scored_criteria, 2)
+        mark = Mark.objects.create(
+            marks={"C1": {"level_index": 1, "score": 2}, "C2": {"level_index": 0}},
+            marker=self.markers[0],
+            submission=self.submission,
+        )
+        self.assertEqual((mark.total_score, mark.scored_criteria), (2, 1))
+
+    def test_admin_level_ids_scored_from_rubric(self):
+        self.assignment.mark_criteria = LEVEL_RUBRIC
+        self.assignment.save()
+        submission = Submission.objects.create(
+            name="S2", comment="", admin_marks={"C1": "L2", "C2": "L1", "C3": "L1"}, assignment=self.assignment
+        )
+        # The cell max of the selected level; unknown criteria or levels are unscored
+        self.assertEqual((submission.admin_total_score, submission.admin_scored_criteria), (9, 2))
+
+        rubric = copy.deepcopy(LEVEL_RUBRIC)
+        rubric["criteria"][0]["cells"][1]["max"] = 6
+        self.assignment.mark_criteria = rubric
+        self.assignment.save()
+        Submission.rescore(self.assignment)
+        submission.refresh_from_db()
+        self.assertEqual(submission.admin_total_score, 10)
+
+    def test_detail_view_averages_in_database(self):
+        Mark.objects.create(
+            marks={"C1": {"score": 2}, "C2": {"score": 4}},
+            marker=self.markers[0], submission=self.submission,
+        )
+        Mark.objects.create(
+            marks={"C1": {"score": 6}},
+            marker=self.markers[1], submission=self.submission,
+        )
+        url = reverse("assignment_detail_view", kwargs={"assignment_id": self.assignment.id})
+        with self.assertNumQueries(3):
+            resp = self.client.get(url)
+        submission = resp.json()["submissions"][0]
+        self.assertEqual(submission["markers"], 2)
+        self.assertAlmostEqual(submission["averageMarkers"], 4)
+
+
+@override_settings(MEDIA_ROOT="/tmp/test-media")
+class CriterionScoreTests(TestCase):
+    def setUp(self):
+        stats_cache.clear()
+        self.admin = User.objects.create_user(
+            username="cadmin", email="cadmin@example.com", password="x", role="admin"
+        )
+        self.markers = [
+            User.objects.create_user(
+                username=f"cm{i}", email=f"cm{i}@example.com", password="x", role="marker"
+            )
+            for i in range(2)
+        ]
+        self.assignment = Assignment.objects.create(
+            name="C",
+            creation_date=timezone.now(),
+            rubric=SimpleUploadedFile("r.txt", b"rubric"),
+            assignment_file=SimpleUploadedFile("a.pdf", b"pdfdata"),
+            mark_criteria={"criteria": []},
+            due_date=timezone.now() + timezone.timedelta(days=7),
+            administrator=self.admin,
+        )
+        self.submission = Submission.objects.create(
+            name="S1", comment="", admin_marks={"C1": 4, "C2": 2}, assignment=self.assignment
+        )
+
+    def test_rows_follow_mark_saves(self):
+        mark = Mark.objects.create(
+            marks={"C1": {"level_index": 1, "score": 3}, "C2": {"level_index": 0}},
+            marker=self.markers[0], submission=self.submission,
+        )
+        rows = {r.criterion_key: (r.value, r.level) for r in mark.criterion_scores.all()}
+        self.assertEqual(rows, {"C1": (3, 1), "C2": (None, 0)})
+
+        mark.marks = {"C2": {"level_index": 2, "score": 5}}
+        mark.save()
+        rows = {r.criterion_key: (r.value, r.level) for r in mark.criterion_scores.all()}
+        self.assertEqual(rows, {"C2": (5, 2)})
+
+    def test_comparison_view_reports_criterion_stats(self):
+        Mark.objects.create(
+            marks={"C1": {"score": 2}, "C2": {"score": 2}},
+            marker=self.markers[0], submission=self.submission,
+        )
+        Mark.objects.create(
+            marks={"C1": {"score": 4}},
+            marker=self.markers[1], submission=self.submission,
+        )
+        url = reverse("mark_comparison_view", kwargs={
+            "assignment_id": self.assignment.id, "submission_id": self.submission.id,
+        })
+        stats = self.client.get(url).json()["criterionStats"]
+        self.assertEqual(stats["C1"]["count"], 2)
+        self.assertAlmostEqual(stats["C1"]["mean"], 3)
+        self.assertAlmostEqual(stats["C1"]["stdDev"], 1)
+        self.assertAlmostEqual(stats["C1"]["meanAbsDeviation"], 1)
+        self.assertEqual(stats["C2"]["adminScore"], 2)
+        self.assertAlmostEqual(stats["C2"]["meanAbsDeviation"], 0)
+
+    def test_criterion_stats_score_admin_level_ids(self):
+        self.assignment.mark_criteria = LEVEL_RUBRIC
+        self.assignment.save()
+        self.submission.admin_marks = {"C1": "L1", "C2": "L2"}  # as the assignment pages save them
+        self.submission.save()
+        Mark.objects.create(
+            marks={"C1": {"level_index": 0, "score": 9}, "C2": {"level_index": 1, "score": 1}},
+            marker=self.markers[0], submission=self.submission,
+        )
+        url = reverse("mark_comparison_view", kwargs={
+            "assignment_id": self.assignment.id, "submission_id": self.submission.id,
+        })
+        stats = self.client.get(url).json()["criterionStats"]
+        self.assertEqual((stats["C1"]["adminScore"], stats["C2"]["adminScore"]), (10, 2))
+        self.assertAlmostEqual(stats["C1"]["meanAbsDeviation"], 1)
+        self.assertAlmostEqual(stats["C2"]["meanAbsDeviation"], 1)
+
+
+@override_settings(MEDIA_ROOT="/tmp/test-media")
+class AgreementTests(TestCase):
+    def test_perfect_agreement(self):
+        scores = np.array([[[1.0, 2.0], [1.0, 2.0]], [[3.0, 4.0], [3.0, 4.0]]])
+        admin = np.array([[1.0, 2.0], [3.0, 5.0]])
+        metrics = agreement_metrics(scores, admin)
+        self.assertAlmostEqual(metrics["icc"], 1.0)
+        self.assertAlmostEqual(metrics["alpha"], 1.0)
+        self.assertAlmostEqual(float(metrics["mean_abs_deviation"]), 0.25)
+        np.testing.assert_allclose(metrics["marker_bias"], [-0.25, -0.25])
+
+    def test_krippendorff_alpha_matches_reference(self):
+        # Krippendorff (2011) interval example: 4 coders, 12 units, missing values
+        data = np.array([
+            [1, 1, np.nan, 1],
+            [2, 2, 3, 2],
+            [3, 3, 3, 3],
+            [3, 3, 3, 3],
+            [2, 2, 2, 2],
+            [1, 2, 3, 4],
+            [4, 4, 4, 4],
+            [1, 1, 2, 1],
+            [2, 2, 2, 2],
+            [np.nan, 5, 5, 5],
+            [np.nan, np.nan, 1, 1],
+            [np.nan, np.nan, 3, np.nan],
+        ])
+        # Units x coders -> (units, coders, 1 criterion)
+        metrics = agreement_metrics(data[:, :, None], np.full((12, 1), np.nan))
+        self.assertAlmostEqual(metrics["alpha"], 0.849, places=3)
+
+    def test_large_assignment_is_fast(self):
+        # 500 markers x 50 submissions x 20 criteria, timed from the stored rows to the report
+        admin = User.objects.create_user(username="ladmin", email="ladmin@example.com", password="x", role="admin")
+        assignment = Assignment.objects.create(
+            name="L", creation_date=timezone.now(), due_date=timezone.now(), administrator=admin,
+            mark_criteria={
+                "levels": [{"id": f"L{i}"} for i in range(4)],
+                "criteria": [{"id": f"C{c}", "cells": [{"max": 10 - 2 * i} for i in range(4)]} for c in range(20)],
+            },
+        )
+        markers = User.objects.bulk_create([
+            User(username=f"lm{i}", email=f"lm{i}@example.com", role="marker") for i in range(500)
+        ])
+        submissions = Submission.objects.bulk_create([
+            Submission(name=f"S{i}", comment="", assignment=assignment,
+                       admin_marks={f"C{c}": f"L{(i + c) % 4}" for c in range(20)})
+            for i in range(50)
+        ])
+        Mark.objects.bulk_create([Mark(marks={}, marker=m, submission=s) for s in submissions for m in markers])
+        with connection.cursor() as cursor:  # 500k rows are too slow to build as model instances
+            for c in range(20):
+                cursor.execute(
+                    "INSERT INTO api_criterionscore (mark_id, submission_id, criterion_key, value) "
+                    "SELECT id, submission_id, %s, (id * 7 + %s) %% 11 FROM api_mark",
+                    [f"C{c}", c],
+                )
+
+        start = time.perf_counter()
+        report = assignment_agreement(assignment)
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertEqual(len(report["markers"]), 500)
+        self.assertEqual(sum(m["ratedCriteria"] for m in report["markers"]), 500 * 50 * 20)
+        self.assertIsNotNone(report["meanAbsoluteDeviation"])
+
+    def test_agreement_endpoint(self):
+        stats_cache.clear()
+        admin = User.objects.create_user(
+            username="aadmin", email="aadmin@example.com", password="x", role="admin"
+        )
+        markers = [
+            User.objects.create_user(
+                username=f"am{i}", email=f"am{i}@example.com", password="x", role="marker"
+            )
+            for i in range(2)
+        ]
+        assignment = Assignment.objects.create(
+            name="G",
+            creation_date=timezone.now(),
+            rubric=SimpleUploadedFile("r.txt", b"rubric"),
+            assignment_file=SimpleUploadedFile("a.pdf", b"pdfdata"),
+            mark_criteria=LEVEL_RUBRIC,
+            due_date=timezone.now() + timezone.timedelta(days=7),
+            administrator=admin,
+        )
+        # Level ids as the assignment pages save them: C1 "L2" scores 5, C2 "L2" scores 2
+        submission = Submission.objects.create(
+            name="S1", comment="", admin_marks={"C1": "L2", "C2": "L2"}, assignment=assignment
+        )
+        Mark.objects.create(marks={"C1": {"score": 5}, "C2": {"score": 3}}, marker=markers[0], submission=submission)
+        Mark.objects.create(marks={"C1": {"score": 7}}, marker=markers[1], submission=submission)
+
+        url = reverse("assignment_agreement_view", kwargs={"assignment_id": assignment.id})
+        data = self.client.get(url).json()
+        self.assertTrue(data["successful"])
+        self.assertEqual([c["key"] for c in data["criteria"]], ["C1", "C2"])
+        by_email = {m["email"]: m for m in data["markers"]}
+        self.assertAlmostEqual(by_email["am0@example.com"]["bias"], 0.5)
+        self.assertAlmostEqual(by_email["am1@example.com"]["meanAbsoluteDeviation"], 2)
+        self.assertAlmostEqual(data["meanAbsoluteDeviation"], 1)
+
+
+@override_settings(MEDIA_ROOT="/tmp/test-media")
+class StatsCacheTests(TestCase):
+    def setUp(self):
+        session_cache.clear()
+        stats_cache.clear()
+        self.client = Client()
+        self.admin = User.objects.create_user(
+            username="vadmin", email="vadmin@example.com", password="x", role="admin"
+        )
+        self.marker = User.objects.create_user(
+            username="vm", email="vm@example.com", password="x", role="marker"
+        )
+        self.assignment = Assignment.objects.create(
+            name="V",
+            creation_date=timezone.now(),
+            rubric=SimpleUploadedFile("r.txt", b"rubric"),
+            assignment_file=SimpleUploadedFile("a.pdf", b"pdfdata"),
+            mark_criteria={"criteria": [{"id": "C1"}]},
+            due_date=timezone.now() + timezone.timedelta(days=7),
+            administrator=self.admin,
+        )
+        self.submission = Submission.objects.create(
+            name="S1", comment="", admin_marks={"C1": 3}, assignment=self.assignment
+        )
+        self.url = reverse("mark_comparison_view", kwargs={
+            "assignment_id": self.assignment.id, "submission_id": self.submission.id,
+        })
+
+    def test_repeat_read_is_one_lookup(self):
+        first = self.client.get(self.url).json()
+        with self.assertNumQueries(1):
+            second = self.client.get(self.url).json()
+        self.assertEqual(first, second)
+
+    def test_mark_save_invalidates(self):
+        self.assertEqual(self.client.get(self.url).json()["markers"], [])
+
+        self.client.force_login(self.marker)
+        self.client.post(
+            reverse("submission_mark_view", kwargs={
+                "user_id": self.marker.id,
+                "assignment_id": self.assignment.id,
+                "submission_id": self.submission.id,
+            }),
+            data=json.dumps({"marks": {"C1": {"score": 2}}, "is_finalized": False}),
+            content_type="application/json",
+            HTTP_X_SESSION_ID=self.client.session.session_key,
+        )
+        markers = self.client.get(self.url).json()["markers"]
+        self.assertEqual(len(markers), 1)
+        self.assertEqual(markers[0]["marks"], {"C1": {"score": 2}})
+
+    def test_account_edit_invalidates(self):
+        Mark.objects.create(marks={"C1": {"score": 2}}, marker=self.marker, submission=self.submission)
+        self.assertEqual(self.client.get(self.url).json()["markers"][0]["marker"]["username"], "vm")
+
+        self.client.force_login(self.marker)
+        self.client.post(
+            reverse("edit_account_view", kwargs={"id": self.marker.id}),
+            {"username": "renamed"},
+            HTTP_X_SESSION_ID=self.client.session.session_key,
+        )
+        self.assertEqual(self.client.get(self.url).json()["markers"][0]["marker"]["username"], "renamed")
+
+    def test_eviction_respects_memory_cap(self):
+        cache = VersionedPayloadCache(max_bytes=100)
+        cache.set("a", b"x" * 60)
+        cache.set("b", b"y" * 60)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), b"y" * 60)
+
+
+@override_settings(MEDIA_ROOT="/tmp/test-media")
+class CreateAssignmentTests(TestCase):
+    def setUp(self):
+        session_cache.clear()
+        self.client = Client(raise_request_exception=False)
+        self.admin = User.objects.create_user(
+            username="cradmin", email="cradmin@example.com", password="x", role="admin"
+        )
+        self.client.force_login(self.admin)
+        self.session_key = self.client.session.session_key
+
+    def _post(self, submissions):
+        data = {
+            "name": "New",
+            "creation_date": "2025-01-01T00:00:00Z",
+            "due_date": "2025-02-01T00:00:00Z",
+            "mark_criteria": json.dumps({"levels": [], "criteria": []}),
+            "rubric": SimpleUploadedFile("rubric.docx", b"rubric"),
+            "assignment_file": SimpleUploadedFile("assignment.pdf", b"pdf"),
+        }
+        for i, admin_marks in enumerate(submissions):
+            data[f"submissions[{i}][name]"] = f"Submission {i + 1}"
+            data[f"submissions[{i}][admin_marks]"] = admin_marks
+            data[f"submissions[{i}][submission_file]"] = SimpleUploadedFile(f"s{i}.pdf", b"pdf")
+        return self.client.post(reverse("create_assignment"), data, HTTP_X_SESSION_ID=self.session_key)
+
+    @override_settings(API_BULK_CREATE_BATCH_SIZE=2)
+    def test_submissions_created_in_batches(self):
+        resp = self._post(['{"C1": 2}'] * 5)
+        self.assertEqual(resp.status_code, 201)
+        submissions = Submission.objects.filter(assignment_id=resp.json()["assignment_id"])
+        self.assertEqual(submissions.count(), 5)
+        self.assertTrue(all(s.admin_total_score == 2 for s in submissions))
+
+    def test_failure_rolls_back_everything(self):
+        resp = self._post(['{"C1": 2}', "not json"])
+        self.assertEqual(resp.status_code, 500)
+        self.assertFalse(Assignment.objects.exists())
+        self.assertFalse(Submission.objects.exists())
+
+
+_UPLOAD_TMP = tempfile.mkdtemp()
+
+
+@override_settings(
+    MEDIA_ROOT=_UPLOAD_TMP + "/media",
+    API_UPLOAD_CHUNK_ROOT=_UPLOAD_TMP + "/chunks",
+    API_UPLOAD_CHUNK_SIZE=4,
+)
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        session_cache.clear()
+        self.client = Client()
+        self.admin = User.objects.create_user(
+            username="upadmin", email="upadmin@example.com", password="x", role="admin"
+        )
+        self.client.force_login(self.admin)
+        self.headers = {"HTTP_X_SESSION_ID": self.client.session.session_key}
+
+    def _init(self, data, sha256=None):
+        body = {"filename": "big.pdf", "size": len(data)}
+        if sha256 is not None:
+            body["sha256"] = sha256
+        return self.client.post(
+            reverse("upload_init"), json.dumps(body), content_type="application/json", **self.headers
+        )
+
+    def _put(self, upload_id, index, chunk):
+        return self.client.put(
+            reverse("upload_chunk", args=[upload_id, index]), chunk,
+            content_type="application/octet-stream", **self.headers,
+        )
+
+    def _upload(self, data):
+        upload_id = self._init(data, hashlib.sha256(data).hexdigest()).json()["uploadId"]
+        for i in range(0, len(data), 4):
+            self._put(upload_id, i // 4, data[i:i + 4])
+        self.client.post(reverse("upload_complete", args=[upload_id]), **self.headers)
+        return upload_id
+
+    @override_settings(API_UPLOAD_CHUNK_SIZE=1024, API_UPLOAD_MIN_CHUNK_SIZE=256, API_UPLOAD_MAX_CHUNKS=8)
+    def test_chunk_count_is_bounded(self):
+        def init(size, chunk_size):
+            body = {"filename": "big.pdf", "size": size, "chunkSize": chunk_size}
+            return self.client.post(
+                reverse("upload_init"), json.dumps(body), content_type="application/json", **self.headers
+            )
+
+        self.assertEqual(init(10 ** 9, 1).status_code, 400)
+        self.assertEqual(init(4096, 255).status_code, 400)
+        self.assertEqual(init(4096, 256).status_code, 400)  # 16 chunks
+        self.assertEqual(init(4096, 512).status_code, 201)
+        self.assertEqual(init(10, 1).status_code, 400)
+        self.assertEqual(init(10, 10).status_code, 201)  # a single small chunk
+
+    def test_resume_after_missing_chunk(self):
+        data = b"%PDF-0123456789"
+        resp = self._init(data, hashlib.sha256(data).hexdigest())
+        self.assertEqual(resp.status_code, 201)
+        upload_id = resp.json()["uploadId"]
+        self.assertEqual(resp.json()["totalChunks"], 4)
+
+        for index in (0, 2, 3):
+            self.assertEqual(self._put(upload_id, index, data[index * 4:index * 4 + 4]).status_code, 200)
+
+        status = self.client.get(reverse("upload_status", args=[upload_id]), **self.headers).json()
+        self.assertEqual(status["missingChunks"], [1])
+        resp = self.client.post(reverse("upload_complete", args=[upload_id]), **self.headers)
+        self.assertEqual(resp.status_code, 409)
+
+        self._put(upload_id, 1, data[4:8])
+        resp = self.client.post(reverse("upload_complete", args=[upload_id]), **self.headers)
+        self.assertEqual(resp.status_code, 200)
+        upload = Upload.objects.get(id=upload_id)
+        self.assertTrue(upload.is_complete)
+        with upload.file.open("rb") as fh:
+            self.assertEqual(fh.read(), data)
+
+    def test_wrong_chunk_length_rejected(self):
+        upload_id = self._init(b"12345678").json()["uploadId"]
+        self.assertEqual(self._put(upload_id, 0, b"123").status_code, 400)
+        self.assertEqual(self._put(upload_id, 5, b"1234").status_code, 400)
+
+    def test_checksum_mismatch(self):
+        upload_id = self._init(b"12345678", sha256="0" * 64).json()["uploadId"]
+        self._put(upload_id, 0, b"1234")
+        self._put(upload_id, 1, b"5678")
+        resp = self.client.post(reverse("upload_complete", args=[upload_id]), **self.headers)
+        self.assertEqual(resp.status_code, 422)
+        self.assertFalse(Upload.objects.get(id=upload_id).is_complete)
+
+    def test_other_users_upload_not_visible(self):
+        upload_id = self._upload(b"abcdefgh")
+        other = User.objects.create_user(username="up2", email="up2@example.com", password="x", role="admin")
+        client = Client()
+        client.force_login(other)
+        resp = client.get(
+            reverse("upload_status", args=[upload_id]), HTTP_X_SESSION_ID=client.session.session_key
+        )
+        self.assertEqual(resp.status_code, 404)
+
+    def test_create_assignment_from_upload_handles(self):
+        submission_id = self._upload(b"%PDF-submission")
+        data = {
+            "name": "Chunked",
+            "creation_date": "2025-01-01T00:00:00Z",
+            "due_date": "2025-02-01T00:00:00Z",
+            "mark_criteria": json.dumps({"levels": [], "criteria": []}),
+            "rubric_upload": self._upload(b"rubric"),
+            "assignment_file_upload": self._upload(b"%PDF-assignment"),
+            "submissions[0][name]": "Submission 1",
+            "submissions[0][admin_marks]": "{}",
+            "submissions[0][submission_upload]": submission_id,
+        }
+        resp = self.client.post(reverse("create_assignment"), data, **self.headers)
+        self.assertEqual(resp.status_code, 201)
+        submission = Submission.objects.get(assignment_id=resp.json()["assignment_id"])
+        with submission.submission_file.open("rb") as fh:
+            self.assertEqual(fh.read(), b"%PDF-submission")
+
+
+@override_settings(MEDIA_ROOT=_UPLOAD_TMP + "/media")
+class ImportSubmissionsTests(TestCase):
+    def setUp(self):
+        session_cache.clear()
+        self.client = Client()
+        self.admin = User.objects.create_user(
+            username="zipadmin", email="zipadmin@example.com", password="x", role="admin"
+        )
+        self.client.force_login(self.admin)
+        self.headers = {"HTTP_X_SESSION_ID": self.client.session.session_key}
+        self.assignment = Assignment.objects.create(
+            name="Zip",
+            creation_date=timezone.now(),
+            rubric=SimpleUploadedFile("r.txt", b"rubric"),
+            assignment_file=SimpleUploadedFile("a.pdf", b"pdfdata"),
+            mark_criteria={"criteria": []},
+            due_date=timezone.now() + timezone.timedelta(days=7),
+            administrator=self.admin,
+        )
+
+    def _zip(self, entries):
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name, data in entries.items():
+                archive.writestr(name, data)
+        return SimpleUploadedFile("submissions.zip", buffer.getvalue(), content_type="application/zip")
+
+    def _post(self, archive):
+        return self.client.post(
+            reverse("import_submissions", args=[self.assignment.id]), {"archive": archive}, **self.headers
+        )
+
+    def test_creates_one_submission_per_entry(self):
+        resp = self._post(self._zip({
+            "alice.pdf": b"%PDF-alice",
+            "group/bob smith.pdf": b"%PDF-bob",
+            "__MACOSX/._alice.pdf": b"junk",
+            ".DS_Store": b"junk",
+        }))
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.json()["created"], 2)
+        submissions = {s.name: s for s in Submission.objects.filter(assignment=self.assignment)}
+        self.assertEqual(set(submissions), {"alice", "bob smith"})
+        with submissions["bob smith"].submission_file.open("rb") as fh:
+            self.assertEqual(fh.read(), b"%PDF-bob")
+
+    def test_rejects_bad_archives(self):
+        self.assertEqual(self._post(SimpleUploadedFile("x.zip", b"not a zip")).status_code, 400)
+        self.assertEqual(self._post(self._zip({"empty/.keep": b""})).status_code, 400)
+        with override_settings(API_INGEST_MAX_ENTRIES=1):
+            self.assertEqual(self._post(self._zip({"a.pdf": b"a", "b.pdf": b"b"})).status_code, 413)
+        self.assertFalse(Submission.objects.exists())
+
+    def test_requires_admin(self):
+        marker = User.objects.create_user(username="zipm", email="zipm@example.com", password="x", role="marker")
+        client = Client()
+        client.force_login(marker)
+        resp = client.post(
+            reverse("import_submissions", args=[self.assignment.id]),
+            {"archive": self._zip({"a.pdf": b"a"})}, HTTP_X_SESSION_ID=client.session.session_key,
+        )
+        self.assertEqual(resp.status_code, 403)
+
+
+@override_settings(MEDIA_ROOT=_UPLOAD_TMP + "/media")
+class EditAssignmentTests(TestCase):
+    def setUp(self):
+        session_cache.clear()
+        stats_cache.clear()
+        self.client = Client()
+        self.admin = User.objects.create_user(
+            username="digadmin", email="digadmin@example.com", password="x", role="admin"
+        )
+        self.client.force_login(self.admin)
+        self.headers = {"HTTP_X_SESSION_ID": self.client.session.session_key}
+        self.rubric = {
+            "levels": [{"id": "L1", "name": "Pass"}, {"id": "L2", "name": "Fail"}],
+            "criteria": [
+                {"id": "C1", "title": "Clarity", "maxScore": 5,
+                 "cells": [{"description": "Clear", "max": 5}, {"description": "Unclear", "max": 2}]},
+                {"id": "C2", "title": "Depth", "maxScore": 5,
+                 "cells": [{"description": "Deep", "max": 5}, {"description": "Shallow", "max": 2}]},
+            ],
+        }
+        resp = self.client.post(reverse("create_assignment"), {
+            "name": "Digest",
+            "creation_date": "2025-01-01T00:00:00Z",
+            "due_date": "2025-02-01T00:00:00Z",
+            "mark_criteria": json.dumps(self.rubric),
+            "rubric": SimpleUploadedFile("rubric.docx", b"rubric"),
+            "assignment_file": SimpleUploadedFile("assignment.pdf", b"pdf"),
+            "submissions[0][name]": "S1",
+            "submissions[0][admin_marks]": "{}",
+            "submissions[0][submission_file]": SimpleUploadedFile("s1.pdf", b"%PDF-one"),
+            "submissions[1][name]": "S2",
+            "submissions[1][admin_marks]": "{}",
+            "submissions[1][submission_file]": SimpleUploadedFile("s2.pdf", b"%PDF-two"),
+        }, **self.headers)
+        self.assignment = Assignment.objects.get(id=resp.json()["assignment_id"])
+        self.s1, self.s2 = Submission.objects.filter(assignment=self.assignment).order_by("id")
+        self.markers = [
+            User.objects.create_user(username=f"dm{i}", email=f"dm{i}@example.com", password="x", role="marker")
+            for i in range(3)
+        ]
+        for marker in self.markers:
+            for submission in (self.s1, self.s2):
+                Mark.objects.create(
+                    marker=marker, submission=submission, is_finalized=True,
+                    marks={"C1": {"level_index": 0, "score": 3}, "C2": {"level_index": 1, "score": 2}},
+                )
+        rebuild_progress([self.assignment.id])
+
+    def _edit(self, s1_file=None, s2_file=None, rubric=None):
+        data = {
+            "name": "Digest",
+            "due_date": "2025-02-01T00:00:00Z",
+            "mark_criteria": json.dumps(rubric or self.rubric),
+            "submissions[0][name]": "S1",
+            "submissions[0][admin_marks]": "{}",
+            "submissions[1][name]": "S2",
+            "submissions[1][admin_marks]": "{}",
+        }
+        if s1_file:
+            data["submissions[0][submission_file]"] = s1_file
+        if s2_file:
+            data["submissions[1][submission_file]"] = s2_file
+        return self.client.post(reverse("edit_assignment_view", args=[self.assignment.id]), data, **self.headers)
+
+    def test_digests_recorded_on_upload(self):
+        self.assertEqual(self.s1.submission_sha256, hashlib.sha256(b"%PDF-one").hexdigest())
+        self.assertEqual(self.assignment.rubric_sha256, hashlib.sha256(b"rubric").hexdigest())
+
+    def test_renamed_identical_file_keeps_marks(self):
+        old_name = self.s1.submission_file.name
+        self.assertEqual(self._edit(s1_file=SimpleUploadedFile("renamed.pdf", b"%PDF-one")).status_code, 200)
+        self.s1.refresh_from_db()
+        self.assertEqual(self.s1.submission_file.name, old_name)
+        self.assertEqual(Mark.objects.filter(is_finalized=True).count(), 6)
+
+    def test_same_name_replacement_resets_with_one_update(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self._edit(s2_file=SimpleUploadedFile("s2.pdf", b"%PDF-two, revised"))
+        updates = [q for q in ctx.captured_queries if q["sql"].startswith('UPDATE "api_mark"')]
+        self.assertEqual(len(updates), 1)
+
+        self.assertFalse(Mark.objects.filter(submission=self.s2, is_finalized=True).exists())
+        self.assertFalse(CriterionScore.objects.filter(submission=self.s2).exists())
+        self.assertEqual(Mark.objects.filter(submission=self.s1, is_finalized=True).count(), 3)
+        self.assertEqual(verify_progress([self.assignment.id]), [])
+
+    def _rubric(self, edit):
+        rubric = json.loads(json.dumps(self.rubric))
+        edit(rubric)
+        return rubric
+
+    def test_wording_change_keeps_marks(self):
+        def edit(rubric):
+            rubric["criteria"][0]["title"] = "Clarity of writing"
+            rubric["criteria"][1]["cells"][0]["description"] = "Very deep"
+            rubric["levels"][0]["name"] = "Good"
+        resp = self._edit(rubric=self._rubric(edit)).json()
+        self.assertEqual(resp["rubric_diff"]["cosmetic"], ["C1", "C2"])
+        self.assertEqual(resp["invalidated_criteria"], [])
+        self.assertEqual(resp["marks_touched"], 0)
+        self.assertEqual(Mark.objects.filter(is_finalized=True).count(), 6)
+
+    def test_rescored_and_removed_criteria_cleared(self):
+        def edit(rubric):
+            rubric["criteria"][0]["cells"][1]["max"] = 3
+            rubric["criteria"].append({"id": "C3", "title": "New", "cells": [{}, {}]})
+            del rubric["criteria"][1]
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self._edit(rubric=self._rubric(edit)).json()
+        self.assertEqual(resp["rubric_diff"]["rescored"], ["C1"])
+        self.assertEqual(resp["rubric_diff"]["added"], ["C3"])
+        self.assertEqual(resp["rubric_diff"]["removed"], ["C2"])
+        self.assertEqual(resp["invalidated_criteria"], ["C1", "C2"])
+        self.assertEqual(resp["marks_touched"], 6)
+        self.assertEqual(len([q for q in ctx.captured_queries if q["sql"].startswith('UPDATE "api_mark"')]), 1)
+
+        for mark in Mark.objects.all():
+            self.assertEqual(mark.marks, {})
+            self.assertFalse(mark.is_finalized)
+        self.assertFalse(CriterionScore.objects.filter(submission__assignment=self.assignment).exists())
+        self.assertEqual(verify_progress([self.assignment.id]), [])
+
+    def test_removed_criterion_keeps_other_scores(self):
+        resp = self._edit(rubric=self._rubric(lambda rubric: rubric["criteria"].pop())).json()
+        self.assertEqual(resp["invalidated_criteria"], ["C2"])
+        mark = Mark.objects.filter(submission=self.s1).first()
+        self.assertEqual(mark.marks, {"C1": {"level_index": 0, "score": 3}})
+        self.assertEqual(mark.total_score, 3)
+        self.assertTrue(mark.is_finalized)
+
+    def test_rejected_edit_changes_nothing(self):
+        data = {
+            "name": "Renamed",
+            "due_date": "2025-02-01T00:00:00Z",
+            "mark_criteria": json.dumps({"Q1": 5}),  # would reset every mark
+            "submissions[0][name]": "S1",
+            "submissions[0][admin_marks]": "{}",
+            "submissions[1][name]": "S2",
+            "submissions[1][admin_marks]": "not json",
+        }
+        resp = self.client.post(reverse("edit_assignment_view", args=[self.assignment.id]), data, **self.headers)
+        self.assertEqual(resp.status_code, 400)
+        self.assignment.refresh_from_db()
+        self.assertEqual(self.assignment.name, "Digest")
+        self.assertEqual(Mark.objects.filter(is_finalized=True).count(), 6)
+        self.assertFalse(ModerationEvent.objects.exists())
+
+        self.assertEqual(self._edit(rubric={"Q1": 5}).status_code, 200)
+        self.assertEqual(
+            list(ModerationEvent.objects.order_by("id").values_list("kind", flat=True)),
+            [events.MARKS_RESET, events.ASSIGNMENT_EDITED],
+        )
+
+    def test_level_change_rescores_everything(self):
+        diff = diff_rubrics(self.rubric, self._rubric(lambda rubric: rubric["levels"].reverse()))
+        self.assertEqual(diff.rescored, ["C1", "C2"])
+        self.assertIsNone(diff_rubrics({"Q1": 5}, self.rubric))
+
+
+@override_settings(MEDIA_ROOT=_UPLOAD_TMP + "/media")
+class FileServingTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        admin = User.objects.create_user(username="fsadmin", email="fsadmin@example.com", password="x", role="admin")
+        assignment = Assignment.objects.create(
+            name="Files",
+            creation_date=timezone.now(),
+            rubric=SimpleUploadedFile("r.txt", b"rubric"),
+            assignment_file=SimpleUploadedFile("a.pdf", b"pdfdata"),
+            mark_criteria={"criteria": []},
+            due_date=timezone.now() + timezone.timedelta(days=7),
+            administrator=admin,
+        )
+        self.data = bytes(range(256)) * 40
+        self.submission = Submission.objects.create(
+            name="S1", comment="", assignment=assignment,
+            submission_file=SimpleUploadedFile("s1.pdf", self.data),
+        )
+        self.url = reverse("submission_pdf", args=[self.submission.id])
+        self.etag = f'"{hashlib.sha256(self.data).hexdigest()}"'
+
+    def _body(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_full_response_has_validators(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["ETag"], self.etag)
+        self.assertEqual(resp["Accept-Ranges"], "bytes")
+        self.assertIn("Last-Modified", resp)
+        self.assertEqual(self._body(resp), self.data)
+
+    def test_conditional_get_returns_304(self):
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp["ETag"], self.etag)
+        last_modified = self.client.get(self.url)["Last-Modified"]
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_byte_ranges(self):
+        resp = self.client.get(self.url, HTTP_RANGE="bytes=100-199")
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(resp["Content-Range"], f"bytes 100-199/{len(self.data)}")
+        self.assertEqual(resp["Content-Length"], "100")
+        self.assertEqual(self._body(resp), self.data[100:200])
+
+        resp = self.client.get(self.url, HTTP_RANGE="bytes=-10")
+        self.assertEqual(self._body(resp), self.data[-10:])
+
+        resp = self.client.get(self.url, HTTP_RANGE=f"bytes={len(self.data)}-")
+        self.assertEqual(resp.status_code, 416)
+
+        # A stale If-Range falls back to the full file
+        resp = self.client.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self._body(resp), self.data)
+
+    def test_download_views_share_validators(self):
+        resp = self.client.get(reverse("download_submission", args=[self.submission.id]), HTTP_RANGE="bytes=0-3")
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(resp["ETag"], self.etag)
+        self.assertIn("attachment", resp["Content-Disposition"])
+
+    @override_settings(API_FILE_OFFLOAD="x-accel-redirect", API_FILE_OFFLOAD_PREFIX="/protected-media/")
+    def test_offload_to_front_proxy(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        sha256 = hashlib.sha256(self.data).hexdigest()
+        self.assertEqual(resp["X-Accel-Redirect"], f"/protected-media/blobs/{sha256[:2]}/{sha256}")
+        self.assertEqual(resp["ETag"], self.etag)
+        self.assertEqual(resp.content, b"")
+        # Conditional requests are still answered without involving the proxy
+        self.assertNotIn("X-Accel-Redirect", self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag))
+
+    def test_media_links_are_served(self):
+        resp = self.client.get(self.submission.submission_file.url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self._body(resp), self.data)
+        self.assertEqual(self.client.get("/media/../settings.py").status_code, 404)
+        self.assertEqual(self.client.get("/media/missing.pdf").status_code, 404)
+
+    @override_settings(API_FILE_OFFLOAD="x-accel-redirect", API_FILE_OFFLOAD_PREFIX="/protected-media/")
+    def test_media_links_offload_to_front_proxy(self):
+        # Payloads still link to MEDIA_URL; the proxy's offload location is internal
+        resp = self.client.get(self.submission.submission_file.url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp["X-Accel-Redirect"].startswith("/protected-media/"))
+
+    @override_settings(API_FILE_OFFLOAD="x-sendfile")
+    def test_sendfile_offload(self):
+        resp = self.client.get(reverse("download_submission", args=[self.submission.id]))
+        self.assertEqual(resp["X-Sendfile"], self.submission.submission_file.path)
+
+    @override_settings(API_FILE_STREAM_CHUNK_SIZE=1000)
+    async def test_async_streaming(self):
+        resp = await self.async_client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.is_async)
+        chunks = [chunk async for chunk in resp.streaming_content]
+        self.assertEqual(len(chunks), -(-len(self.data) // 1000))
+        self.assertEqual(b"".join(chunks), self.data)
+
+        resp = await self.async_client.get(self.url, headers={"Range": "bytes=100-2099"})
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(b"".join([chunk async for chunk in resp.streaming_content]), self.data[100:2100])
+
+    async def test_stream_reads_ahead_a_bounded_amount(self):
+        produced = []
+
+        def source():
+            for i in range(100):
+                produced.append(i)
+                yield bytes([i])
+
+        stream = iterate_in_pool(source(), read_ahead=2)
+        self.assertEqual(await stream.__anext__(), b"\x00")
+        await asyncio.sleep(0.05)  # let the reader run as far as it may
+        self.assertLessEqual(len(produced), 4)  # taken + queued + one waiting to be queued
+        await stream.aclose()
+
+
+@override_settings(MEDIA_ROOT=_UPLOAD_TMP + "/cas")
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username="casadmin", email="casadmin@example.com", password="x", role="admin")
+        self.assignment = Assignment.objects.create(
+            name="CAS",
+            creation_date=timezone.now(),
+            rubric=SimpleUploadedFile("Criteria.docx", b"same rubric"),
+            assignment_file=SimpleUploadedFile("a.pdf", b"same rubric"),
+            mark_criteria={"criteria": []},
+            due_date=timezone.now() + timezone.timedelta(days=7),
+            administrator=self.admin,
+        )
+        self.sha256 = hashlib.sha256(b"same rubric").hexdigest()
+
+    def _blob(self):
+        return Blob.objects.get(sha256=self.sha256)
+
+    def test_identical_content_is_stored_once(self):
+        self.assertEqual(self.assignment.rubric.name, f"sha256/{self.sha256}/Criteria.docx")
+        self.assertEqual(self.assignment.rubric.path, self.assignment.assignment_file.path)
+        self.assertEqual(self._blob().ref_count, 2)
+        with self.assignment.assignment_file.open("rb") as fh:
+            self.assertEqual(fh.read(), b"same rubric")
+        # Links keep the uploaded filename; the blob is resolved when the link is served
+        self.assertEqual(self.assignment.rubric.url, f"/media/sha256/{self.sha256}/Criteria.docx")
+        resp = self.client.get(self.assignment.rubric.url)
+        self.assertEqual(b"".join(resp.streaming_content), b"same rubric")
+        self.assertIn('filename="Criteria.docx"', resp["Content-Disposition"])
+
+    def test_blob_removed_with_last_reference(self):
+        path = self.assignment.rubric.path
+        submission = Submission.objects.create(
+            name="S1", comment="", assignment=self.assignment,
+            submission_file=SimpleUploadedFile("s.pdf", b"same rubric"),
+        )
+        self.assertEqual(self._blob().ref_count, 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            submission.delete()
+        self.assertEqual(self._blob().ref_count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assignment.rubric = SimpleUploadedFile("new.docx", b"new rubric")
+            self.assignment.save()
+        self.assertEqual(self._blob().ref_count, 1)
+        self.assertTrue(os.path.exists(path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assignment.delete()
+        self.assertFalse(Blob.objects.filter(sha256=self.sha256).exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_recount_matches_incremental_counts(self):
+        rebuild_references()
+        self.assertEqual(self._blob().ref_count, 2)
+        self.assertEqual(count_references()[self.sha256], 2)
+
+    def test_legacy_media_is_pruned_on_request(self):
+        root = _UPLOAD_TMP + "/cas"
+        for name, data in (("Criteria.docx", b"same rubric"), ("other.pdf", b"not stored")):
+            with open(os.path.join(root, name), "wb") as fh:
+                fh.write(data)
+
+        out = StringIO()
+        call_command("prune_legacy_media", stdout=out)
+        self.assertIn("Criteria.docx ->", out.getvalue())
+        self.assertNotIn("other.pdf", out.getvalue())
+        self.assertTrue(os.path.exists(os.path.join(root, "Criteria.docx")))
+
+        call_command("prune_legacy_media", "--delete", stdout=StringIO())
+        self.assertFalse(os.path.exists(os.path.join(root, "Criteria.docx")))
+        self.assertTrue(os.path.exists(os.path.join(root, "other.pdf")))  # its content exists nowhere else
+        with self.assignment.rubric.open("rb") as fh:
+            self.assertEqual(fh.read(), b"same rubric")
+
+
+@override_settings(MEDIA_ROOT=_UPLOAD_TMP + "/export")
+class ExportAssignmentTests(TestCase):
+    def setUp(self):
+        session_cache.clear()
+        self.client = Client()
+        self.admin = User.objects.create_user(username="exadmin", email="exadmin@example.com", password="x", role="admin")
+        self.client.force_login(self.admin)
+        self.headers = {"HTTP_X_SESSION_ID": self.client.session.session_key}
+        self.assignment = Assignment.objects.create(
+            name="Essay 1",
+            creation_date=timezone.now(),
+            rubric=SimpleUploadedFile("rubric.docx", b"rubric"),
+            assignment_file=SimpleUploadedFile("brief.pdf", b"brief"),
+            mark_criteria={"levels": [], "criteria": [{"id": "C1"}, {"id": "C2"}]},
+            due_date=timezone.now() + timezone.timedelta(days=7),
+            administrator=self.admin,
+        )
+        self.submissions = [
+            Submission.objects.create(
+                name=f"Student {i}", comment="", assignment=self.assignment,
+                submission_file=SimpleUploadedFile(f"s{i}.pdf", bytes([i]) * 200_000),
+            )
+            for i in range(3)
+        ]
+        marker = User.objects.create_user(username="exm", email="exm@example.com", password="x", role="marker")
+        Mark.objects.create(
+            marker=marker, submission=self.submissions[0], is_finalized=True,
+            marks={"C1": {"level_index": 0, "score": 4}, "C2": {"level_index": 1, "score": 2}},
+        )
+
+    def _archive(self, resp):
+        chunks = list(resp.streaming_content)
+        self.assertGreater(len(chunks), 1)  # streamed, not built up front
+        return zipfile.ZipFile(BytesIO(b"".join(chunks)))
+
+    def test_streams_all_files(self):
+        resp = self.client.get(reverse("export_assignment", args=[self.assignment.id]), **self.headers)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "application/zip")
+        self.assertIn('filename="Essay_1.zip"', resp["Content-Disposition"])
+        archive = self._archive(resp)
+        self.assertIsNone(archive.testzip())
+        names = archive.namelist()
+        self.assertIn("assignment/brief.pdf", names)
+        self.assertIn("rubric/rubric.docx", names)
+        s = self.submissions[2]
+        self.assertEqual(archive.read(f"submissions/{s.id}_Student_2.pdf"), bytes([2]) * 200_000)
+
+    def test_marks_sheet(self):
+        url = reverse("export_assignment", args=[self.assignment.id])
+        archive = self._archive(self.client.get(url, {"marks": "csv"}, **self.headers))
+        rows = archive.read("marks.csv").decode().splitlines()
+        self.assertEqual(rows[0], "submission_id,submission,marker,finalized,total_score,C1,C2")
+        self.assertEqual(rows[1], f"{self.submissions[0].id},Student 0,exm@example.com,True,6.0,4,2")
+
+        archive = self._archive(self.client.get(url, {"marks": "json"}, **self.headers))
+        self.assertEqual(json.loads(archive.read("marks.json"))[0]["totalScore"], 6.0)
+        self.assertEqual(self.client.get(url, {"marks": "xml"}, **self.headers).status_code, 400)
+
+
+
+@override_settings(MEDIA_ROOT=_UPLOAD_TMP + "/export")
+class AsyncExportAssignmentTests(TransactionTestCase):
+    # Committed rows, so a query from another thread would see them rather than fail
+    setUp = ExportAssignmentTests.setUp
+
+    async def test_streams_from_the_io_pool(self):
+        threads = set()
+        ensure_connection = BaseDatabaseWrapper.ensure_connection
+
+        def record_thread(wrapper):
+            threads.add(threading.current_thread().name)
+            return ensure_connection(wrapper)
+
+        url = reverse("export_assignment", args=[self.assignment.id])
+        with patch.object(BaseDatabaseWrapper, "ensure_connection", record_thread):
+            resp = await self.async_client.get(
+                url, {"marks": "csv"}, headers={"X-Session-ID": self.headers["HTTP_X_SESSION_ID"]}
+            )
+            self.assertEqual(resp.status_code, 200)
+            self.assertTrue(resp.is_async)  # not collected into a list by Django
+            chunks = [chunk async for chunk in resp.streaming_content]
+        # Pool threads never close database connections, so they must not open any
+        self.assertTrue(threads)
+        self.assertFalse([name for name in threads if name.startswith("media-io")])
+        self.assertGreater(len(chunks), 1)
+        archive = zipfile.ZipFile(BytesIO(b"".join(chunks)))
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(len(archive.read("marks.csv").decode().splitlines()), 2)
+
+
+class ObjectStorageTests(TestCase):
+    S3_STORAGES = {
+        "default": {"BACKEND": "api.object_storage.S3ContentAddressedStorage"},
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    }
+
+    def setUp(self):
+        session_cache.clear()
+        self.client = Client()
+        self.admin = User.objects.create_user(username="s3admin", email="s3admin@example.com", password="x", role="admin")
+        self.client.force_login(self.admin)
+        self.headers = {"HTTP_X_SESSION_ID": self.client.session.session_key}
+        self.data = b"%PDF-direct upload body"
+        self.sha256 = hashlib.sha256(self.data).hexdigest()
+
+    def _direct(self):
+        body = {"filename": "big.pdf", "size": len(self.data), "sha256": self.sha256}
+        return self.client.post(reverse("upload_direct"), json.dumps(body), content_type="application/json", **self.headers)
+
+    def test_direct_upload_needs_object_storage(self):
+        resp = self._direct()
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(Upload.objects.exists())
+
+    def _s3(self):
+        mock = moto.mock_aws()
+        mock.start()
+        self.addCleanup(mock.stop)
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="media")
+        overrides = override_settings(STORAGES=self.S3_STORAGES, API_S3_BUCKET="media", API_S3_REGION="us-east-1")
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        return Upload._meta.get_field("file").storage
+
+    def test_direct_upload_and_presigned_download(self):
+        storage = self._s3()
+        resp = self._direct()
+        self.assertEqual(resp.status_code, 201)
+        upload_id, target = resp.json()["uploadId"], resp.json()["target"]
+        self.assertEqual(target["method"], "PUT")
+
+        # Confirming before the object exists is a conflict
+        self.assertEqual(self.client.post(reverse("upload_confirm", args=[upload_id]), **self.headers).status_code, 409)
+
+        storage.client.put_object(
+            Bucket="media", Key=f"incoming/{upload_id}", Body=self.data,
+            ChecksumSHA256=target["headers"]["x-amz-checksum-sha256"],
+        )
+        resp = self.client.post(reverse("upload_confirm", args=[upload_id]), **self.headers)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.json()["complete"])
+
+        upload = Upload.objects.get(id=upload_id)
+        self.assertEqual(upload.file.name, f"sha256/{self.sha256}/big.pdf")
+        self.assertEqual(Blob.objects.get(sha256=self.sha256).ref_count, 1)
+        with upload.file.open("rb") as f:
+            f.seek(5)
+            self.assertEqual(f.read(6), self.data[5:11])
+
+        request = RequestFactory().get("/")
+        resp = serve_file(request, upload.file, sha256=upload.sha256)
+        self.assertEqual(resp.status_code, 302)
+        self.assertIn("X-Amz-Signature", resp["Location"])
+        self.assertEqual(resp["Cache-Control"], "private, no-store")
+        self.assertEqual(serve_file(RequestFactory().get("/", HTTP_IF_NONE_MATCH=f'"{self.sha256}"'),
+                                    upload.file, sha256=upload.sha256).status_code, 304)
+
+    def test_saves_are_deduplicated(self):
+        self._s3()
+        assignment = Assignment.objects.create(
+            name="S3", creation_date=timezone.now(), mark_criteria={}, due_date=timezone.now(), administrator=self.admin
+        )
+        first = Submission.objects.create(
+            name="A", comment="", assignment=assignment, submission_file=SimpleUploadedFile("a.pdf", self.data)
+        )
+        second = Submission.objects.create(
+            name="B", comment="", assignment=assignment, submission_file=SimpleUploadedFile("b.pdf", self.data)
+        )
+        self.assertEqual(first.submission_file.size, len(self.data))
+        self.assertEqual(Blob.objects.get(sha256=self.sha256).ref_count, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+            second.delete()
+        self.assertFalse(Blob.objects.exists())
+
+
+class MarkAutosaveTests(TestCase):
+    def setUp(self):
+        session_cache.clear()
+        stats_cache.clear()
+        self.client = Client()
+        admin = User.objects.create_user(username="asadmin", email="asadmin@example.com", password="x", role="admin")
+        self.marker = User.objects.create_user(username="asm", email="asm@example.com", password="x", role="marker")
+        self.assignment = Assignment.objects.create(
+            name="Autosave", creation_date=timezone.now(), mark_criteria={"criteria": []},
+            due_date=timezone.now() + timezone.timedelta(days=7), administrator=admin,
+        )
+        self.submission = Submission.objects.create(name="S1", comment="", assignment=self.assignment)
+        self.client.force_login(self.marker)
+        self.headers = {"HTTP_X_SESSION_ID": self.client.session.session_key}
+        self.url = reverse("submission_mark_view", kwargs={
+            "user_id": self.marker.id, "assignment_id": self.assignment.id, "submission_id": self.submission.id,
+        })
+
+    def _patch(self, version, marks, **extra):
+        body = json.dumps({"version": version, "marks": marks, **extra})
+        return self.client.patch(self.url, body, content_type="application/json", **self.headers)
+
+    def test_delta_is_merged(self):
+        version = self.client.get(self.url, **self.headers).json()["mark"]["version"]
+        resp = self._patch(version, {"c1": {"score": 3}, "c2": {"score": 2}})
+        self.assertEqual(resp.status_code, 200)
+        version = resp.json()["mark"]["version"]
+        resp = self._patch(version, {"c2": None, "c3": {"score": 1}}, is_finalized=True)
+        self.assertEqual(resp.json()["mark"]["version"], version + 1)
+
+        mark = Mark.objects.get(marker=self.marker, submission=self.submission)
+        self.assertEqual(mark.marks, {"c1": {"score": 3}, "c3": {"score": 1}})
+        self.assertTrue(mark.is_finalized)
+        self.assertEqual(mark.total_score, 4)
+        self.assertEqual(
+            sorted(CriterionScore.objects.filter(mark=mark).values_list("criterion_key", "value")),
+            [("c1", 3), ("c3", 1)],
+        )
+        self.assertEqual(verify_progress(), [])
+
+    def test_stale_version_conflicts(self):
+        version = self.client.get(self.url, **self.headers).json()["mark"]["version"]
+        self.assertEqual(self._patch(version, {"c1": {"score": 1}}).status_code, 200)
+
+        # A second tab still holding the old version
+        resp = self._patch(version, {"c1": {"score": 5}})
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(resp.json()["mark"]["marks"], {"c1": {"score": 1}})
+        self.assertEqual(resp.json()["mark"]["version"], version + 1)
+
+        # Full saves and resets also move the version on
+        self.client.post(self.url, json.dumps({"marks": {}}), content_type="application/json", **self.headers)
+        self.assertEqual(self._patch(version + 1, {}).status_code, 409)
+        reset_marks(self.assignment.id)
+        self.assertEqual(Mark.objects.get().version, version + 3)
+
+    def test_version_required(self):
+        self.assertEqual(self._patch("1", {}).status_code, 400)
+        resp = self.client.patch(self.url, json.dumps({"marks": {}}), content_type="application/json", **self.headers)
+        self.assertEqual(resp.status_code, 400)
+
+    def test_overlong_criterion_ids_rejected(self):
+        # Two ids sharing their first 64 characters used to collide once truncated
+        marks = {"c" * 64 + "1": {"score": 1}, "c" * 64 + "2": {"score": 2}}
+        version = self.client.get(self.url, **self.headers).json()["mark"]["version"]
+        resp = self._patch(version, marks)
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("64 characters", resp.json()["message"])
+        resp = self.client.post(self.url, json.dumps({"marks": marks}), content_type="application/json", **self.headers)
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(Mark.objects.get().version, version)
+        self.assertFalse(CriterionScore.objects.exists())
+
+
+class BatchMarksTests(TestCase):
+    def setUp(self):
+        session_cache.clear()
+        stats_cache.clear()
+        self.client = Client()
+        admin = User.objects.create_user(username="bmadmin", email="bmadmin@example.com", password="x", role="admin")
+        self.marker = User.objects.create_user(username="bmm", email="bmm@example.com", password="x", role="marker")
+        self.assignment = Assignment.objects.create(
+            name="Batch", creation_date=timezone.now(), mark_criteria={"criteria": []},
+            due_date=timezone.now() + timezone.timedelta(days=7), administrator=admin,
+        )
+        self.submissions = [
+            Submission.objects.create(name=f"S{i}", comment="", assignment=self.assignment) for i in range(12)
+        ]
+        self.client.force_login(self.marker)
+        self.headers = {"HTTP_X_SESSION_ID": self.client.session.session_key}
+        self.url = reverse("batch_marks_view", kwargs={"user_id": self.marker.id, "assignment_id": self.assignment.id})
+
+    def _post(self, items):
+        return self.client.post(self.url, json.dumps({"marks": items}), content_type="application/json", **self.headers)
+
+    def _items(self, submissions, finalized=True):
+        return [{"submission_id": s.id, "marks": {"c1": {"score": 2}}, "is_finalized": finalized} for s in submissions]
+
+    def test_saves_and_reports_per_item(self):
+        existing = Mark.objects.create(marks={}, marker=self.marker, submission=self.submissions[0])
+        other = Assignment.objects.create(
+            name="Other", creation_date=timezone.now(), mark_criteria={}, due_date=timezone.now(),
+        )
+        foreign = Submission.objects.create(name="X", comment="", assignment=other)
+        items = self._items(self.submissions[:3]) + [
+            {"submission_id": foreign.id, "marks": {}},
+            {"submission_id": self.submissions[3].id, "marks": [], "is_finalized": True},
+            {"submission_id": self.submissions[4].id, "marks": {}, "version": 7},
+        ]
+        items[0]["version"] = existing.version
+
+        resp = self._post(items)
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        self.assertEqual((body["saved"], body["failed"]), (3, 3))
+        self.assertEqual([r["status"] for r in body["results"]], ["saved"] * 3 + ["error", "error", "conflict"])
+        self.assertEqual(body["results"][0]["mark"]["version"], existing.version + 1)
+
+        self.assertEqual(Mark.objects.filter(marker=self.marker).count(), 3)
+        self.assertEqual(CriterionScore.objects.filter(submission__assignment=self.assignment).count(), 3)
+        self.assertEqual(Mark.objects.get(id=existing.id).total_score, 2)
+        self.assertEqual(verify_progress(), [])
+        self.assertEqual(Assignment.objects.get(id=self.assignment.id).marks_finalized, 3)
+
+    def test_query_count_does_not_grow_with_batch(self):
+        self._post(self._items(self.submissions[:1]))
+        with CaptureQueriesContext(connection) as small:
+            self._post(self._items(self.submissions[:2]))  # 1 update, 1 insert
+        with CaptureQueriesContext(connection) as large:
+            self._post(self._items(self.submissions))  # 2 updates, 10 inserts
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(Mark.objects.filter(is_finalized=True).count(), 12)
+
+    def test_overlong_criterion_ids_are_item_errors(self):
+        items = self._items(self.submissions[:2])
+        items[1]["marks"] = {"c" * 65: {"score": 1}}
+        body = self._post(items).json()
+        self.assertEqual([r["status"] for r in body["results"]], ["saved", "error"])
+        self.assertIn("64 characters", body["results"][1]["message"])
+
+    def test_rejects_bad_batches(self):
+        self.assertEqual(self._post([]).status_code, 400)
+        with override_settings(API_MARK_BATCH_MAX_ITEMS=2):
+            self.assertEqual(self._post(self._items(self.submissions[:3])).status_code, 400)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        session_cache.clear()
+        stats_cache.clear()
+        admin = User.objects.create_user(username="avadmin", email="avadmin@example.com", password="x", role="admin")
+        self.marker = User.objects.create_user(username="avm", email="avm@example.com", password="x", role="marker")
+        self.assignment = Assignment.objects.create(
+            name="Async", creation_date=timezone.now(), mark_criteria={"criteria": []},
+            due_date=timezone.now() + timezone.timedelta(days=7), administrator=admin,
+        )
+        self.submissions = [
+            Submission.objects.create(name=f"S{i}", comment="", admin_marks={}, assignment=self.assignment)
+            for i in range(3)
+        ]
+        for submission in self.submissions[:2]:
+            Mark.objects.create(marks={"c1": 1}, marker=self.marker, submission=submission)
+        client = Client()
+        client.force_login(self.marker)
+        self.session_key = client.session.session_key
+
+    async def test_middleware_resolves_user_without_blocking(self):
+        url = reverse("login_status")
+        resp = await self.async_client.get(url, headers={"X-Session-ID": self.session_key})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["email"], "avm@example.com")
+        # The cached user is now served without a query
+        resp = await self.async_client.get(url, headers={"X-Session-ID": self.session_key})
+        self.assertEqual(resp.status_code, 200)
+        resp = await self.async_client.get(url, headers={"X-Session-ID": "nope"})
+        self.assertEqual(resp.status_code, 401)
+
+    def test_async_views_match_sync_views(self):
+        factory = RequestFactory()
+        calls = [
+            ("assignment_detail_view", {"assignment_id": self.assignment.id}),
+            ("marker_assignment_detail_view", {"assignment_id": self.assignment.id, "user_id": self.marker.id}),
+            ("marks_by_submission_view", {"submission_id": self.submissions[0].id}),
+            ("mark_comparison_view", {"assignment_id": self.assignment.id, "submission_id": self.submissions[0].id}),
+        ]
+        for name, kwargs in calls:
+            request = factory.get("/")
+            request.api_user = self.marker
+            expected = getattr(views, name)(request, **kwargs)
+            actual = async_to_sync(getattr(views, "a" + name))(request, **kwargs)
+            self.assertEqual(actual.status_code, expected.status_code, name)
+            self.assertEqual(json.loads(actual.content), json.loads(expected.content), name)
+
+    def test_marker_workspace_query_count_is_constant(self):
+        request = RequestFactory().get("/")
+        request.api_user = self.marker
+        kwargs = {"assignment_id": self.assignment.id, "user_id": self.marker.id}
+        with CaptureQueriesContext(connection) as ctx:
+            views.marker_assignment_detail_view(request, **kwargs)
+        queries = len(ctx.captured_queries)
+
+        # More submissions, and other markers' marks, which are left out of the response
+        other = User.objects.create_user(username="avm2", email="avm2@example.com", password="x", role="marker")
+        for i in range(5):
+            submission = Submission.objects.create(name=f"T{i}", comment="", admin_marks={}, assignment=self.assignment)
+            Mark.objects.create(marks={"c1": 2}, marker=other, submission=submission)
+        Mark.objects.create(marks={"c1": 3}, marker=other, submission=self.submissions[0])
+        with CaptureQueriesContext(connection) as ctx:
+            resp = views.marker_assignment_detail_view(request, **kwargs)
+        self.assertEqual(len(ctx.captured_queries), queries)
+
+        submissions = json.loads(resp.content)["submissions"]
+        self.assertEqual(len(submissions), 8)
+        self.assertEqual([len(s["marks"]) for s in submissions], [1, 1] + [0] * 6)
+        self.assertEqual({m["marker"] for s in submissions for m in s["marks"]}, {"avm@example.com"})
+
+
+class ModerationEventTests(TestCase):
+    def setUp(self):
+        session_cache.clear()
+        stats_cache.clear()
+        admin = User.objects.create_user(username="evadmin", email="evadmin@example.com", password="x", role="admin")
+        self.marker = User.objects.create_user(username="evm", email="evm@example.com", password="x", role="marker")
+        self.assignment = Assignment.objects.create(
+            name="Events", creation_date=timezone.now(), mark_criteria={"criteria": []},
+            due_date=timezone.now() + timezone.timedelta(days=7), administrator=admin,
+        )
+        self.submissions = [
+            Submission.objects.create(name=f"S{i}", comment="", assignment=self.assignment) for i in range(2)
+        ]
+        client = Client()
+        client.force_login(self.marker)
+        self.session_key = client.session.session_key
+        self.url = reverse("assignment_events_view", kwargs={"assignment_id": self.assignment.id})
+        token_url = reverse("assignment_events_token_view", kwargs={"assignment_id": self.assignment.id})
+        self.token = client.post(token_url, HTTP_X_SESSION_ID=self.session_key).json()["token"]
+
+    def _kinds(self):
+        return list(ModerationEvent.objects.order_by("id").values_list("kind", flat=True))
+
+    def test_mark_writes_emit_events(self):
+        headers = {"HTTP_X_SESSION_ID": self.session_key}
+        url = reverse("submission_mark_view", kwargs={
+            "user_id": self.marker.id, "assignment_id": self.assignment.id, "submission_id": self.submissions[0].id,
+        })
+        version = self.client.get(url, **headers).json()["mark"]["version"]
+        self.client.patch(url, json.dumps({"version": version, "marks": {"c1": {"score": 2}}}),
+                          content_type="application/json", **headers)
+        self.client.patch(url, json.dumps({"version": version + 1, "marks": {}, "is_finalized": True}),
+                          content_type="application/json", **headers)
+        self.assertEqual(self._kinds(), [events.MARK_SAVED, events.MARK_FINALIZED])
+
+        # A batch inserts its events together, and a mark that stays finalized is just saved
+        batch_url = reverse("batch_marks_view", kwargs={"user_id": self.marker.id, "assignment_id": self.assignment.id})
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(batch_url, json.dumps({"marks": [
+                {"submission_id": s.id, "marks": {}, "is_finalized": True} for s in self.submissions
+            ]}), content_type="application/json", **headers)
+        self.assertEqual(sum('INSERT INTO "api_moderationevent"' in q["sql"] for q in ctx.captured_queries), 1)
+        self.assertEqual(self._kinds()[2:], [events.MARK_SAVED, events.MARK_FINALIZED])
+        data = ModerationEvent.objects.order_by("id").last().data
+        self.assertEqual(data["submissionId"], self.submissions[1].id)
+        self.assertTrue(data["isFinalized"])
+
+    @override_settings(API_EVENTS_PRUNE_EVERY=2, API_EVENTS_RETENTION=60)
+    def test_writes_prune_old_events_without_subscribers(self):
+        stale = events.emit(self.assignment.id, events.ASSIGNMENT_EDITED)
+        ModerationEvent.objects.filter(id=stale.id).update(created_at=timezone.now() - timezone.timedelta(hours=1))
+        events.emit(self.assignment.id, events.ASSIGNMENT_EDITED)
+        events.emit(self.assignment.id, events.ASSIGNMENT_EDITED)
+        self.assertFalse(ModerationEvent.objects.filter(id=stale.id).exists())
+        self.assertEqual(ModerationEvent.objects.count(), 2)
+
+        ModerationEvent.objects.update(created_at=timezone.now() - timezone.timedelta(hours=1))
+        out = StringIO()
+        call_command("prune_events", stdout=out)
+        self.assertIn("Deleted 2", out.getvalue())
+
+    def test_stream_token_is_scoped(self):
+        # Authenticated requests get past the login check; WSGI then refuses to stream
+        self.assertEqual(self.client.get(self.url, {"token": self.token}).status_code, 501)
+        self.assertEqual(self.client.post(
+            reverse("assignment_events_token_view", kwargs={"assignment_id": self.assignment.id})
+        ).status_code, 401)
+
+        other = Assignment.objects.create(
+            name="Other", creation_date=timezone.now(), mark_criteria={"criteria": []},
+            due_date=timezone.now(), administrator=self.assignment.administrator,
+        )
+        other_url = reverse("assignment_events_view", kwargs={"assignment_id": other.id})
+        rejected = [
+            (self.url, {"session": self.session_key}),  # no long-lived credentials in URLs
+            (self.url, {"token": issue_token(self.marker)}),  # a session token is not a stream token
+            (self.url, {"token": issue_stream_token(self.marker, self.assignment.id, max_age=-1)}),
+            (other_url, {"token": self.token}),
+        ]
+        for url, params in rejected:
+            self.assertEqual(self.client.get(url, params).status_code, 401, params)
+
+        # A stream token cannot be used as a session either
+        resp = self.client.get(reverse("login_status"), HTTP_X_SESSION_ID=self.token)
+        self.assertEqual(resp.status_code, 401)
+
+        revoke_tokens(self.marker)
+        self.assertEqual(self.client.get(self.url, {"token": self.token}).status_code, 401)
+
+    async def _read(self, stream):
+        return await asyncio.wait_for(anext(stream), timeout=5)
+
+    @override_settings(API_EVENTS_POLL_INTERVAL=0.01)
+    async def test_stream_delivers_and_replays(self):
+        resp = await self.async_client.get(self.url)
+        self.assertEqual(resp.status_code, 401)
+
+        resp = await self.async_client.get(self.url, {"token": self.token})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "text/event-stream")
+        stream = aiter(resp.streaming_content)
+        try:
+            self.assertTrue((await self._read(stream)).startswith(b"retry:"))
+            event = await sync_to_async(events.emit)(self.assignment.id, events.ASSIGNMENT_EDITED, rubricChanged=True)
+            frame = (await self._read(stream)).decode()
+            self.assertIn(f"id: {event.id}\nevent: assignment.edited\n", frame)
+            payload = json.loads(frame.split("data: ", 1)[1])
+            self.assertEqual(payload, {"assignmentId": self.assignment.id, "rubricChanged": True})
+        finally:
+            await stream.aclose()
+
+        # Reconnecting with Last-Event-ID replays what was missed
+        later = await sync_to_async(events.emit)(self.assignment.id, events.MARKS_RESET, marksReset=2)
+        resp = await self.async_client.get(
+            self.url, {"token": self.token}, headers={"Last-Event-ID": str(event.id)}
+        )
+        stream = aiter(resp.streaming_content)
+        try:
+            await self._read(stream)
+            self.assertIn(f"id: {later.id}\nevent: marks.reset\n", (await self._read(stream)).decode())
+        finally:
+            await stream.aclose()
+
+        # Closing a stream unsubscribes it
+        stream = events.event_stream(self.assignment.id)
+        await self._read(stream)
+        count = events.hub.subscriber_count
+        await stream.aclose()
+        self.assertEqual(events.hub.subscriber_count, count - 1)
@@ -0,0 +1,157 @@
+import base64
+import json
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import F
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from .models import User
+
+
+# ------------------------------
+# Signed stateless session tokens
+# ------------------------------
+# Format: "<version>.<payload>.<signature>", where payload is base64url encoded
+# compact JSON and signature is a base64url HMAC-SHA256 of "<version>.<payload>"
+# keyed from SECRET_KEY. Bump TOKEN_VERSION whenever the payload changes shape.
+TOKEN_VERSION = "v1"
+SUPPORTED_VERSIONS = {TOKEN_VERSION}
+KEY_SALT = "api.tokens"
+
+TokenClaims = namedtuple("TokenClaims", ["user_id", "role", "expires", "generation"])
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(signing_input, salt=KEY_SALT):
+    return _b64encode(salted_hmac(salt, signing_input, algorithm="sha256").digest())
+
+
+def _encode(version, payload, salt=KEY_SALT):
+    body = _b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+    signing_input = f"{version}.{body}"
+    return f"{signing_input}.{_sign(signing_input, salt)}"
+
+
+def _decode(token, versions, salt=KEY_SALT):
+    """The payload of a well-formed token signed with `salt`, or None."""
+    try:
+        version, body, signature = token.split(".")
+    except (AttributeError, ValueError):
+        return None
+    if version not in versions:
+        return None
+    if not constant_time_compare(signature, _sign(f"{version}.{body}", salt)):
+        return None
+    try:
+        return json.loads(_b64decode(body))
+    except ValueError:
+        return None
+
+
+def looks_like_token(value):
+    """Session keys are plain alphanumerics, tokens always carry a version prefix."""
+    return bool(value) and value.split(".", 1)[0] in SUPPORTED_VERSIONS
+
+
+def issue_token(user, max_age=None):
+    """Return a signed token carrying the user's id, role, expiry and token generation."""
+    if max_age is None:
+        max_age = getattr(settings, "API_TOKEN_MAX_AGE", settings.SESSION_COOKIE_AGE)
+    payload = {
+        "u": user.pk,
+        "r": user.role,
+        "e": int(time.time()) + int(max_age),
+        "g": user.token_generation,
+    }
+    return _encode(TOKEN_VERSION, payload)
+
+
+def verify_token(token):
+    """
+    Check the signature and expiry of `token` without touching the database.
+
+    Returns TokenClaims, or None when the token is malformed, forged or expired.
+    Revocation (token generation) is checked by the caller against the user.
+    """
+    payload = _decode(token, SUPPORTED_VERSIONS)
+    if payload is None:
+        return None
+    try:
+        claims = TokenClaims(
+            user_id=int(payload["u"]),
+            role=payload["r"],
+            expires=int(payload["e"]),
+            generation=int(payload["g"]),
+        )
+    except (ValueError, KeyError, TypeError):
+        return None
+
+    if claims.expires <= time.time():
+        return None
+    return claims
+
+
+# ------------------------------
+# Event stream tokens
+# ------------------------------
+# EventSource cannot send the X-Session-ID header, so an event stream URL
+# carries one of these instead: it only opens the stream of one assignment and
+# expires within a minute, so it is harmless once it ends up in access logs.
+# A separate version prefix and key salt keep it from working as a session.
+STREAM_TOKEN_VERSION = "s1"
+STREAM_KEY_SALT = "api.tokens.events"
+
+StreamClaims = namedtuple("StreamClaims", ["user_id", "assignment_id", "expires", "generation"])
+
+
+def issue_stream_token(user, assignment_id, max_age=None):
+    """Return a short-lived token that opens `assignment_id`'s event stream as `user`."""
+    if max_age is None:
+        max_age = getattr(settings, "API_EVENTS_TOKEN_MAX_AGE", 60)
+    payload = {
+        "u": user.pk,
+        "a": int(assignment_id),
+        "e": int(time.time()) + int(max_age),
+        "g": user.token_generation,
+    }
+    return _encode(STREAM_TOKEN_VERSION, payload, STREAM_KEY_SALT)
+
+
+def verify_stream_token(token, assignment_id):
+    """
+    StreamClaims of a valid, unexpired stream token for `assignment_id`, or None.
+    Like verify_token, the token generation is checked by the caller.
+    """
+    payload = _decode(token, {STREAM_TOKEN_VERSION}, STREAM_KEY_SALT)
+    if payload is None:
+        return None
+    try:
+        claims = StreamClaims(
+            user_id=int(payload["u"]),
+            assignment_id=int(payload["a"]),
+            expires=int(payload["e"]),
+            generation=int(payload["g"]),
+        )
+    except (ValueError, KeyError, TypeError):
+        return None
+
+    if claims.assignment_id != int(assignment_id) or claims.expires <= time.time():
+        return None
+    return claims
+
+
+def revoke_tokens(user):
+    """Invalidate every token issued to `user` so far by bumping their generation."""
+    from .middleware import session_cache  # avoid a circular import
+
+    User.objects.filter(pk=user.pk).update(token_generation=F("token_generation") + 1)
+    session_cache.invalidate_user(user.pk)
@@ -0,0 +1,256 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.utils import timezone
+
+from .models import Upload
+from .object_storage import DirectUploadError
+
+
+COPY_BUFFER_SIZE = 64 * 1024
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class UploadError(Exception):
+    """Raised for invalid chunked upload operations; `status` is the HTTP status to return."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class AssembledFile(File):
+    """
+    A fully written local temp file. Exposing temporary_file_path() lets
+    FileSystemStorage move it into place instead of copying it.
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+# ------------------------------
+# Chunk staging
+# ------------------------------
+def _chunk_root():
+    return getattr(settings, "API_UPLOAD_CHUNK_ROOT", os.path.join(settings.BASE_DIR, "upload_chunks"))
+
+
+def _chunk_dir(upload):
+    return os.path.join(_chunk_root(), str(upload.id))
+
+
+def _chunk_path(upload, index):
+    return os.path.join(_chunk_dir(upload), f"{index:06d}.part")
+
+
+def expected_chunk_length(upload, index):
+    if index == upload.total_chunks - 1:
+        return upload.size - index * upload.chunk_size
+    return upload.chunk_size
+
+
+def received_chunks(upload):
+    """Indexes of chunks already stored; derived from disk so chunk PUTs never write to the DB."""
+    received = []
+    for index in range(upload.total_chunks):
+        path = _chunk_path(upload, index)
+        if os.path.exists(path) and os.path.getsize(path) == expected_chunk_length(upload, index):
+            received.append(index)
+    return received
+
+
+def missing_chunks(upload):
+    received = set(received_chunks(upload))
+    return [i for i in range(upload.total_chunks) if i not in received]
+
+
+# ------------------------------
+# Upload lifecycle
+# ------------------------------
+def init_upload(owner, filename, size, sha256="", chunk_size=None):
+    max_size = getattr(settings, "API_UPLOAD_MAX_SIZE", 1024 * 1024 * 1024)
+    default_chunk = getattr(settings, "API_UPLOAD_CHUNK_SIZE", 5 * 1024 * 1024)
+    chunk_size = min(int(chunk_size or default_chunk), default_chunk)
+    # Tiny chunks would make every status request walk millions of chunk files
+    min_chunk = min(getattr(settings, "API_UPLOAD_MIN_CHUNK_SIZE", 64 * 1024), default_chunk)
+    max_chunks = getattr(settings, "API_UPLOAD_MAX_CHUNKS", 10000)
+
+    if not filename:
+        raise UploadError("filename is required")
+    if size is None or int(size) < 0:
+        raise UploadError("size must be a non-negative integer")
+    if int(size) > max_size:
+        raise UploadError("File is too large", status=413)
+    if chunk_size < min_chunk and chunk_size < int(size):
+        raise UploadError(f"chunk_size must be at least {min_chunk} bytes")
+    if chunk_size <= 0:
+        raise UploadError("chunk_size must be positive")
+    if -(-int(size) // chunk_size) > max_chunks:
+        raise UploadError(f"At most {max_chunks} chunks per upload, use a larger chunk_size")
+
+    upload = Upload.objects.create(
+        owner=owner,
+        filename=os.path.basename(filename)[:255],
+        size=int(size),
+        chunk_size=chunk_size,
+        expected_sha256=(sha256 or "").lower(),
+    )
+    os.makedirs(_chunk_dir(upload), exist_ok=True)
+    return upload
+
+
+def write_chunk(upload, index, stream):
+    """
+    Stream one chunk from `stream` (the request) to disk.
+
+    The chunk is written to a temp file and renamed into place, so retrying a
+    chunk is idempotent and a dropped connection never leaves a partial chunk.
+    """
+    if upload.is_complete:
+        raise UploadError("Upload is already complete", status=409)
+    if not 0 <= index < upload.total_chunks:
+        raise UploadError("Chunk index out of range")
+
+    expected = expected_chunk_length(upload, index)
+    directory = _chunk_dir(upload)
+    os.makedirs(directory, exist_ok=True)
+
+    written = 0
+    with tempfile.NamedTemporaryFile(dir=directory, suffix=".tmp", delete=False) as tmp:
+        try:
+            while written <= expected:
+                data = stream.read(min(COPY_BUFFER_SIZE, expected + 1 - written))
+                if not data:
+                    break
+                tmp.write(data)
+                written += len(data)
+        except Exception:
+            os.unlink(tmp.name)
+            raise
+
+    if written != expected:
+        os.unlink(tmp.name)
+        raise UploadError(f"Chunk {index} must be {expected} bytes, got {written}")
+    os.replace(tmp.name, _chunk_path(upload, index))
+
+
+def finalize_upload(upload):
+    """
+    Assemble the chunks into the upload's file, verifying the SHA-256 digest.
+
+    Chunks are concatenated in a single streaming pass that also computes
+    the digest, so memory use does not depend on the file size.
+    """
+    if upload.is_complete:
+        return upload
+
+    missing = missing_chunks(upload)
+    if missing:
+        raise UploadError(f"Missing chunks: {missing}", status=409)
+
+    digest = hashlib.sha256()
+    directory = _chunk_dir(upload)
+    with tempfile.NamedTemporaryFile(dir=directory, suffix=".assembled", delete=False) as assembled:
+        for index in range(upload.total_chunks):
+            with open(_chunk_path(upload, index), "rb") as part:
+                while True:
+                    data = part.read(COPY_BUFFER_SIZE)
+                    if not data:
+                        break
+                    digest.update(data)
+                    assembled.write(data)
+
+    sha256 = digest.hexdigest()
+    if upload.expected_sha256 and upload.expected_sha256 != sha256:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+        raise UploadError("Checksum mismatch, upload the chunks again", status=422)
+
+    with open(assembled.name, "rb") as fh:
+        upload.file.save(upload.filename, AssembledFile(fh, name=upload.filename), save=False)
+    if os.path.exists(assembled.name):
+        os.unlink(assembled.name)  # storage copied instead of moving
+
+    upload.sha256 = sha256
+    upload.completed_at = timezone.now()
+    upload.save(update_fields=["file", "sha256", "completed_at"])
+    shutil.rmtree(directory, ignore_errors=True)
+    return upload
+
+
+# ------------------------------
+# Direct uploads (object storage)
+# ------------------------------
+def _upload_storage():
+    return Upload._meta.get_field("file").storage
+
+
+def supports_direct_upload():
+    return hasattr(_upload_storage(), "direct_upload_target")
+
+
+def init_direct_upload(owner, filename, size, sha256):
+    """
+    Start an upload the client sends straight to object storage.
+
+    Returns (upload, target), where target is the presigned request to make.
+    The SHA-256 is required: the storage checks it and the confirm step
+    trusts it.
+    """
+    if not supports_direct_upload():
+        raise UploadError("Direct uploads are not available with this storage backend, use chunked uploads")
+    sha256 = (sha256 or "").lower()
+    if not SHA256_RE.match(sha256):
+        raise UploadError("sha256 must be a hex SHA-256 digest")
+
+    upload = init_upload(owner, filename, size, sha256=sha256, chunk_size=max(int(size or 0), 1))
+    try:
+        target = _upload_storage().direct_upload_target(upload.id, sha256)
+    except Exception:
+        upload.delete()
+        raise
+    return upload, target
+
+
+def confirm_direct_upload(upload):
+    """Verify the object a client uploaded directly and attach it to `upload`."""
+    if upload.is_complete:
+        return upload
+    storage = _upload_storage()
+    if not hasattr(storage, "confirm_direct_upload"):
+        raise UploadError("Direct uploads are not available with this storage backend")
+    try:
+        name = storage.confirm_direct_upload(upload.id, upload.filename, upload.size, upload.expected_sha256)
+    except DirectUploadError as e:
+        raise UploadError(str(e), status=409)
+
+    upload.file.name = name
+    upload.sha256 = upload.expected_sha256
+    upload.completed_at = timezone.now()
+    upload.save(update_fields=["file", "sha256", "completed_at"])
+    shutil.rmtree(_chunk_dir(upload), ignore_errors=True)
+    return upload
+
+
+def resolve_upload(upload_id, owner):
+    """
+    Return the stored file of a completed upload owned by `owner`, or None.
+
+    The returned FieldFile can be assigned to any FileField without copying the data.
+    """
+    if not upload_id:
+        return None
+    try:
+        upload = Upload.objects.get(id=upload_id, owner=owner, completed_at__isnull=False)
+    except (Upload.DoesNotExist, ValidationError, ValueError):
+        return None
+    upload.file.sha256 = upload.sha256  # already computed while assembling
+    return upload.file
@@ -1,12 +1,22 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 
+# Only login_status is routed to its async version: a cached session resolves
+# without leaving the event loop (about 2.4-3.2x the sync throughput with 50
+# clients). The query-bound views measured 0.64-1.09x, because the async ORM
+# still runs every query on the thread-sensitive executor, so they stay sync;
+# their async twins remain for bench_async_views.
+# API_ASYNC_VIEWS=false routes the sync version instead (e.g. under WSGI).
+ASYNC_VIEWS = getattr(settings, "API_ASYNC_VIEWS", True)
+
+
 urlpatterns = [
     path("login", views.login_view, name="login"),
     path("signup", views.signup_view, name="signup"),
     path("logout", views.logout_view, name="logout"),
-    path("login_status", views.login_status_view, name="login_status"),
+    path("login_status", views.alogin_status_view if ASYNC_VIEWS else views.login_status_view, name="login_status"),
     path("<int:id>/account", views.account_view, name="account_view"),
     path("<int:id>/account/edit", views.edit_account_view, name="edit_account_view"),
     path("<int:id>/assignments", views.show_assignments_view, name="assignments"),
@@ -14,12 +24,24 @@ urlpatterns = [
     path("assignment/<int:id>/delete", views.delete_assignment_view, name="delete_assignment"),
     path("assignment/<int:id>/edit", views.edit_assignment_view, name="edit_assignment_view"),
     path("assignment/<int:assignment_id>", views.assignment_detail_view, name="assignment_detail_view"),
+    path("assignment/<int:assignment_id>/submissions/import", views.import_submissions_view, name="import_submissions"),
     path("<int:user_id>/assignment/<assignment_id>/submission/<int:submission_id>/mark", views.submission_mark_view, name="submission_mark_view"),
     path("<int:user_id>/marker/assignment/<int:assignment_id>/", views.marker_assignment_detail_view, name="marker_assignment_detail_view"),
+    path("<int:user_id>/marker/assignment/<int:assignment_id>/marks", views.batch_marks_view, name="batch_marks_view"),
     path("submission/<int:submission_id>/marks", views.marks_by_submission_view, name="marks_by_submission_view"),
     path("assignment/<int:assignment_id>/submission/<int:submission_id>/marks", views.mark_comparison_view, name="mark_comparison_view"),
+    path("assignment/<int:assignment_id>/agreement", views.assignment_agreement_view, name="assignment_agreement_view"),
+    path("assignment/<int:assignment_id>/events", views.assignment_events_view, name="assignment_events_view"),
+    path("assignment/<int:assignment_id>/events/token", views.assignment_events_token_view, name="assignment_events_token_view"),
     path('assignment/<int:assignment_id>/download/', views.download_assignment_file, name='download_assignment'),
     path('assignment/<int:assignment_id>/rubric/download/', views.download_rubric_file, name='download_rubric'),
     path('submission/<int:submission_id>/download/', views.download_submission_file, name='download_submission'),
+    path("assignment/<int:assignment_id>/export", views.export_assignment_view, name="export_assignment"),
     path('submissions/<int:submission_id>/pdf/', views.submission_pdf_view, name='submission_pdf'),
+    path("uploads", views.upload_init_view, name="upload_init"),
+    path("uploads/direct", views.upload_direct_view, name="upload_direct"),
+    path("uploads/<uuid:upload_id>", views.upload_status_view, name="upload_status"),
+    path("uploads/<uuid:upload_id>/chunks/<int:index>", views.upload_chunk_view, name="upload_chunk"),
+    path("uploads/<uuid:upload_id>/complete", views.upload_complete_view, name="upload_complete"),
+    path("uploads/<uuid:upload_id>/confirm", views.upload_confirm_view, name="upload_confirm"),
 ] 
\ No newline at end of file
@@ -1,18 +1,34 @@
 import json
-import mimetypes
-import os
-from django.shortcuts import render
+from asgiref.sync import sync_to_async
 from django.views.decorators.http import require_http_methods
-from django.http import HttpResponse, JsonResponse, Http404, FileResponse
+from django.http import HttpResponse, JsonResponse, Http404, StreamingHttpResponse
 from django.contrib.auth import authenticate, login, logout, get_user_model
-from django.contrib.sessions.models import Session
 from django.utils.dateparse import parse_datetime
+from django.utils.http import content_disposition_header
 from .forms import AssignmentCreateForm
-from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
-from .models import User, Assignment, Mark, Submission
-from django.db.models import Q
-from django.shortcuts import get_object_or_404
+from .models import User, Assignment, Mark, MarkerProgress, Submission, Upload
+from .progress import clear_criteria, record_mark_change, reset_marks
+from .marks import MarkBatchError, MarkConflict, apply_mark_delta, criterion_keys_error, save_marks_batch
+from .rubrics import diff_rubrics
+from .analytics import assignment_agreement, criterion_statistics
+from .stats_cache import bump_data_version, stats_cache
+from . import events
+from .digests import file_sha256
+from .exports import MARKS_FORMATS, export_filename, iter_assignment_zip
+from .file_serving import serve_file, serve_media
+from .streaming import is_async_request, iterate_in_pool
+from .ingest import IngestError, ingest_submission_zip
+from .uploads import (
+    UploadError, confirm_direct_upload, finalize_upload, init_direct_upload, init_upload, missing_chunks,
+    resolve_upload, write_chunk,
+)
+from .middleware import SESSION_HEADER, session_cache
+from .tokens import issue_stream_token, issue_token, looks_like_token, revoke_tokens, verify_stream_token
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Prefetch, Sum
+from django.shortcuts import aget_object_or_404, get_object_or_404
 from django.views.decorators.http import require_GET, require_POST
 from django.core.serializers.json import DjangoJSONEncoder
 
@@ -37,6 +53,8 @@ def login_view(request):
         - Fetches the user by email.
         - Authenticates the user using Django's authentication system.
         - Logs in the user and returns session information if successful.
+        - With API_AUTH_MODE = "token", sessionId is a signed stateless token
+          that is verified without a database lookup.
 
     Returns:
         - 200 OK with JSON containing user details and session ID if login succeeds.
@@ -80,7 +98,10 @@ def login_view(request):
 
         if user is not None:
             login(request, user)
-            session_id = request.session.session_key
+            if settings.API_AUTH_MODE == "token":
+                session_id = issue_token(user)
+            else:
+                session_id = request.session.session_key
             return JsonResponse(
                 {
                     "successful": True,
@@ -116,6 +137,7 @@ def logout_view(request):
     Behavior:
         - Logs out the current authenticated user using Django's logout.
         - Deletes the session cookie from the client.
+        - When called with a signed token, revokes every token issued to the user.
     
     Returns:
         - 200 OK with JSON confirming logout.
@@ -128,6 +150,12 @@ def logout_view(request):
         }
     """
     if request.method == "POST":
+        # Forget the cached user for both the header session and the cookie session
+        header_value = request.headers.get(SESSION_HEADER)
+        if looks_like_token(header_value) and request.api_user is not None:
+            revoke_tokens(request.api_user)
+        session_cache.invalidate(header_value)
+        session_cache.invalidate(request.session.session_key)
         logout(request)
         response = JsonResponse({"successful": True, "message": "Logged out successfully"}, status=200)
         response.delete_cookie("sessionid")
@@ -207,12 +235,8 @@ def signup_view(request):
         new_user.set_password(password)  # hash the password!
         new_user.save()
 
-        submissions = Submission.objects.all()
-        marks_to_create = [
-            Mark(marker=new_user, submission=sub, marks={}, is_finalized=False)
-            for sub in submissions
-        ]
-        Mark.objects.bulk_create(marks_to_create)
+        # No Mark rows are created up front; they are materialized when the
+        # marker first opens or saves a submission.
 
         return JsonResponse(
             {"successful": True, "message": "Sign-up successful"},
@@ -235,8 +259,7 @@ def login_status_view(request):
         - X-Session-ID: the session key from the client
 
     Behavior:
-        - Validates that session ID is provided.
-        - Retrieves session and decodes it to get authenticated user ID.
+        - Uses the user resolved from the session ID by ApiSessionMiddleware.
         - Returns user information if session is valid.
 
     Returns:
@@ -254,33 +277,20 @@ def login_status_view(request):
             "email": "john@example.com"
         }
     """
+    return _login_status_response(request)
+
+
+@csrf_exempt
+async def alogin_status_view(request):
+    """Async login_status_view; the user was already resolved by the middleware, so no query runs here."""
+    return _login_status_response(request)
+
+
+def _login_status_response(request):
     # Check if user is authenticated via Django session
     if request.method == "GET":
-        sessionid = request.headers.get("X-Session-ID")
-        if not sessionid:
-            return JsonResponse(
-                {
-                    "successful": False,
-                    "message": "User is not logged in"
-                },
-                status=401
-            )
-        try:
-            session = Session.objects.get(session_key=sessionid)
-            uid = session.get_decoded().get("_auth_user_id")
-            user = User.objects.get(id=uid)
-            return JsonResponse(
-                {
-                    "successful": True,
-                    "message": "User is logged in",
-                    "id": user.id,
-                    "username": getattr(user, "username", ""),
-                    "role": getattr(user, "role", ""),
-                    "email": user.email,
-                },
-                status=200
-            )
-        except:
+        user = request.api_user
+        if user is None:
             return JsonResponse(
                 {
                     "successful": False,
@@ -288,6 +298,17 @@ def login_status_view(request):
                 },
                 status=401
             )
+        return JsonResponse(
+            {
+                "successful": True,
+                "message": "User is logged in",
+                "id": user.id,
+                "username": getattr(user, "username", ""),
+                "role": getattr(user, "role", ""),
+                "email": user.email,
+            },
+            status=200
+        )
 
 @csrf_exempt
 def account_view(request, id):
@@ -303,8 +324,7 @@ def account_view(request, id):
         - X-Session-ID: the session key from the client
 
     Behavior:
-        - Validates that session ID is provided.
-        - Retrieves session and decodes it to get authenticated user.
+        - Uses the user resolved from the session ID by ApiSessionMiddleware.
         - Returns detailed account information including profile picture if available.
 
     Returns:
@@ -323,33 +343,8 @@ def account_view(request, id):
         }
     """
     if request.method == "GET":
-        sessionid = request.headers.get("X-Session-ID")
-        print(sessionid)
-        if not sessionid:
-            return JsonResponse(
-                {
-                    "successful": False,
-                    "message": "User is not logged in"
-                },
-                status=401
-            )
-        try:
-            session = Session.objects.get(session_key=sessionid)
-            uid = session.get_decoded().get("_auth_user_id")
-            user = User.objects.get(id=uid)
-            return JsonResponse(
-                {
-                    "successful": True,
-                    "message": "User is logged in",
-                    "id": user.id,
-                    "username": getattr(user, "username", ""),
-                    "role": getattr(user, "role", ""),
-                    "email": user.email,
-                    "profilePicture" : request.build_absolute_uri(user.profile_picture.url) if user.profile_picture else None
-                },
-                status=200
-            )
-        except:
+        user = request.api_user
+        if user is None:
             return JsonResponse(
                 {
                     "successful": False,
@@ -357,6 +352,18 @@ def account_view(request, id):
                 },
                 status=401
             )
+        return JsonResponse(
+            {
+                "successful": True,
+                "message": "User is logged in",
+                "id": user.id,
+                "username": getattr(user, "username", ""),
+                "role": getattr(user, "role", ""),
+                "email": user.email,
+                "profilePicture" : request.build_absolute_uri(user.profile_picture.url) if user.profile_picture else None
+            },
+            status=200
+        )
 
 @csrf_exempt
 def edit_account_view(request, id):
@@ -430,17 +437,13 @@ def edit_account_view(request, id):
         - The function prints the received input values for debugging purposes.
     """
     if request.method == "POST":
-        sessionid = request.headers.get("X-Session-ID")
-        if not sessionid:
+        user = request.api_user
+        if user is None:
             return JsonResponse(
                 {"successful": False, "message": "User is not logged in"},
                 status=401
             )
         try:
-            session = Session.objects.get(session_key=sessionid)
-            uid = session.get_decoded().get("_auth_user_id")
-            user = User.objects.get(id=uid)
-
             # Handle text fields
             username = request.POST.get("username")
             email = request.POST.get("email")
@@ -466,6 +469,15 @@ def edit_account_view(request, id):
                 user.profile_picture = request.FILES["profilePicture"]
 
             user.save()
+            # Cached copies of this user are now stale
+            session_cache.invalidate_user(user.id)
+            # So are the cached statistics that list the user's name and email
+            assignment_ids = set(
+                Mark.objects.filter(marker=user).values_list("submission__assignment_id", flat=True).distinct()
+            )
+            assignment_ids.update(Assignment.objects.filter(administrator=user).values_list("id", flat=True))
+            if assignment_ids:
+                bump_data_version(*assignment_ids)
             return JsonResponse({
                 "success": True,
                 "message": "Account edited successfully",
@@ -484,6 +496,63 @@ def edit_account_view(request, id):
 
 
 def show_assignments_view(request, id):
+    error = _show_assignments_error(request)
+    if error is not None:
+        return error
+    user = request.api_user
+
+    # --- Filter assignments based on role ---
+    # Completion is read from the progress counters (api/progress.py). Mark rows
+    # are created lazily, so a missing row counts as "not finalized": an assignment
+    # is complete once the finalized count reaches the number of expected marks.
+    assignments = Assignment.objects.annotate(submission_count=Count("submission"))
+    if user.role == "admin":
+        # Admin: complete if every marker has finalized every submission
+        marker_count = User.objects.filter(role="marker").count()
+        progress = [
+            (a, a.submission_count * marker_count, a.marks_finalized)
+            for a in assignments.filter(administrator=user)
+        ]
+    else:
+        # Marker: complete if this marker has finalized every submission
+        finalized = dict(
+            MarkerProgress.objects.filter(marker=user).values_list("assignment_id", "marks_finalized")
+        )
+        progress = [
+            (a, a.submission_count, finalized.get(a.id, 0))
+            for a in assignments.filter(submission_count__gt=0)
+        ]
+    return _show_assignments_response(user, progress)
+
+
+async def ashow_assignments_view(request, id):
+    """Async show_assignments_view, same queries through the async ORM."""
+    error = _show_assignments_error(request)
+    if error is not None:
+        return error
+    user = request.api_user
+
+    assignments = Assignment.objects.annotate(submission_count=Count("submission"))
+    if user.role == "admin":
+        marker_count = await User.objects.filter(role="marker").acount()
+        progress = [
+            (a, a.submission_count * marker_count, a.marks_finalized)
+            async for a in assignments.filter(administrator=user)
+        ]
+    else:
+        finalized = {
+            assignment_id: count
+            async for assignment_id, count in
+            MarkerProgress.objects.filter(marker=user).values_list("assignment_id", "marks_finalized")
+        }
+        progress = [
+            (a, a.submission_count, finalized.get(a.id, 0))
+            async for a in assignments.filter(submission_count__gt=0)
+        ]
+    return _show_assignments_response(user, progress)
+
+
+def _show_assignments_error(request):
     if request.method != "GET":
         return JsonResponse(
             {"successful": False, "message": "Method not allowed"},
@@ -491,58 +560,30 @@ def show_assignments_view(request, id):
         )
 
     # --- Check session ---
-    sessionid = request.headers.get("X-Session-ID")
-    if not sessionid:
+    if not request.headers.get(SESSION_HEADER):
         return JsonResponse(
             {"successful": False, "message": "User is not logged in"},
             status=401
         )
 
-    try:
-        session = Session.objects.get(session_key=sessionid)
-        uid = session.get_decoded().get("_auth_user_id")
-        user = User.objects.get(pk=uid)
-    except (Session.DoesNotExist, User.DoesNotExist):
+    if request.api_user is None:
         return JsonResponse(
             {"successful": False, "message": "Invalid session"},
             status=401
         )
+    return None
 
-    # --- Filter assignments based on role ---
-    if user.role == "admin":
-        assignments = Assignment.objects.filter(administrator=user)
-    else:
-        marks = Mark.objects.filter(marker=user).select_related("submission__assignment")
-        assignment_ids = marks.values_list("submission__assignment__id", flat=True).distinct()
-        assignments = Assignment.objects.filter(id__in=assignment_ids)
 
+def _show_assignments_response(user, progress):
     assignment_list = []
 
-    for a in assignments:
-        # fetch all submissions for this assignment
-        submissions = Submission.objects.filter(assignment=a)
-
-        if user.role == "admin":
-            # Admin: complete if all marks for all submissions are finalized
-            complete = all(
-                all(mark.is_finalized for mark in Mark.objects.filter(submission=sub))
-                for sub in submissions
-            )
-        else:
-            # Marker: complete if all marks by this marker are finalized
-            # Only consider submissions that this marker has a mark for
-            complete = all(
-                mark.is_finalized
-                for sub in submissions
-                for mark in Mark.objects.filter(submission=sub, marker=user)
-            )
-
+    for a, total, finalized in progress:
         assignment_list.append(
             {
                 "id": a.id,
                 "name": a.name,
                 "dueDate": a.due_date.strftime("%Y-%m-%d"),
-                "completed": complete,
+                "completed": finalized >= total,
             }
         )
 
@@ -575,23 +616,27 @@ def delete_assignment_view(request, id):
 
 
 
+def _request_file(request, file_field, upload_field, user):
+    """
+    A file sent either directly as multipart `file_field`, or as the id of a
+    completed chunked upload in POST field `upload_field` (see api/uploads.py).
+    """
+    return request.FILES.get(file_field) or resolve_upload(request.POST.get(upload_field), user)
+
+
 @csrf_exempt
 def create_assignment_view(request):
     if request.method != "POST":
         return JsonResponse({"error": "Only POST allowed"}, status=405)
     
-    sessionid = request.headers.get("X-Session-ID")
-    if not sessionid:
+    if not request.headers.get(SESSION_HEADER):
         return JsonResponse(
             {"successful": False, "message": "User is not logged in"},
             status=401
         )
-    
-    try:
-        session = Session.objects.get(session_key=sessionid)
-        uid = session.get_decoded().get("_auth_user_id")
-        user = User.objects.get(pk=uid)
-    except (Session.DoesNotExist, User.DoesNotExist):
+
+    user = request.api_user
+    if user is None:
         return JsonResponse(
             {"successful": False, "message": "Invalid session"},
             status=401
@@ -607,7 +652,9 @@ def create_assignment_view(request):
     while f"submissions[{i}][name]" in request.POST:
         submissions_data.append({
             "name": request.POST.get(f"submissions[{i}][name]"),
-            "submission_file": request.FILES.get(f"submissions[{i}][submission_file]"),
+            "submission_file": _request_file(
+                request, f"submissions[{i}][submission_file]", f"submissions[{i}][submission_upload]", administrator
+            ),
             "comment": request.POST.get(f"submissions[{i}][comment]", ""),
             "admin_marks": request.POST.get(f"submissions[{i}][admin_marks]", "{}"),
         })
@@ -622,8 +669,8 @@ def create_assignment_view(request):
             "mark_criteria": request.POST.get("mark_criteria"),
         },
         {
-            "rubric": request.FILES.get("rubric"),
-            "assignment_file": request.FILES.get("assignment_file"),
+            "rubric": _request_file(request, "rubric", "rubric_upload", administrator),
+            "assignment_file": _request_file(request, "assignment_file", "assignment_file_upload", administrator),
         },
     )
 
@@ -637,6 +684,39 @@ def create_assignment_view(request):
 
 
 
+@require_POST
+@csrf_exempt
+def import_submissions_view(request, assignment_id):
+    """
+    POST -> Add one submission per file of a ZIP archive to an assignment.
+
+    The archive is sent as multipart `archive`, or as the id of a completed
+    chunked upload in `archive_upload`. Submission names are taken from the
+    entry file names.
+    """
+    if request.api_user is None:
+        return JsonResponse({"successful": False, "message": "User is not logged in"}, status=401)
+    if request.api_user.role != "admin":
+        return JsonResponse({"successful": False, "message": "Only administrators can import submissions"}, status=403)
+
+    assignment = get_object_or_404(Assignment, id=assignment_id)
+    archive = _request_file(request, "archive", "archive_upload", request.api_user)
+    if not archive:
+        return JsonResponse({"successful": False, "message": "Missing archive"}, status=400)
+
+    try:
+        with archive.open("rb") as archive_file:
+            submissions = ingest_submission_zip(assignment, archive_file)
+    except IngestError as e:
+        return JsonResponse({"successful": False, "message": e.message}, status=e.status)
+
+    return JsonResponse({
+        "successful": True,
+        "created": len(submissions),
+        "submissions": [{"id": s.id, "name": s.name} for s in submissions],
+    }, status=201)
+
+
 @require_GET
 @csrf_exempt
 def assignment_detail_view(request, assignment_id):
@@ -644,10 +724,43 @@ def assignment_detail_view(request, assignment_id):
     Return a single assignment with submissions, admin marks, and markers info.
     """
     try:
-        assignment = Assignment.objects.get(id=assignment_id)
+        assignment = Assignment.objects.select_related("administrator").get(id=assignment_id)
     except Assignment.DoesNotExist:
         raise Http404("Assignment not found")
+    submissions = list(_assignment_detail_submissions(assignment))
+    marker_count = User.objects.filter(role="marker").count()
+    return JsonResponse(
+        _assignment_detail_payload(assignment, submissions, marker_count), encoder=DjangoJSONEncoder, safe=False
+    )
 
+
+@require_GET
+@csrf_exempt
+async def aassignment_detail_view(request, assignment_id):
+    """Async assignment_detail_view."""
+    try:
+        assignment = await Assignment.objects.select_related("administrator").aget(id=assignment_id)
+    except Assignment.DoesNotExist:
+        raise Http404("Assignment not found")
+    submissions = [s async for s in _assignment_detail_submissions(assignment)]
+    marker_count = await User.objects.filter(role="marker").acount()
+    return JsonResponse(
+        _assignment_detail_payload(assignment, submissions, marker_count), encoder=DjangoJSONEncoder, safe=False
+    )
+
+
+def _assignment_detail_submissions(assignment):
+    # Marker counts and score sums are aggregated in SQL from the derived score columns
+    return Submission.objects.filter(assignment=assignment).annotate(
+        markers_count=Count("mark"),
+        score_total=Sum("mark__total_score"),
+        scored_criteria=Sum("mark__scored_criteria"),
+    )
+
+
+def _assignment_detail_payload(assignment, submissions, marker_count):
+    # Mark rows are created lazily, so totals come from the markers expected to mark
+    # every submission; a missing row counts as "not finalized" (as in show_assignments_view).
     # Serialize assignment
     assignment_data = {
         "id": assignment.id,
@@ -660,26 +773,23 @@ def assignment_detail_view(request, assignment_id):
         "administrator": {
             "id": assignment.administrator.id,
             "email": assignment.administrator.email,
-        } if assignment.administrator else None
+        } if assignment.administrator else None,
+        "progress": {
+            "totalMarks": marker_count * len(submissions),
+            "finalizedMarks": assignment.marks_finalized,
+        },
     }
 
     # Serialize submissions
-    submissions_qs = Submission.objects.filter(assignment=assignment)
     submissions_data = []
-    for submission in submissions_qs:
+    for submission in submissions:
         # Count markers who marked this submission
-        markers_count = Mark.objects.filter(submission=submission).count()
-        average_markers = 0
-        if markers_count > 0:
-            all_marks = Mark.objects.filter(submission=submission)
-            total = 0
-            num_values = 0
-            for mark in all_marks:
-                for v in mark.marks.values():
-                    if isinstance(v, (int, float)):
-                        total += v
-                        num_values += 1
-            average_markers = total / num_values if num_values > 0 else 0
+        markers_count = submission.markers_count
+        # Average score per marked criterion across all markers
+        average_markers = (
+            submission.score_total / submission.scored_criteria
+            if submission.scored_criteria else 0
+        )
 
         submissions_data.append({
             "id": submission.id,
@@ -688,28 +798,28 @@ def assignment_detail_view(request, assignment_id):
             "comment": submission.comment,
             "admin_marks": submission.admin_marks or {},  # <--- include admin marks
             "markers": markers_count,
-            "totalMarkers": markers_count,
+            "totalMarkers": marker_count,
             "averageMarkers": average_markers,
         })
 
-    response_data = {
+    return {
         "assignment": assignment_data,
         "submissions": submissions_data,
     }
 
-    return JsonResponse(response_data, encoder=DjangoJSONEncoder, safe=False)
-
 
 @require_POST
 @csrf_exempt
 def edit_assignment_view(request, id):
     """
     Edit an existing assignment and its submissions.
-    - If rubric changes, reset all marker marks (wipe marks, keep entries, set is_finalized=False).
-    - If a submission file changes, reset only the marks for that submission.
+    - If the rubric changes, only the marked criteria whose scoring changed or that
+      were removed are cleared (see api/rubrics.py); wording-only edits keep every mark.
+      Rubrics that are not in the {"levels", "criteria"} shape reset all marker marks.
+    - If a submission file's content changes (by SHA-256), reset only the marks for that submission.
+    - All writes and their moderation events commit together; a rejected edit changes nothing.
     """
-    session_id = request.headers.get("X-Session-ID")
-    if not session_id:
+    if request.api_user is None:
         return JsonResponse(
             {"successful": False, "message": "User is not logged in"},
             status=401
@@ -737,109 +847,169 @@ def edit_assignment_view(request, id):
     # ---------------- Rubric change check ----------------
     old_rubric = assignment.mark_criteria
     rubric_changed = old_rubric != rubric_json
+    rubric_diff = diff_rubrics(old_rubric, rubric_json) if rubric_changed else None
 
     assignment.name = name
     assignment.due_date = due_date_parsed
     assignment.mark_criteria = rubric_json
 
-    # ---------------- Handle assignment & rubric files ----------------
-    if "assignment_file" in request.FILES:
-        assignment.assignment_file = request.FILES["assignment_file"]
-
-    if "rubric" in request.FILES:
-        assignment.rubric = request.FILES["rubric"]
-
-    assignment.save()
-
-    # ---------------- Handle submissions ----------------
-    for idx in range(2):  # Only two submissions
-        prefix = f"submissions[{idx}]"
-        sub_name = request.POST.get(f"{prefix}[name]")
-        sub_comment = request.POST.get(f"{prefix}[comment]")
-        sub_admin_marks = request.POST.get(f"{prefix}[admin_marks]")
-
-        if not sub_name or not sub_admin_marks:
-            return JsonResponse({"error": f"Submission {idx+1} data missing"}, status=400)
+    # Every write below, and the events they emit, commit together or not at all
+    with transaction.atomic():
+        # ---------------- Handle assignment & rubric files ----------------
+        # Either uploaded directly or referenced by a completed chunked upload id
+        new_assignment_file = _request_file(request, "assignment_file", "assignment_file_upload", request.api_user)
+        if new_assignment_file:
+            assignment.assignment_file = new_assignment_file
+
+        new_rubric = _request_file(request, "rubric", "rubric_upload", request.api_user)
+        if new_rubric:
+            assignment.rubric = new_rubric
+
+        assignment.save()
+
+        # ---------------- Handle submissions ----------------
+        changed_submission_ids = []
+        for idx in range(2):  # Only two submissions
+            prefix = f"submissions[{idx}]"
+            sub_name = request.POST.get(f"{prefix}[name]")
+            sub_comment = request.POST.get(f"{prefix}[comment]")
+            sub_admin_marks = request.POST.get(f"{prefix}[admin_marks]")
+
+            if not sub_name or not sub_admin_marks:
+                transaction.set_rollback(True)  # undo the writes made so far
+                return JsonResponse({"error": f"Submission {idx+1} data missing"}, status=400)
+
+            try:
+                sub_marks_json = json.loads(sub_admin_marks)
+            except Exception:
+                transaction.set_rollback(True)  # undo the writes made so far
+                return JsonResponse({"error": f"Submission {idx+1} marks invalid JSON"}, status=400)
+
+            # Get or create submission
+            submission_qs = assignment.submission_set.filter(name=sub_name)
+            if submission_qs.exists():
+                submission = submission_qs.first()
+            else:
+                submission = Submission.objects.create(name=sub_name, assignment=assignment)
 
-        try:
-            sub_marks_json = json.loads(sub_admin_marks)
-        except Exception:
-            return JsonResponse({"error": f"Submission {idx+1} marks invalid JSON"}, status=400)
-
-        # Get or create submission
-        submission_qs = Submission.objects.filter(assignment=assignment, name=sub_name)
-        if submission_qs.exists():
-            submission = submission_qs.first()
-        else:
-            submission = Submission.objects.create(name=sub_name, assignment=assignment)
-
-        # ---------------- Check if submission file changed ----------------
-        file_field_name = f"{prefix}[submission_file]"
-        submission_file_changed = False
-        if file_field_name in request.FILES:
-            # If there was an existing file, compare names
-            if submission.submission_file:
-                old_name = submission.submission_file.name.split("/")[-1]
-                new_name = request.FILES[file_field_name].name
-                if old_name != new_name:
+            # ---------------- Check if submission file changed ----------------
+            new_file = _request_file(
+                request, f"{prefix}[submission_file]", f"{prefix}[submission_upload]", request.api_user
+            )
+            submission_file_changed = False
+            if new_file:
+                # Compare content digests; an identical re-upload keeps the stored file
+                if not submission.submission_file or file_sha256(new_file) != submission.submission_sha256:
                     submission_file_changed = True
-            else:
-                submission_file_changed = True
+                    submission.submission_file = new_file
 
-            submission.submission_file = request.FILES[file_field_name]
+            # ---------------- Save submission data ----------------
+            submission.comment = sub_comment or ""
+            submission.admin_marks = sub_marks_json
+            submission.save()
 
-        # ---------------- Save submission data ----------------
-        submission.comment = sub_comment or ""
-        submission.admin_marks = sub_marks_json
-        submission.save()
+            if submission_file_changed:
+                changed_submission_ids.append(submission.id)
+
+        # Admin marks are level ids, so their scores follow the rubric
+        if rubric_changed:
+            Submission.rescore(assignment)
 
         # ---------------- Reset marker marks ----------------
-        if rubric_changed or submission_file_changed:
-            marks_qs = Mark.objects.filter(submission=submission)
-            for m in marks_qs:
-                m.marks = {}  # wipe all marks
-                m.is_finalized = False
-                m.save()
+        # Bulk writes for all affected marks, instead of a save() per mark
+        invalidated_criteria = []
+        marks_touched = 0
+        if rubric_diff is not None:
+            invalidated_criteria = rubric_diff.invalidated
+            marks_touched = clear_criteria(
+                assignment.id,
+                rescored=rubric_diff.rescored,
+                removed=rubric_diff.removed,
+                unfinalize=bool(rubric_diff.added),
+            )
+        elif rubric_changed:
+            invalidated_criteria = None  # unstructured rubric: every criterion
+            marks_touched = reset_marks(assignment.id)
+
+        marks_reset = 0
+        if changed_submission_ids:
+            marks_reset = reset_marks(assignment.id, changed_submission_ids)
+        bump_data_version(assignment.id)
+
+        # Open moderation screens refresh from these (see assignment_events_view)
+        if marks_touched or marks_reset:
+            events.emit(
+                assignment.id, events.MARKS_RESET,
+                marksTouched=marks_touched, marksReset=marks_reset, submissionIds=changed_submission_ids,
+                invalidatedCriteria=invalidated_criteria,
+            )
+        events.emit(assignment.id, events.ASSIGNMENT_EDITED, rubricChanged=rubric_changed)
 
-    return JsonResponse({"success": True, "message": "Assignment updated successfully", "rubric_changed": rubric_changed})
+    return JsonResponse({
+        "success": True,
+        "message": "Assignment updated successfully",
+        "rubric_changed": rubric_changed,
+        "rubric_diff": rubric_diff.as_dict() if rubric_diff is not None else None,
+        "invalidated_criteria": invalidated_criteria,
+        "marks_touched": marks_touched,
+        "marks_reset": marks_reset,
+    })
 
 
 @require_GET
 def marker_assignment_detail_view(request, assignment_id, user_id):
     """
-    Return assignment details, including submissions and related marks.
+    Return assignment details, including submissions and the marker's marks.
     """
-    assignment = get_object_or_404(Assignment, id=assignment_id)
+    assignment = get_object_or_404(Assignment.objects.select_related("administrator"), id=assignment_id)
+    try:
+        marker = User.objects.get(id=user_id)
+    except User.DoesNotExist:
+        return JsonResponse(
+            {"successful": False, "message": "Submission not found"},
+            status=404
+        )
 
-    submissions_data = []
-    submissions = Submission.objects.filter(assignment=assignment)
-    
+    submissions = list(_marker_assignment_submissions(assignment, marker))
+    return JsonResponse(_marker_assignment_payload(assignment, marker, submissions), safe=False)
+
+
+@require_GET
+async def amarker_assignment_detail_view(request, assignment_id, user_id):
+    """Async marker_assignment_detail_view."""
+    assignment = await aget_object_or_404(Assignment.objects.select_related("administrator"), id=assignment_id)
     try:
-        marker =  User.objects.get(id=user_id)
-    except Exception as e:
+        marker = await User.objects.aget(id=user_id)
+    except User.DoesNotExist:
         return JsonResponse(
             {"successful": False, "message": "Submission not found"},
             status=404
         )
-    
-    print(marker.email)
 
+    submissions = [s async for s in _marker_assignment_submissions(assignment, marker)]
+    return JsonResponse(_marker_assignment_payload(assignment, marker, submissions), safe=False)
+
+
+def _marker_assignment_submissions(assignment, marker):
+    # One query for the submissions and one for this marker's marks, however many there are
+    return Submission.objects.filter(assignment=assignment).prefetch_related(
+        Prefetch("mark_set", queryset=Mark.objects.filter(marker=marker).order_by("id"), to_attr="marker_marks")
+    )
+
+
+def _marker_assignment_payload(assignment, marker, submissions):
+    submissions_data = []
     for submission in submissions:
-        # Get marks for this submission
-        marks = Mark.objects.filter(submission=submission).select_related("marker")
-        
         marks_data = [
             {
                 "id": mark.id,
                 "marks": mark.marks,
                 "is_finalized": mark.is_finalized,
-                "marker": mark.marker.email
+                "marker": marker.email
             }
-            for mark in marks if mark.marker.email == marker.email
+            for mark in submission.marker_marks
         ]
 
-        
-
         submissions_data.append({
             "id": submission.id,
             "name": submission.name,
@@ -849,7 +1019,7 @@ def marker_assignment_detail_view(request, assignment_id, user_id):
             "marks": marks_data
         })
 
-    data = {
+    return {
         "id": assignment.id,
         "name": assignment.name,
         "creation_date": assignment.creation_date,
@@ -861,8 +1031,6 @@ def marker_assignment_detail_view(request, assignment_id, user_id):
         "submissions": submissions_data
     }
 
-    return JsonResponse(data, safe=False)
-
 @require_GET
 def marks_by_submission_view(request, submission_id):
     try:
@@ -875,10 +1043,27 @@ def marks_by_submission_view(request, submission_id):
         )
 
     # Fetch all marks for this submission
-    marks_qs = Mark.objects.filter(submission=submission).select_related('marker')
+    marks = Mark.objects.filter(submission=submission).select_related('marker')
+    return JsonResponse({"successful": True, "submissionId": submission_id, "marks": _marker_marks(marks)}, status=200)
+
+
+@require_GET
+async def amarks_by_submission_view(request, submission_id):
+    """Async marks_by_submission_view."""
+    if not await Submission.objects.filter(pk=submission_id).aexists():
+        return JsonResponse(
+            {"successful": False, "message": "Submission not found"},
+            status=404
+        )
+
+    marks = [m async for m in Mark.objects.filter(submission_id=submission_id).select_related('marker')]
+    return JsonResponse({"successful": True, "submissionId": submission_id, "marks": _marker_marks(marks)}, status=200)
 
+
+def _marker_marks(marks):
+    """Serialize marks with their marker, as listed by the submission and comparison views."""
     marks_list = []
-    for mark in marks_qs:
+    for mark in marks:
         marks_list.append({
             "id": mark.id,
             "marker": {
@@ -889,30 +1074,32 @@ def marks_by_submission_view(request, submission_id):
             "marks": mark.marks,  # JSON field
             "isFinalized": mark.is_finalized,
         })
-
-    return JsonResponse({"successful": True, "submissionId": submission_id, "marks": marks_list}, status=200)
+    return marks_list
 
 
 
 @csrf_exempt
-@require_http_methods(["GET", "POST"])
+@require_http_methods(["GET", "POST", "PATCH"])
 def submission_mark_view(request, user_id, assignment_id, submission_id):
     """
-    GET  -> Retrieve the mark information and rubric (mark_criteria)
-    POST -> Save or update the marker's marks (draft or finalized)
+    GET   -> Retrieve the mark information and rubric (mark_criteria)
+    POST  -> Save or update the marker's marks (draft or finalized)
+    PATCH -> Autosave only the changed criteria against the version last read
+
+    Expected PATCH payload:
+        {"version": 3, "marks": {"<criterion id>": {...}, "<removed id>": null}, "is_finalized": false}
+
+    "is_finalized" is optional. If the mark was saved elsewhere since `version`
+    (another tab, a reset), nothing is written and 409 returns the current mark.
     """
     # -----------------------
     # 1. Authenticate user
     # -----------------------
-    sessionid = request.headers.get("X-Session-ID")
-    if not sessionid:
+    if not request.headers.get(SESSION_HEADER):
         return JsonResponse({"successful": False, "message": "User not logged in"}, status=401)
 
-    try:
-        session = Session.objects.get(session_key=sessionid)
-        uid = session.get_decoded().get("_auth_user_id")
-        authenticated_user = User.objects.get(id=uid)
-    except (Session.DoesNotExist, User.DoesNotExist):
+    authenticated_user = request.api_user
+    if authenticated_user is None:
         return JsonResponse({"successful": False, "message": "Invalid session"}, status=401)
 
     # -----------------------
@@ -931,17 +1118,22 @@ def submission_mark_view(request, user_id, assignment_id, submission_id):
     # GET request
     # -----------------------
     if request.method == "GET":
-        mark, _ = Mark.objects.get_or_create(
-            marker=authenticated_user,
-            submission=submission,
-            defaults={"marks": {}, "is_finalized": False}
-        )
+        with transaction.atomic():
+            mark, created = Mark.objects.get_or_create(
+                marker=authenticated_user,
+                submission=submission,
+                defaults={"marks": {}, "is_finalized": False}
+            )
+            if created:
+                record_mark_change(assignment.id, authenticated_user.id, created=True)
+                bump_data_version(assignment.id)
         data = {
             "successful": True,
             "mark": {
                 "id": mark.id,
                 "marks": mark.marks,
                 "is_finalized": mark.is_finalized,
+                "version": mark.version,
             },
             "submission": {
                 "id": submission.id,
@@ -977,34 +1169,146 @@ def submission_mark_view(request, user_id, assignment_id, submission_id):
             is_finalized = body.get("is_finalized", False)
         except json.JSONDecodeError:
             return JsonResponse({"successful": False, "message": "Invalid JSON"}, status=400)
+        key_error = criterion_keys_error(new_marks)
+        if key_error:
+            return JsonResponse({"successful": False, "message": key_error}, status=400)
+
+        with transaction.atomic():
+            mark, created = Mark.objects.select_for_update().get_or_create(
+                marker=authenticated_user,
+                submission=submission,
+                defaults={"marks": {}, "is_finalized": False}
+            )
+            was_finalized = mark.is_finalized
 
-        mark, created = Mark.objects.get_or_create(
-            marker=authenticated_user,
-            submission=submission,
-            defaults={"marks": {}, "is_finalized": False}
-        )
+            # Always update existing marks
+            mark.marks = new_marks
+            mark.is_finalized = is_finalized
+            mark.save()
 
-        # Always update existing marks
-        mark.marks = new_marks
-        mark.is_finalized = is_finalized
-        mark.save()
+            record_mark_change(
+                assignment.id, authenticated_user.id,
+                created=created, was_finalized=was_finalized, is_finalized=mark.is_finalized,
+            )
+            bump_data_version(assignment.id)
+            events.emit_marks_saved(assignment.id, [mark], was_finalized=[mark.id] if was_finalized else ())
 
         return JsonResponse(
-            {"successful": True, "message": "Mark saved successfully", "mark": {"id": mark.id, "marks": mark.marks, "is_finalized": mark.is_finalized}},
+            {"successful": True, "message": "Mark saved successfully", "mark": {"id": mark.id, "marks": mark.marks, "is_finalized": mark.is_finalized, "version": mark.version}},
             status=200
         )
+
+    # -----------------------
+    # PATCH request
+    # -----------------------
+    try:
+        body = json.loads(request.body.decode("utf-8"))
+        version = body["version"]
+        changes = body.get("marks", {})
+        is_finalized = body.get("is_finalized")
+    except (json.JSONDecodeError, KeyError, TypeError):
+        return JsonResponse({"successful": False, "message": "Invalid JSON, version is required"}, status=400)
+    if not isinstance(version, int) or isinstance(version, bool) or not isinstance(changes, dict):
+        return JsonResponse({"successful": False, "message": "version must be an integer and marks an object"}, status=400)
+    key_error = criterion_keys_error(changes)
+    if key_error:
+        return JsonResponse({"successful": False, "message": key_error}, status=400)
+
+    try:
+        mark = apply_mark_delta(authenticated_user, submission, version, changes, is_finalized=is_finalized)
+    except MarkConflict as e:
+        current = e.mark
+        return JsonResponse(
+            {
+                "successful": False,
+                "message": "Mark was changed in another session",
+                "mark": {"id": current.id, "marks": current.marks, "is_finalized": current.is_finalized, "version": current.version},
+            },
+            status=409,
+        )
+    # Only the new version is echoed back, the client already has the marks
+    return JsonResponse(
+        {"successful": True, "mark": {"id": mark.id, "is_finalized": mark.is_finalized, "version": mark.version}},
+        status=200,
+    )
     
 
+@csrf_exempt
+@require_POST
+def batch_marks_view(request, user_id, assignment_id):
+    """
+    POST -> Save the marker's marks for many submissions of one assignment in one request
+
+    Expected JSON payload:
+        {"marks": [{"submission_id": 1, "marks": {...}, "is_finalized": true, "version": 2}, ...]}
+
+    "version" is optional, as in the PATCH autosave. Every item gets a result
+    ("saved", "conflict" or "error") in request order; valid items are written
+    even if others are rejected.
+    """
+    if request.api_user is None:
+        return JsonResponse({"successful": False, "message": "User is not logged in"}, status=401)
+    if request.api_user.role != "marker":
+        return JsonResponse({"successful": False, "message": "Only markers allowed"}, status=403)
+    assignment = get_object_or_404(Assignment, id=assignment_id)
+
+    try:
+        body = json.loads(request.body.decode("utf-8"))
+        results = save_marks_batch(request.api_user, assignment, body.get("marks"))
+    except MarkBatchError as e:
+        return JsonResponse({"successful": False, "message": str(e)}, status=400)
+    except (json.JSONDecodeError, AttributeError):
+        return JsonResponse({"successful": False, "message": "Invalid JSON"}, status=400)
+
+    saved = sum(result["status"] == "saved" for result in results)
+    return JsonResponse(
+        {"successful": saved == len(results), "saved": saved, "failed": len(results) - saved, "results": results},
+        status=200,
+    )
+
+
 @require_GET
 def mark_comparison_view(request, assignment_id, submission_id):
     try:
-        submission = Submission.objects.get(pk=submission_id, assignment__id=assignment_id)
+        submission = Submission.objects.select_related("assignment").get(
+            pk=submission_id, assignment__id=assignment_id
+        )
+    except Submission.DoesNotExist:
+        return JsonResponse(
+            {"successful": False, "message": "Submission not found"},
+            status=404
+        )
+
+    # Served from the stats cache until the assignment's data version changes
+    key = ("comparison", assignment_id, submission.assignment.data_version, submission_id)
+    payload = stats_cache.get_or_build(key, lambda: _mark_comparison_payload(submission))
+    return HttpResponse(payload, content_type="application/json", status=200)
+
+
+@require_GET
+async def amark_comparison_view(request, assignment_id, submission_id):
+    """
+    Async mark_comparison_view. A cache hit costs one async query; a miss
+    builds the payload (several queries and the statistics) in one sync_to_async call.
+    """
+    try:
+        submission = await Submission.objects.select_related("assignment").aget(
+            pk=submission_id, assignment__id=assignment_id
+        )
     except Submission.DoesNotExist:
         return JsonResponse(
             {"successful": False, "message": "Submission not found"},
             status=404
         )
 
+    key = ("comparison", assignment_id, submission.assignment.data_version, submission_id)
+    payload = stats_cache.get(key)
+    if payload is None:
+        payload = await sync_to_async(stats_cache.get_or_build)(key, lambda: _mark_comparison_payload(submission))
+    return HttpResponse(payload, content_type="application/json", status=200)
+
+
+def _mark_comparison_payload(submission):
     # ----------------------------
     # Administrator marks
     # ----------------------------
@@ -1013,35 +1317,237 @@ def mark_comparison_view(request, assignment_id, submission_id):
     # ----------------------------
     # Markers' marks
     # ----------------------------
-    markers_qs = Mark.objects.filter(submission=submission).select_related('marker')
-    markers_list = []
-    for mark in markers_qs:
-        markers_list.append({
-            "id": mark.id,
-            "marker": {
-                "id": mark.marker.id,
-                "email": mark.marker.email,
-                "username": mark.marker.username,
-            },
-            "marks": mark.marks,  # JSON field
-            "isFinalized": mark.is_finalized,
-        })
+    markers_list = _marker_marks(Mark.objects.filter(submission=submission).select_related('marker'))
 
     # ----------------------------
     # Include assignment rubric
     # ----------------------------
     rubric = submission.assignment.mark_criteria or {}
 
-    return JsonResponse({
+    return {
         "successful": True,
-        "submissionId": submission_id,
-        "assignmentId": assignment_id,
+        "submissionId": submission.id,
+        "assignmentId": submission.assignment_id,
         "rubric": rubric,        # full rubric JSON
         "admin_marks": admin_marks,
-        "markers": markers_list
+        "markers": markers_list,
+        "criterionStats": criterion_statistics(submission),  # per-criterion mean/spread/deviation
+    }
+
+
+
+@require_GET
+def assignment_agreement_view(request, assignment_id):
+    """
+    GET -> Inter-marker agreement report for an assignment.
+
+    Returns the mean absolute deviation of markers from the admin marks
+    (overall, per marker and per criterion), each marker's signed bias,
+    ICC(1,1) and Krippendorff's alpha (interval), computed by api/analytics.py.
+    """
+    assignment = get_object_or_404(Assignment, id=assignment_id)
+    key = ("agreement", assignment.id, assignment.data_version)
+    payload = stats_cache.get_or_build(
+        key, lambda: {"successful": True, "assignmentId": assignment.id, **assignment_agreement(assignment)}
+    )
+    return HttpResponse(payload, content_type="application/json", status=200)
+
+
+@csrf_exempt
+@require_POST
+def assignment_events_token_view(request, assignment_id):
+    """
+    POST -> Short-lived token for opening an assignment's event stream.
+
+    EventSource cannot set headers, so the stream URL carries this token as
+    ?token=... instead of the session. It only opens this assignment's stream
+    and expires after API_EVENTS_TOKEN_MAX_AGE seconds; fetch a new one before
+    reconnecting once it has expired.
+
+    Response:
+        {"successful": true, "token": "s1....", "expiresIn": 60}
+    """
+    if request.api_user is None:
+        return JsonResponse({"successful": False, "message": "User is not logged in"}, status=401)
+    assignment = get_object_or_404(Assignment, id=assignment_id)
+    max_age = getattr(settings, "API_EVENTS_TOKEN_MAX_AGE", 60)
+    return JsonResponse({
+        "successful": True,
+        "token": issue_stream_token(request.api_user, assignment.id, max_age),
+        "expiresIn": max_age,
     }, status=200)
 
 
+@require_GET
+async def assignment_events_view(request, assignment_id):
+    """
+    GET -> Server-Sent Events stream of an assignment's moderation activity:
+    mark.saved, mark.finalized, marks.reset and assignment.edited (see api/events.py).
+
+    EventSource cannot set headers, so browsers pass ?token=<stream token>
+    from assignment_events_token_view instead of the session. Reconnecting
+    browsers send Last-Event-ID and get the events they missed. Needs the
+    ASGI deployment.
+    """
+    user = request.api_user
+    if user is None and request.GET.get("token"):
+        claims = verify_stream_token(request.GET["token"], assignment_id)
+        if claims is not None:
+            user = await User.objects.filter(pk=claims.user_id, token_generation=claims.generation).afirst()
+    if user is None:
+        return JsonResponse({"successful": False, "message": "User is not logged in"}, status=401)
+    if not is_async_request(request):
+        # A WSGI worker would be held for the whole stream
+        return JsonResponse({"successful": False, "message": "Event streams need the ASGI server"}, status=501)
+    if not await Assignment.objects.filter(id=assignment_id).aexists():
+        raise Http404("Assignment not found")
+
+    last_event_id = request.headers.get("Last-Event-ID") or request.GET.get("lastEventId")
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    response = StreamingHttpResponse(
+        events.event_stream(assignment_id, last_event_id), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx would otherwise hold the events back
+    return response
+
+
+
+# -------------------------------
+# Chunked uploads
+# -------------------------------
+def _upload_error(error):
+    return JsonResponse({"successful": False, "message": error.message}, status=error.status)
+
+
+def _upload_status(upload):
+    return {
+        "successful": True,
+        "uploadId": str(upload.id),
+        "filename": upload.filename,
+        "size": upload.size,
+        "chunkSize": upload.chunk_size,
+        "totalChunks": upload.total_chunks,
+        "missingChunks": [] if upload.is_complete else missing_chunks(upload),
+        "complete": upload.is_complete,
+        "sha256": upload.sha256 or None,
+    }
+
+
+@csrf_exempt
+@require_POST
+def upload_init_view(request):
+    """
+    POST -> Start a resumable chunked upload.
+
+    Expected JSON payload:
+        {"filename": "submission.pdf", "size": 12345678, "sha256": "<hex, optional>", "chunkSize": 5242880}
+
+    The client then PUTs each chunk to uploads/<uploadId>/chunks/<index> and
+    POSTs uploads/<uploadId>/complete. The returned uploadId can be passed as
+    rubric_upload, assignment_file_upload or submissions[i][submission_upload]
+    when creating or editing an assignment.
+    """
+    if request.api_user is None:
+        return JsonResponse({"successful": False, "message": "User is not logged in"}, status=401)
+    try:
+        body = json.loads(request.body.decode("utf-8"))
+        upload = init_upload(
+            request.api_user,
+            body.get("filename"),
+            body.get("size"),
+            sha256=body.get("sha256", ""),
+            chunk_size=body.get("chunkSize"),
+        )
+    except UploadError as e:
+        return _upload_error(e)
+    except (json.JSONDecodeError, TypeError, ValueError):
+        return JsonResponse({"successful": False, "message": "Invalid upload request"}, status=400)
+    return JsonResponse(_upload_status(upload), status=201)
+
+
+@csrf_exempt
+@require_GET
+def upload_status_view(request, upload_id):
+    """GET -> Upload progress, including the chunks still missing so a client can resume."""
+    if request.api_user is None:
+        return JsonResponse({"successful": False, "message": "User is not logged in"}, status=401)
+    upload = get_object_or_404(Upload, id=upload_id, owner=request.api_user)
+    return JsonResponse(_upload_status(upload), status=200)
+
+
+@csrf_exempt
+@require_http_methods(["PUT"])
+def upload_chunk_view(request, upload_id, index):
+    """PUT -> Store one chunk; the raw request body is streamed to disk."""
+    if request.api_user is None:
+        return JsonResponse({"successful": False, "message": "User is not logged in"}, status=401)
+    upload = get_object_or_404(Upload, id=upload_id, owner=request.api_user)
+    try:
+        write_chunk(upload, index, request)
+    except UploadError as e:
+        return _upload_error(e)
+    return JsonResponse({"successful": True, "uploadId": str(upload.id), "index": index}, status=200)
+
+
+@csrf_exempt
+@require_POST
+def upload_complete_view(request, upload_id):
+    """POST -> Assemble the chunks and verify the checksum."""
+    if request.api_user is None:
+        return JsonResponse({"successful": False, "message": "User is not logged in"}, status=401)
+    upload = get_object_or_404(Upload, id=upload_id, owner=request.api_user)
+    try:
+        finalize_upload(upload)
+    except UploadError as e:
+        return _upload_error(e)
+    return JsonResponse(_upload_status(upload), status=200)
+
+
+@csrf_exempt
+@require_POST
+def upload_direct_view(request):
+    """
+    POST -> Start an upload that goes straight to object storage.
+
+    Expected JSON payload:
+        {"filename": "submission.pdf", "size": 12345678, "sha256": "<hex>"}
+
+    The response's "target" is a presigned request (method, url, headers) the
+    client sends the file with; it then POSTs uploads/<uploadId>/confirm. The
+    uploadId is used like a chunked upload's. Returns 400 when the storage
+    backend has no direct uploads (the filesystem default).
+    """
+    if request.api_user is None:
+        return JsonResponse({"successful": False, "message": "User is not logged in"}, status=401)
+    try:
+        body = json.loads(request.body.decode("utf-8"))
+        upload, target = init_direct_upload(request.api_user, body.get("filename"), body.get("size"), body.get("sha256"))
+    except UploadError as e:
+        return _upload_error(e)
+    except (json.JSONDecodeError, TypeError, ValueError):
+        return JsonResponse({"successful": False, "message": "Invalid upload request"}, status=400)
+    return JsonResponse({**_upload_status(upload), "missingChunks": [], "target": target}, status=201)
+
+
+@csrf_exempt
+@require_POST
+def upload_confirm_view(request, upload_id):
+    """POST -> Check a direct upload arrived intact (size and SHA-256) and complete it."""
+    if request.api_user is None:
+        return JsonResponse({"successful": False, "message": "User is not logged in"}, status=401)
+    upload = get_object_or_404(Upload, id=upload_id, owner=request.api_user)
+    try:
+        confirm_direct_upload(upload)
+    except UploadError as e:
+        return _upload_error(e)
+    return JsonResponse(_upload_status(upload), status=200)
+
+
 
 
 # Download files
@@ -1051,35 +1557,71 @@ def mark_comparison_view(request, assignment_id, submission_id):
 # -------------------------------
 # Helper function to serve a file
 # -------------------------------
-def _serve_file(file_field):
-    if not file_field or not file_field.path or not os.path.exists(file_field.path):
-        raise Http404("File not found")
-    
-    mime_type, _ = mimetypes.guess_type(file_field.path)
-    response = FileResponse(open(file_field.path, 'rb'), content_type=mime_type)
-    response['Content-Disposition'] = f'attachment; filename="{os.path.basename(file_field.path)}"'
-    return response
+def _serve_file(request, file_field, sha256=""):
+    # ETag, Last-Modified, 304 and Range handling live in api/file_serving.py
+    return serve_file(request, file_field, sha256=sha256)
+
+# -------------------------------
+# MEDIA_URL links (FieldFile.url)
+# -------------------------------
+@require_GET
+def media_file_view(request, path):
+    return serve_media(request, path)
 
 # -------------------------------
 # Assignment file
 # -------------------------------
 def download_assignment_file(request, assignment_id):
     assignment = get_object_or_404(Assignment, pk=assignment_id)
-    return _serve_file(assignment.assignment_file)
+    return _serve_file(request, assignment.assignment_file, assignment.assignment_file_sha256)
 
 # -------------------------------
 # Rubric file
 # -------------------------------
 def download_rubric_file(request, assignment_id):
     assignment = get_object_or_404(Assignment, pk=assignment_id)
-    return _serve_file(assignment.rubric)
+    return _serve_file(request, assignment.rubric, assignment.rubric_sha256)
 
 # -------------------------------
 # Submission file
 # -------------------------------
 def download_submission_file(request, submission_id):
     submission = get_object_or_404(Submission, pk=submission_id)
-    return _serve_file(submission.submission_file)
+    return _serve_file(request, submission.submission_file, submission.submission_sha256)
+
+
+# -------------------------------
+# All files of an assignment
+# -------------------------------
+@require_GET
+def export_assignment_view(request, assignment_id):
+    """
+    GET -> Stream a ZIP of the assignment file, rubric and every submission.
+
+    Optional query parameter `marks=json|csv` adds a marks sheet. The archive
+    is generated while it is sent, never built on disk or in memory. Under ASGI
+    it is built in the media I/O pool (api/streaming.py), so the same holds there;
+    its database rows are read here first, as the pool threads never close
+    database connections.
+    """
+    if request.api_user is None:
+        return JsonResponse({"successful": False, "message": "User is not logged in"}, status=401)
+    if request.api_user.role != "admin":
+        return JsonResponse({"successful": False, "message": "Only administrators can export assignments"}, status=403)
+
+    marks_format = request.GET.get("marks")
+    if marks_format and marks_format not in MARKS_FORMATS:
+        return JsonResponse({"successful": False, "message": "marks must be json or csv"}, status=400)
+
+    assignment = get_object_or_404(Assignment, pk=assignment_id)
+    is_async = is_async_request(request)
+    archive = iter_assignment_zip(assignment, marks_format, preload=is_async)
+    if is_async:
+        # Django would otherwise collect a sync iterator into a list before sending it
+        archive = iterate_in_pool(archive)
+    response = StreamingHttpResponse(archive, content_type="application/zip")
+    response["Content-Disposition"] = content_disposition_header(True, export_filename(assignment))
+    return response
 
 
 
@@ -1088,7 +1630,7 @@ def download_submission_file(request, submission_id):
 @require_http_methods(["GET"])
 def submission_pdf_view(request, submission_id):
     """
-    GET -> Return the submission PDF file.
+    GET -> Return the submission PDF file (supports Range and conditional requests).
     """
     try:
         submission = Submission.objects.get(pk=submission_id)
@@ -1098,6 +1640,10 @@ def submission_pdf_view(request, submission_id):
     if not submission.submission_file:
         return JsonResponse({"successful": False, "error": "No file attached to this submission"}, status=404)
 
-    # Serve the file (Django handles storage backend automatically)
-    file = submission.submission_file.open("rb")
-    return FileResponse(file, content_type="application/pdf")
+    return serve_file(
+        request,
+        submission.submission_file,
+        sha256=submission.submission_sha256,
+        content_type="application/pdf",
+        as_attachment=False,
+    )
@@ -59,15 +59,87 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # must be first
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware', 
+    'api.middleware.AsyncWhiteNoiseMiddleware',  # WhiteNoise, usable in an async chain
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.ApiSessionMiddleware',  # resolves X-Session-ID -> request.api_user
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# In-process cache of X-Session-ID -> user (see api/middleware.py)
+API_SESSION_CACHE_SIZE = int(os.getenv('API_SESSION_CACHE_SIZE', 1024))
+# Logout only clears the cache of the worker that served it; other workers accept
+# the logged-out session until their entry expires, so this is also that window.
+API_SESSION_CACHE_TTL = int(os.getenv('API_SESSION_CACHE_TTL', 5))  # seconds
+
+# "session": login returns a Django session key (default)
+# "token": login returns a signed stateless token (see api/tokens.py)
+API_AUTH_MODE = os.getenv('API_AUTH_MODE', 'session')
+API_TOKEN_MAX_AGE = int(os.getenv('API_TOKEN_MAX_AGE', 60 * 60 * 24 * 14))  # seconds
+
+# Memory cap of the per-process cache of moderation statistics (see api/stats_cache.py)
+API_STATS_CACHE_MAX_BYTES = int(os.getenv('API_STATS_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+# Rows per INSERT when creating submissions in bulk (see api/forms.py)
+API_BULK_CREATE_BATCH_SIZE = int(os.getenv('API_BULK_CREATE_BATCH_SIZE', 500))
+
+# Route login_status to its async view (see api/urls.py); set false when serving over WSGI
+API_ASYNC_VIEWS = os.getenv('API_ASYNC_VIEWS', 'true').lower() == 'true'
+
+# Max submissions per batch mark save (see api/marks.py)
+API_MARK_BATCH_MAX_ITEMS = int(os.getenv('API_MARK_BATCH_MAX_ITEMS', 500))
+
+# Resumable chunked uploads (see api/uploads.py)
+API_UPLOAD_CHUNK_ROOT = os.getenv('API_UPLOAD_CHUNK_ROOT', os.path.join(BASE_DIR, 'upload_chunks'))
+API_UPLOAD_CHUNK_SIZE = int(os.getenv('API_UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024))  # max bytes per chunk
+API_UPLOAD_MIN_CHUNK_SIZE = int(os.getenv('API_UPLOAD_MIN_CHUNK_SIZE', 64 * 1024))  # min bytes per chunk, except the last
+API_UPLOAD_MAX_CHUNKS = int(os.getenv('API_UPLOAD_MAX_CHUNKS', 10000))  # max chunks per upload
+API_UPLOAD_MAX_SIZE = int(os.getenv('API_UPLOAD_MAX_SIZE', 1024 * 1024 * 1024))  # max bytes per file
+API_INGEST_MAX_ENTRIES = int(os.getenv('API_INGEST_MAX_ENTRIES', 1000))  # max files per submissions ZIP
+
+# Let the front proxy send media downloads after the view's checks (see api/file_serving.py):
+# "" (stream from Django), "x-accel-redirect" (nginx) or "x-sendfile" (Apache/lighttpd).
+# For nginx: location /protected-media/ { internal; alias <MEDIA_ROOT>/; }
+API_FILE_OFFLOAD = os.getenv('API_FILE_OFFLOAD', '')
+API_FILE_OFFLOAD_PREFIX = os.getenv('API_FILE_OFFLOAD_PREFIX', '/protected-media/')
+
+# Streaming of media downloads that Django sends itself (see api/streaming.py)
+API_FILE_STREAM_CHUNK_SIZE = int(os.getenv('API_FILE_STREAM_CHUNK_SIZE', 256 * 1024))  # bytes per read
+API_FILE_STREAM_READ_AHEAD = int(os.getenv('API_FILE_STREAM_READ_AHEAD', 2))  # chunks buffered per download (ASGI)
+API_FILE_IO_THREADS = int(os.getenv('API_FILE_IO_THREADS', 4))  # concurrent media reads per worker (ASGI)
+
+# Live moderation events over SSE (see api/events.py). One reader per worker; on PostgreSQL
+# it wakes on LISTEN/NOTIFY, otherwise it polls the event table every interval.
+API_EVENTS_POLL_INTERVAL = float(os.getenv('API_EVENTS_POLL_INTERVAL', 1.0))  # seconds
+API_EVENTS_USE_NOTIFY = os.getenv('API_EVENTS_USE_NOTIFY', 'true').lower() == 'true'
+API_EVENTS_HEARTBEAT = int(os.getenv('API_EVENTS_HEARTBEAT', 15))  # seconds between keep-alive comments
+API_EVENTS_QUEUE_SIZE = int(os.getenv('API_EVENTS_QUEUE_SIZE', 100))  # events buffered per client before it is dropped
+API_EVENTS_REPLAY_LIMIT = int(os.getenv('API_EVENTS_REPLAY_LIMIT', 500))  # max events replayed on reconnect
+API_EVENTS_GAP_TIMEOUT = int(os.getenv('API_EVENTS_GAP_TIMEOUT', 10))  # seconds to wait for out-of-order commits
+API_EVENTS_RETENTION = int(os.getenv('API_EVENTS_RETENTION', 24 * 60 * 60))  # seconds events are kept
+API_EVENTS_PRUNE_EVERY = int(os.getenv('API_EVENTS_PRUNE_EVERY', 1000))  # event inserts per worker between prunes
+API_EVENTS_TOKEN_MAX_AGE = int(os.getenv('API_EVENTS_TOKEN_MAX_AGE', 60))  # seconds a ?token= for opening a stream stays valid
+
+# S3-compatible object storage (only used with API_STORAGE_BACKEND=api.object_storage.S3ContentAddressedStorage)
+API_S3_BUCKET = os.getenv('API_S3_BUCKET', '')
+API_S3_ENDPOINT_URL = os.getenv('API_S3_ENDPOINT_URL', '')  # e.g. http://localhost:9000 for MinIO
+API_S3_REGION = os.getenv('API_S3_REGION', '')
+API_S3_ACCESS_KEY_ID = os.getenv('API_S3_ACCESS_KEY_ID', '')
+API_S3_SECRET_ACCESS_KEY = os.getenv('API_S3_SECRET_ACCESS_KEY', '')
+# Lifetime of presigned download/upload URLs, in seconds
+API_S3_PRESIGN_EXPIRY = int(os.getenv('API_S3_PRESIGN_EXPIRY', '300'))
+# Redirect downloads to presigned URLs instead of streaming them through Django
+API_S3_PRESIGNED_DOWNLOADS = os.getenv('API_S3_PRESIGNED_DOWNLOADS', 'true').lower() == 'true'
+
+# Hash uploaded files while the request is parsed (see api/digests.py)
+FILE_UPLOAD_HANDLERS = [
+    'api.digests.HashingMemoryFileUploadHandler',
+    'api.digests.HashingTemporaryFileUploadHandler',
+]
+
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
 AUTH_USER_MODEL = 'api.User'
@@ -185,8 +257,6 @@ STATIC_URL = '/static/'
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
-
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -196,3 +266,15 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Media and files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Uploaded files are stored once per distinct content and reference counted (see api/storage.py).
+# Set API_STORAGE_BACKEND=api.object_storage.S3ContentAddressedStorage to keep them in an
+# S3-compatible bucket (AWS S3, MinIO) instead; that needs boto3 and the API_S3_* settings above.
+STORAGES = {
+    'default': {
+        'BACKEND': os.getenv('API_STORAGE_BACKEND', 'api.storage.ContentAddressedStorage'),
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
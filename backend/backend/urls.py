@@ -15,11 +15,14 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+from api.views import media_file_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/', include('api.urls'))
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path('api/', include('api.urls')),
+    # Links returned in API payloads (FieldFile.url). Served through api/file_serving.py,
+    # so they still work when API_FILE_OFFLOAD hands the bytes to the front proxy.
+    re_path(r'^%s(?P<path>.+)$' % settings.MEDIA_URL.lstrip('/'), media_file_view, name='media'),
+]